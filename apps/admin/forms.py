@@ -1,9 +1,15 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
 from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils import timezone
 from apps.products.models import Product, FileResource, Category
+from apps.products.pagination import SORT_LABELS
+from apps.products.search import search_products
 from apps.pages.models import Banner, About, Testimonial
 from apps.social.models import SocialMedia
-from apps.orders.models import Order
+from apps.orders.models import STATUS_TRANSITIONS, Order
 
 
 class ProductForm(forms.ModelForm):
@@ -325,3 +331,132 @@ class OrderForm(forms.ModelForm):
                 }
             ),
         }
+
+    def clean_status(self):
+        # Mismas reglas que OrderService.transition, para no guardar el resto a medias
+        status = self.cleaned_data["status"]
+        current = self.instance.status
+        if self.instance.pk and status != current and status not in STATUS_TRANSITIONS[current]:
+            raise forms.ValidationError(
+                f"Un pedido {Order.OrderStatus(current).label.lower()} no puede pasar a "
+                f"{Order.OrderStatus(status).label.lower()}"
+            )
+        return status
+
+
+_FILTER_INPUT = "px-4 py-2 bg-white border border-gray-200 rounded-xl text-sm focus:outline-none focus:border-xiaomi"
+
+# Ordenamientos del listado de productos (claves de pagination.SORT_OPTIONS)
+PRODUCT_SORTS = [(key, SORT_LABELS[key]) for key in ("newest", "name", "price", "-price")]
+
+
+class ProductFilterForm(forms.Form):
+    """
+    Filtros del listado de productos del panel.
+    La búsqueda es la del catálogo (texto completo y trigramas en PostgreSQL);
+    la categoría y el tipo usan los índices (category, id) y (catalog_type, price, id).
+    """
+
+    q = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={"class": _FILTER_INPUT, "placeholder": "Buscar productos..."}),
+    )
+    category = forms.TypedChoiceField(
+        required=False, coerce=int, empty_value=None, widget=forms.Select(attrs={"class": _FILTER_INPUT})
+    )
+    catalog_type = forms.ChoiceField(
+        required=False,
+        choices=[("", "Todos los tipos")] + Product.CatalogType.choices,
+        widget=forms.Select(attrs={"class": _FILTER_INPUT}),
+    )
+
+    def __init__(self, *args, categories=(), **kwargs):
+        # Las categorías llegan desde la vista, que ya las lee para los modales
+        super().__init__(*args, **kwargs)
+        self.fields["category"].choices = [("", "Todas las categorías")] + [
+            (category.pk, category.name) for category in categories
+        ]
+
+    def filter(self, queryset):
+        """Aplica los filtros válidos (los inválidos se ignoran, como en el catálogo)"""
+        if not self.is_bound:
+            return queryset
+        self.is_valid()
+        data = self.cleaned_data
+        if data.get("category"):
+            queryset = queryset.filter(category_id=data["category"])
+        if data.get("catalog_type"):
+            queryset = queryset.filter(catalog_type=data["catalog_type"])
+        return search_products(queryset, data.get("q") or "")
+
+
+# Ordenamientos del listado de pedidos (ver KeysetPaginator); cada uno tiene su índice
+ORDER_SORT_OPTIONS = {
+    "newest": ("-created_at", "-id"),
+    "oldest": ("created_at", "id"),
+}
+
+
+class OrderFilterForm(forms.Form):
+    """
+    Filtros del listado de pedidos (también los usa la exportación).
+    La búsqueda es por subcadena en nombre, email e ID de transacción; en
+    PostgreSQL cada icontains usa su índice de trigramas (ver Order.Meta).
+    """
+
+    q = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(
+            attrs={"class": _FILTER_INPUT, "placeholder": "Nombre, email, transacción o #pedido"}
+        ),
+    )
+    status = forms.ChoiceField(
+        required=False,
+        choices=[("", "Todos los estados")] + Order.OrderStatus.choices,
+        widget=forms.Select(attrs={"class": _FILTER_INPUT}),
+    )
+    payment_method = forms.ChoiceField(
+        required=False,
+        choices=[("", "Todos los pagos")] + Order.PaymentMethod.choices,
+        widget=forms.Select(attrs={"class": _FILTER_INPUT}),
+    )
+    date_from = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"class": _FILTER_INPUT, "type": "date"})
+    )
+    date_to = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"class": _FILTER_INPUT, "type": "date"})
+    )
+
+    def filter(self, queryset):
+        """Aplica los filtros válidos (los inválidos se ignoran, como en el catálogo)"""
+        if not self.is_bound:
+            return queryset
+        self.is_valid()
+        data = self.cleaned_data
+        query = " ".join((data.get("q") or "").split())
+        if query:
+            search = (
+                Q(shipping_name__icontains=query)
+                | Q(shipping_email__icontains=query)
+                | Q(transaction_id__icontains=query)
+            )
+            number = query.lstrip("#")
+            if number.isdigit() and len(number) < 19:
+                search |= Q(pk=int(number))
+            queryset = queryset.filter(search)
+        if data.get("status"):
+            queryset = queryset.filter(status=data["status"])
+        if data.get("payment_method"):
+            queryset = queryset.filter(payment_method=data["payment_method"])
+        # Días locales como rangos sobre created_at (sin __date, que anula el índice)
+        if data.get("date_from"):
+            queryset = queryset.filter(created_at__gte=_start_of_day(data["date_from"]))
+        if data.get("date_to"):
+            queryset = queryset.filter(created_at__lt=_start_of_day(data["date_to"] + timedelta(days=1)))
+        return queryset
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,318 @@
+"""
+Tests del panel de administración.
+Cubren el listado de pedidos (filtros, búsqueda y paginación por cursor en el
+servidor), su exportación en CSV y XLSX, el cambio de estado por lotes y el
+listado de productos con sus ventas.
+"""
+
+import csv
+import io
+import json
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem, OrderStatusEvent
+from apps.products.models import Category, Product
+
+
+class OrdersDataMixin:
+    """60 pedidos, uno por día, con estados, medios de pago y nombres alternados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff@example.com", password="pass12345", is_staff=True)
+        cls.customer = User.objects.create_user(username="ana@example.com", email="ana@example.com")
+        category = Category.objects.create(name="Servicios", slug="servicios")
+        cls.product = Product.objects.create(name="Liberación", price=Decimal("10.00"), category=category)
+        statuses = Order.OrderStatus.values
+        Order.objects.bulk_create(
+            [
+                Order(
+                    user=cls.customer,
+                    shipping_name="María Gómez" if i % 10 == 0 else f"Cliente {i}",
+                    shipping_email=f"cliente{i}@example.com",
+                    transaction_id=f"TX-{i:04d}",
+                    status=statuses[i % len(statuses)],
+                    payment_method=Order.PaymentMethod.PAYPAL if i % 2 else Order.PaymentMethod.CASH,
+                    total=Decimal("10.00"),
+                )
+                for i in range(60)
+            ]
+        )
+        cls.orders = list(Order.objects.order_by("pk"))
+        # created_at distinto por pedido (auto_now_add ignora el valor en bulk_create)
+        now = timezone.now()
+        for i, order in enumerate(cls.orders):
+            order.created_at = now - timedelta(days=i)
+        Order.objects.bulk_update(cls.orders, ["created_at"])
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=cls.product, quantity=1 + n, price=Decimal("10.00"))
+                for order in cls.orders[:5]
+                for n in range(2)
+            ]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+
+class AdminOrdersViewTest(OrdersDataMixin, TestCase):
+    """El listado filtra y pagina en la BD con un número fijo de consultas."""
+
+    def _get(self, query=""):
+        response = self.client.get(reverse("admin:admin_orders") + query)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _ids(self, response):
+        return [order.pk for order in response.context["orders"]]
+
+    def test_first_page_newest_with_item_counts(self):
+        response = self._get()
+        orders = list(response.context["orders"])
+        self.assertEqual(len(orders), 25)
+        self.assertEqual([o.pk for o in orders], [o.pk for o in self.orders[:25]])
+        self.assertEqual(orders[0].items_count, 3)
+        self.assertEqual(orders[10].items_count, 0)
+        self.assertTrue(response.context["page_obj"].has_next)
+
+    def test_cursor_pages_cover_all_orders(self):
+        seen = []
+        query = "?status=&sort=newest"
+        while True:
+            response = self._get(query)
+            seen += self._ids(response)
+            page = response.context["page_obj"]
+            if not page.has_next:
+                break
+            query = page.next_query
+        self.assertEqual(seen, [o.pk for o in self.orders])
+        previous = self._get(page.previous_query)
+        self.assertEqual(self._ids(previous), [o.pk for o in self.orders[25:50]])
+
+    def test_filters(self):
+        self.assertEqual(
+            self._ids(self._get("?status=DELIVERED&payment_method=PAYPAL")),
+            [o.pk for o in self.orders if o.status == "DELIVERED" and o.payment_method == "PAYPAL"],
+        )
+        day = timezone.localtime(self.orders[3].created_at).date()
+        self.assertEqual(self._ids(self._get(f"?date_from={day}&date_to={day}")), [self.orders[3].pk])
+        self.assertEqual(len(self._ids(self._get("?q=maría+gómez"))), 6)
+        self.assertEqual(self._ids(self._get("?q=tx-0007")), [self.orders[7].pk])
+        self.assertEqual(self._ids(self._get("?q=CLIENTE12%40")), [self.orders[12].pk])
+        self.assertEqual(self._ids(self._get(f"?q=%23{self.orders[4].pk}")), [self.orders[4].pk])
+
+    def test_invalid_filters_are_ignored(self):
+        self.assertEqual(len(self._ids(self._get("?status=NOPE&date_from=ayer&cursor=basura"))), 25)
+
+    def test_queries_constant(self):
+        with CaptureQueriesContext(connection) as first:
+            response = self._get()
+        with CaptureQueriesContext(connection) as second:
+            self._get(response.context["page_obj"].next_query)
+        self.assertEqual(len(first.captured_queries), len(second.captured_queries))
+        self.assertLessEqual(len(first.captured_queries), 4)
+
+
+class ExportOrdersTest(OrdersDataMixin, TestCase):
+    """La exportación respeta los filtros, escribe una fila por línea y se transmite por tramos."""
+
+    def _export(self, query=""):
+        response = self.client.get(reverse("admin:export_orders") + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response
+
+    def _csv(self, query=""):
+        content = b"".join(self._export(query).streaming_content).decode("utf-8-sig")
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_csv_rows_per_item_with_filters(self):
+        rows = self._csv("?format=csv&sort=oldest")
+        self.assertEqual(rows[0][:3], ["Pedido", "Fecha", "Estado"])
+        # 55 pedidos sin items + 5 con dos líneas cada uno
+        self.assertEqual(len(rows) - 1, 65)
+        self.assertEqual(rows[1][0], str(self.orders[-1].pk))
+        first = [row for row in rows if row[0] == str(self.orders[0].pk)]
+        self.assertEqual([row[12] for row in first], ["1", "2"])
+        self.assertEqual(first[1][14], "20.00")
+
+        filtered = self._csv("?status=DELIVERED&payment_method=PAYPAL")
+        expected = [o.pk for o in self.orders if o.status == "DELIVERED" and o.payment_method == "PAYPAL"]
+        self.assertEqual(list(dict.fromkeys(int(row[0]) for row in filtered[1:])), expected)
+
+    def test_csv_neutralizes_formulas(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(shipping_name="=HYPERLINK(\"x\")")
+        rows = self._csv(f"?q=%23{self.orders[0].pk}")
+        self.assertEqual(rows[1][6], "'=HYPERLINK(\"x\")")
+
+    def test_xlsx_is_valid_workbook(self):
+        response = self._export("?format=xlsx&q=maría")
+        self.assertIn("attachment;", response["Content-Disposition"])
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        # Encabezado + 6 pedidos de María Gómez, el primero con dos líneas
+        self.assertEqual(sheet.count("<row>"), 1 + 6 + 1)
+        self.assertIn("María Gómez", sheet)
+
+    @override_settings(ORDER_EXPORT_CHUNK_SIZE=10)
+    def test_items_loaded_per_chunk(self):
+        response = self._export()
+        with CaptureQueriesContext(connection) as ctx:
+            b"".join(response.streaming_content)
+        item_queries = [q for q in ctx.captured_queries if '"orders_orderitem"' in q["sql"]]
+        self.assertEqual(len(item_queries), 6)
+
+
+class TransitionOrdersTest(OrdersDataMixin, TestCase):
+    """El cambio de estado masivo acepta JSON o el formulario del listado."""
+
+    def _post_json(self, data):
+        return self.client.post(reverse("admin:transition_orders"), json.dumps(data), content_type="application/json")
+
+    def test_json_reports_updated_and_rejected(self):
+        pks = [order.pk for order in self.orders[:12]]
+        response = self._post_json({"order_ids": pks, "status": "CANCELLED"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        allowed = [o.pk for o in self.orders[:12] if o.status in ("PENDING", "PROCESSING")]
+        self.assertEqual(data["updated"], allowed)
+        self.assertEqual(data["rejected"], sorted(set(pks) - set(allowed)))
+        self.assertEqual(OrderStatusEvent.objects.filter(changed_by=self.staff).count(), len(allowed))
+
+    def test_json_errors(self):
+        self.assertEqual(self._post_json({"order_ids": [1], "status": "LOST"}).status_code, 400)
+        self.assertEqual(self._post_json({"order_ids": "1", "status": "CANCELLED"}).status_code, 400)
+        self.assertEqual(self._post_json({"status": "CANCELLED"}).status_code, 400)
+
+    def test_form_redirects_back(self):
+        pending = [o.pk for o in self.orders if o.status == "PENDING"]
+        response = self.client.post(
+            reverse("admin:transition_orders"),
+            {"order_ids": pending, "status": "PROCESSING", "next": "/admin/orders/?status=PENDING"},
+        )
+        self.assertRedirects(response, "/admin/orders/?status=PENDING", fetch_redirect_response=False)
+        self.assertFalse(Order.objects.filter(status="PENDING").exists())
+
+        response = self.client.post(
+            reverse("admin:transition_orders"),
+            {"order_ids": pending, "status": "PENDING", "next": "https://example.com/"},
+        )
+        self.assertRedirects(response, reverse("admin:admin_orders"), fetch_redirect_response=False)
+
+    def test_single_order_views_use_transitions(self):
+        delivered = next(o for o in self.orders if o.status == "DELIVERED")
+        self.client.post(reverse("admin:update_order_status", args=[delivered.pk, "PENDING"]))
+        delivered.refresh_from_db()
+        self.assertEqual(delivered.status, "DELIVERED")
+
+        self.client.post(
+            reverse("admin:edit_order", args=[delivered.pk]),
+            {"status": "REFUNDED", "payment_method": "CARD", "notes": "Devuelto"},
+        )
+        delivered.refresh_from_db()
+        self.assertEqual((delivered.status, delivered.payment_method, delivered.notes), ("REFUNDED", "CARD", "Devuelto"))
+        self.assertEqual(
+            list(delivered.status_events.values_list("from_status", "to_status")), [("DELIVERED", "REFUNDED")]
+        )
+
+    def test_rejected_transitions_are_reported(self):
+        delivered = next(o for o in self.orders if o.status == "DELIVERED")
+        response = self.client.post(reverse("admin:update_order_status", args=[delivered.pk, "PENDING"]))
+        self.assertIn(f"El pedido #{delivered.pk} no puede pasar a pendiente", str(list(get_messages(response.wsgi_request))))
+
+        # El formulario no guarda nada si el estado no es válido
+        response = self.client.post(
+            reverse("admin:edit_order", args=[delivered.pk]),
+            {"status": "PENDING", "payment_method": "CRYPTO", "notes": "Cambio"},
+        )
+        self.assertRedirects(response, reverse("admin:admin_orders"), fetch_redirect_response=False)
+        self.assertIn("Un pedido entregado no puede pasar a pendiente", str(list(get_messages(response.wsgi_request))))
+        delivered.refresh_from_db()
+        self.assertEqual((delivered.status, delivered.notes), ("DELIVERED", ""))
+        self.assertFalse(delivered.status_events.exists())
+
+        pks = [o.pk for o in self.orders[:12]]
+        response = self.client.post(reverse("admin:transition_orders"), {"order_ids": pks, "status": "CANCELLED"})
+        rejected = [o.pk for o in self.orders[:12] if o.status not in ("PENDING", "PROCESSING")]
+        self.assertIn(f"{len(rejected)} no admiten ese cambio", str(list(get_messages(response.wsgi_request))))
+        self.assertContains(self.client.get(reverse("admin:admin_orders")), "no admiten ese cambio")
+
+
+class AdminProductsViewTest(TestCase):
+    """El listado de productos pagina, filtra y anota ventas con un número fijo de consultas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff@example.com", is_staff=True)
+        cls.phones = Category.objects.create(name="Teléfonos", slug="telefonos")
+        cls.services = Category.objects.create(name="Servicios", slug="servicios")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    name=f"Redmi {i}" if i % 3 else f"Liberación {i}",
+                    price=Decimal("10.00") + i,
+                    category=cls.services if i % 3 == 0 else cls.phones,
+                    catalog_type=Product.CatalogType.SERVICE if i % 3 == 0 else Product.CatalogType.PRODUCT,
+                )
+                for i in range(40)
+            ]
+        )
+        cls.products = list(Product.objects.order_by("-id"))
+        orders = Order.objects.bulk_create(
+            [Order(user=cls.staff, status=status, total=Decimal("0.00")) for status in ("PENDING", "DELIVERED", "CANCELLED")]
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=cls.products[0], quantity=2, price=Decimal("15.50"))
+                for order in orders
+            ]
+            + [OrderItem(order=orders[1], product=cls.products[1], quantity=1, price=Decimal("9.99"))]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def _get(self, query=""):
+        response = self.client.get(reverse("admin:admin_products") + query)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_sales_annotated_without_cancelled_orders(self):
+        products = list(self._get().context["products"])
+        self.assertEqual(len(products), 25)
+        self.assertEqual((products[0].units_sold, products[0].revenue), (4, Decimal("62.00")))
+        self.assertEqual((products[1].units_sold, products[1].revenue), (1, Decimal("9.99")))
+        self.assertEqual((products[2].units_sold, products[2].revenue), (0, 0))
+
+    def test_pages_and_filters(self):
+        first = self._get("?sort=price")
+        second = self._get(first.context["page_obj"].next_query)
+        seen = [p.pk for p in first.context["products"]] + [p.pk for p in second.context["products"]]
+        self.assertEqual(seen, [p.pk for p in sorted(self.products, key=lambda p: (p.price, p.pk))])
+
+        services = self._get(f"?category={self.services.pk}").context["products"]
+        self.assertEqual({p.category_id for p in services}, {self.services.pk})
+        self.assertEqual(len(services), 14)
+        self.assertEqual(len(self._get("?catalog_type=SERVICE&q=liberación").context["products"]), 14)
+        self.assertEqual(len(self._get("?category=nope&cursor=basura").context["products"]), 25)
+
+    def test_queries_constant(self):
+        with CaptureQueriesContext(connection) as first:
+            response = self._get()
+        with CaptureQueriesContext(connection) as second:
+            self._get(response.context["page_obj"].next_query)
+        self.assertEqual(len(first.captured_queries), len(second.captured_queries))
+        # Sesión, usuario, categorías, página y carrito: sin consultas por fila
+        self.assertLessEqual(len(first.captured_queries), 5)
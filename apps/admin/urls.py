@@ -33,6 +33,12 @@ urlpatterns = [
     ),
     # Orders
     path("orders/", views.AdminOrdersView.as_view(), name="admin_orders"),
+    path("orders/export/", views.ExportOrdersView.as_view(), name="export_orders"),
+    path(
+        "orders/transition/",
+        views.TransitionOrdersView.as_view(),
+        name="transition_orders",
+    ),
     path(
         "orders/<int:pk>/edit/",
         views.UpdateOrderView.as_view(),
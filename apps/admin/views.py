@@ -1,3 +1,5 @@
+import json
+
 from django.views.generic import (
     TemplateView,
     ListView,
@@ -9,11 +11,20 @@ from django.views.generic import (
 )
 from django.urls import reverse_lazy
 from django.shortcuts import redirect
+from django.contrib import messages
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.models import User
-from django.db.models import Sum
-from apps.orders.models import Order
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+from apps.orders.models import STATUS_TRANSITIONS, Order, OrderItem
+from apps.orders.rollups import sales_summary
+from apps.orders.services import MAX_TRANSITION_IDS, OrderService
 from apps.products.models import Product, FileResource, Category
+from apps.products.pagination import KeysetPaginator, approximate_count
 from apps.pages.models import Banner, About, Testimonial
 from apps.social.models import SocialMedia
 from .forms import (
@@ -26,7 +37,12 @@ from .forms import (
     TestimonialForm,
     SocialMediaForm,
     OrderForm,
+    OrderFilterForm,
+    ORDER_SORT_OPTIONS,
+    ProductFilterForm,
+    PRODUCT_SORTS,
 )
+from .exports import export_rows, stream_csv, stream_xlsx
 
 
 class StepAdminMixin(UserPassesTestMixin):
@@ -40,25 +56,17 @@ class DashboardView(StepAdminMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Stats
-        # Total Revenue (sum of total for completed orders usually, but taking all non-cancelled/refunded for now or just checking payment_status)
-        # Using payment_status=True for revenue
-        revenue = (
-            Order.objects.filter(payment_status=True).aggregate(Sum("total"))[
-                "total__sum"
-            ]
-            or 0
-        )
-        context["total_revenue"] = revenue
-
-        # Total Orders
-        context["total_orders"] = Order.objects.count()
-
-        # Total Users
-        context["total_users"] = User.objects.count()
+        # Ingresos, pedidos, tendencias y desgloses desde los acumulados de ventas
+        # (apps/orders/rollups.py): no recorre la tabla de pedidos
+        context.update(sales_summary())
+        context["breakdowns"] = [
+            ("Por estado (30 días)", context["sales_by_status"]),
+            ("Por método de pago (30 días)", context["sales_by_payment_method"]),
+        ]
 
-        # Total Products
-        context["total_products"] = Product.objects.count()
+        # Usuarios y productos: conteo cacheado (estimado en PostgreSQL)
+        context["total_users"], _ = approximate_count(User.objects.all())
+        context["total_products"], _ = approximate_count(Product.objects.all())
 
         # Recent Orders (Top 10)
         context["recent_orders"] = Order.objects.select_related("user").order_by(
@@ -72,12 +80,56 @@ class AdminProductsView(StepAdminMixin, ListView):
     model = Product
     template_name = "admin/admin_products.html"
     context_object_name = "products"
-    ordering = ["-id"]
+    paginate_by = 25
+
+    # Pedidos que no cuentan como venta
+    excluded_statuses = [Order.OrderStatus.CANCELLED, Order.OrderStatus.REFUNDED]
+
+    def get_queryset(self):
+        # Unidades e ingresos con subconsultas por fila de la página sobre el índice
+        # (product, order) de OrderItem; el orden lo aplica el paginador
+        self.categories = list(Category.objects.order_by("name"))
+        self.filter_form = ProductFilterForm(self.request.GET or None, categories=self.categories)
+        sales = (
+            OrderItem.objects.filter(product=OuterRef("pk"))
+            .exclude(order__status__in=self.excluded_statuses)
+            .order_by()
+            .values("product")
+        )
+        return self.filter_form.filter(
+            Product.objects.select_related("category").annotate(
+                units_sold=Coalesce(Subquery(sales.annotate(n=Sum("quantity")).values("n")), 0),
+                revenue=Coalesce(
+                    Subquery(
+                        sales.annotate(
+                            n=Sum(F("price") * F("quantity"), output_field=DecimalField(max_digits=12, decimal_places=2))
+                        ).values("n")
+                    ),
+                    0,
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        # Paginación por cursor como el catálogo; con búsqueda ordena por relevancia
+        sort = self.request.GET.get("sort") or ("relevance" if self.request.GET.get("q") else None)
+        self.paginator = KeysetPaginator(queryset, page_size, sort=sort)
+        page = self.paginator.page(self.request.GET.get("cursor"), params=self.request.GET)
+        return (None, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["form"] = ProductForm()
-        context["categories"] = Category.objects.all()
+        form = ProductForm()
+        # El select de categorías del modal usa la lista ya leída (sin otra consulta)
+        form.fields["category"].choices = [("", form.fields["category"].empty_label)] + [
+            (category.pk, category.name) for category in self.categories
+        ]
+        context["form"] = form
+        context["categories"] = self.categories
+        context["filter_form"] = self.filter_form
+        context["sort"] = self.paginator.sort
+        context["sorts"] = PRODUCT_SORTS
         return context
 
 
@@ -155,21 +207,101 @@ class AdminOrdersView(StepAdminMixin, ListView):
     model = Order
     template_name = "admin/admin_orders.html"
     context_object_name = "orders"
-    ordering = ["-created_at"]
+    paginate_by = 25
+
+    def get_queryset(self):
+        # Unidades por pedido con una subconsulta por fila de la página (no un JOIN + GROUP BY
+        # sobre toda la tabla); el orden lo aplica el paginador
+        self.filter_form = OrderFilterForm(self.request.GET or None)
+        units = (
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        return self.filter_form.filter(
+            Order.objects.select_related("user").annotate(
+                items_count=Coalesce(Subquery(units), 0)
+            )
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        # Paginación por cursor: cada página es un rango del índice, sin OFFSET ni COUNT(*)
+        self.paginator = KeysetPaginator(
+            queryset,
+            page_size,
+            sort=self.request.GET.get("sort"),
+            options=ORDER_SORT_OPTIONS,
+        )
+        page = self.paginator.page(self.request.GET.get("cursor"), params=self.request.GET)
+        return (None, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["form"] = OrderForm()
+        context["filter_form"] = self.filter_form
+        context["sort"] = self.paginator.sort
+        context["status_transitions"] = {
+            status: sorted(targets) for status, targets in STATUS_TRANSITIONS.items()
+        }
         return context
 
 
+class ExportOrdersView(StepAdminMixin, View):
+    """Pedidos con sus líneas en CSV o XLSX, con los mismos filtros que el listado"""
+
+    formats = {
+        "csv": (stream_csv, "text/csv; charset=utf-8"),
+        "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    }
+
+    def get(self, request):
+        file_format = request.GET.get("format", "csv")
+        if file_format not in self.formats:
+            file_format = "csv"
+        stream, content_type = self.formats[file_format]
+
+        sort = request.GET.get("sort")
+        ordering = ORDER_SORT_OPTIONS[sort if sort in ORDER_SORT_OPTIONS else "newest"]
+        orders = OrderFilterForm(request.GET or None).filter(Order.objects.all()).order_by(*ordering)
+
+        response = StreamingHttpResponse(stream(export_rows(orders)), content_type=content_type)
+        filename = f"pedidos-{timezone.localtime():%Y%m%d-%H%M}.{file_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        # Que un proxy (nginx) no acumule la respuesta completa antes de enviarla
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 class UpdateOrderView(StepAdminMixin, UpdateView):
     model = Order
     form_class = OrderForm
     success_url = reverse_lazy("admin:admin_orders")
 
     def form_valid(self, form):
-        self.object = form.save()
+        # El resto de los campos se guarda igual; el estado pasa por OrderService.transition.
+        # En una transacción: si el estado cambió entretanto y se rechaza, no se guarda nada
+        with transaction.atomic():
+            self.object = form.save(commit=False)
+            status = self.object.status
+            self.object.status = form.initial["status"]
+            self.object.save()
+            if status != self.object.status:
+                result = OrderService.transition([self.object.pk], status, user=self.request.user)
+                if result.rejected:
+                    transaction.set_rollback(True)
+                    messages.warning(
+                        self.request,
+                        f"El pedido #{self.object.pk} cambió de estado mientras se editaba; no se guardaron los cambios",
+                    )
+        return redirect(self.success_url)
+
+    def form_invalid(self, form):
+        # El formulario es un modal del listado: los errores vuelven como mensajes
+        for errors in form.errors.values():
+            for error in errors:
+                messages.warning(self.request, f"Pedido #{self.object.pk}: {error}")
         return redirect(self.success_url)
 
 
@@ -177,13 +309,60 @@ class UpdateOrderStatusView(StepAdminMixin, View):
     """Vista para cambio rápido de estado de pedido"""
 
     def post(self, request, pk, status):
-        from apps.orders.models import Order
+        if status not in Order.OrderStatus.values:
+            messages.warning(request, f"Estado inválido: {status}")
+        elif OrderService.transition([pk], status, user=request.user).rejected:
+            messages.warning(
+                request,
+                f"El pedido #{pk} no puede pasar a {Order.OrderStatus(status).label.lower()} desde su estado actual",
+            )
+        return redirect("admin:admin_orders")
 
-        order = Order.objects.get(pk=pk)
-        valid_statuses = [choice[0] for choice in Order.OrderStatus.choices]
-        if status in valid_statuses:
-            order.status = status
-            order.save(update_fields=["status", "updated_at"])
+
+class TransitionOrdersView(StepAdminMixin, View):
+    """
+    Cambio de estado de varios pedidos en un solo UPDATE.
+    Acepta JSON {"order_ids": [...], "status": "..."} y responde los IDs
+    actualizados y rechazados, o el formulario de la barra de acciones del
+    listado (order_ids repetido, status y next) y vuelve al listado.
+    """
+
+    def post(self, request):
+        is_json = request.content_type == "application/json"
+        try:
+            if is_json:
+                data = json.loads(request.body)
+                order_ids, status = data["order_ids"], data["status"]
+                if not isinstance(order_ids, list):
+                    raise ValueError("order_ids debe ser una lista")
+            else:
+                order_ids, status = request.POST.getlist("order_ids"), request.POST.get("status", "")
+            if len(order_ids) > MAX_TRANSITION_IDS:
+                raise ValueError(f"Máximo {MAX_TRANSITION_IDS} pedidos por cambio")
+            result = OrderService.transition([int(pk) for pk in order_ids], status, user=request.user)
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            if is_json:
+                return JsonResponse({"success": False, "error": str(e) or "Solicitud inválida"}, status=400)
+            messages.warning(request, str(e) or "Solicitud inválida")
+            return self._back(request)
+
+        if is_json:
+            return JsonResponse(
+                {"success": True, "updated": result.updated, "rejected": result.rejected}
+            )
+        if result.rejected:
+            messages.warning(
+                request,
+                f"{len(result.updated)} pedidos actualizados; {len(result.rejected)} no admiten ese cambio de "
+                f"estado: #{', #'.join(str(pk) for pk in result.rejected[:20])}",
+            )
+        return self._back(request)
+
+    def _back(self, request):
+        # Vuelve al listado con los mismos filtros y página
+        next_url = request.POST.get("next", "")
+        if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+            return redirect(next_url)
         return redirect("admin:admin_orders")
 
 
@@ -194,6 +373,11 @@ class OrderDetailView(StepAdminMixin, DetailView):
     template_name = "admin/admin_order_detail.html"
     context_object_name = "order"
 
+    def get_queryset(self):
+        return Order.objects.select_related("user").prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+        )
+
 
 class DeleteOrderView(StepAdminMixin, DeleteView):
     """Vista para eliminar un pedido"""
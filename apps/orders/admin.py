@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import Order, OrderItem, Cart, CartItem
+from django.contrib import admin, messages
+from .models import Order, OrderItem, OrderStatusEvent, Cart, CartItem
+from .services import MAX_TRANSITION_IDS, OrderService
 
 
 class OrderItemInline(admin.TabularInline):
@@ -16,20 +17,34 @@ class OrderItemInline(admin.TabularInline):
     get_total_price.short_description = 'Total'
 
 
+class OrderStatusEventInline(admin.TabularInline):
+    """Historial de estados del pedido (solo lectura)"""
+    model = OrderStatusEvent
+    extra = 0
+    fields = ['from_status', 'to_status', 'changed_by', 'created_at']
+    readonly_fields = fields
+    can_delete = False
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = [
         'id', 'user', 'status', 'payment_method', 'payment_status', 'total', 
         'created_at', 'get_items_count'
     ]
-    list_editable = ['status', 'payment_method', 'payment_status']
+    # El estado solo cambia con las acciones (OrderService.transition valida y deja historial)
+    list_editable = ['payment_method', 'payment_status']
     list_filter = ['status', 'payment_status', 'payment_method', 'created_at']
     search_fields = [
         'id', 'user__username', 'user__email', 
         'shipping_name', 'shipping_email', 'transaction_id'
     ]
-    readonly_fields = ['created_at', 'updated_at']
-    inlines = [OrderItemInline]
+    readonly_fields = ['status', 'created_at', 'updated_at']
+    inlines = [OrderItemInline, OrderStatusEventInline]
     
     fieldsets = (
         ('Información del Pedido', {
@@ -62,20 +77,47 @@ class OrderAdmin(admin.ModelAdmin):
         return obj.get_items_count()
     get_items_count.short_description = 'Items'
     
-    actions = ['mark_as_processing', 'mark_as_shipped', 'mark_as_delivered']
-    
+    actions = ['mark_as_processing', 'mark_as_shipped', 'mark_as_delivered', 'mark_as_cancelled']
+
+    def _transition(self, request, queryset, status):
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+        updated = rejected = 0
+        for start in range(0, len(pks), MAX_TRANSITION_IDS):
+            result = OrderService.transition(pks[start:start + MAX_TRANSITION_IDS], status, user=request.user)
+            updated += len(result.updated)
+            rejected += len(result.rejected)
+        label = Order.OrderStatus(status).label
+        self.message_user(request, f"{updated} pedido(s) pasaron a {label}.", messages.SUCCESS)
+        if rejected:
+            self.message_user(
+                request, f"{rejected} pedido(s) no pueden pasar a {label} desde su estado actual.", messages.WARNING
+            )
+
     def mark_as_processing(self, request, queryset):
-        queryset.update(status=Order.OrderStatus.PROCESSING)
+        self._transition(request, queryset, Order.OrderStatus.PROCESSING)
     mark_as_processing.short_description = "Marcar como Procesando"
     
     def mark_as_shipped(self, request, queryset):
-        queryset.update(status=Order.OrderStatus.SHIPPED)
+        self._transition(request, queryset, Order.OrderStatus.SHIPPED)
     mark_as_shipped.short_description = "Marcar como Enviado"
     
     def mark_as_delivered(self, request, queryset):
-        queryset.update(status=Order.OrderStatus.DELIVERED)
+        self._transition(request, queryset, Order.OrderStatus.DELIVERED)
     mark_as_delivered.short_description = "Marcar como Entregado"
 
+    def mark_as_cancelled(self, request, queryset):
+        self._transition(request, queryset, Order.OrderStatus.CANCELLED)
+    mark_as_cancelled.short_description = "Marcar como Cancelado"
+
+
+@admin.register(OrderStatusEvent)
+class OrderStatusEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'from_status', 'to_status', 'changed_by', 'created_at']
+    list_filter = ['to_status', 'created_at']
+    search_fields = ['order__id']
+    list_select_related = ['changed_by']
+    raw_id_fields = ['order', 'changed_by']
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -121,6 +163,12 @@ class CartAdmin(admin.ModelAdmin):
     def get_total(self, obj):
         return f"${obj.get_total():.2f}"
     get_total.short_description = 'Total'
+    
+    actions = ['recalculate_totals']
+    
+    def recalculate_totals(self, request, queryset):
+        Cart.recalculate_totals(queryset)
+    recalculate_totals.short_description = "Recalcular totales"
 
 
 @admin.register(CartItem)
@@ -128,6 +176,12 @@ class CartItemAdmin(admin.ModelAdmin):
     list_display = ['id', 'cart', 'product', 'quantity', 'get_total', 'added_at']
     list_filter = ['added_at']
     search_fields = ['cart__user__username', 'product__name']
+
+    def delete_queryset(self, request, queryset):
+        # El borrado masivo no pasa por CartItem.delete(): se reconcilian los carritos afectados
+        cart_ids = list(queryset.values_list('cart_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        Cart.recalculate_totals(Cart.objects.filter(pk__in=cart_ids))
     
     def get_total(self, obj):
         return f"${obj.get_total_price():.2f}"
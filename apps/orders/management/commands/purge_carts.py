@@ -0,0 +1,79 @@
+"""
+Comando para purgar carritos abandonados en lotes acotados.
+Uso: python manage.py purge_carts [--days 30] [--user-days 180] [--batch-size 500] [--sessions]
+     [--every 3600]
+
+Sin --every corre una vez (para cron); con --every queda en primer plano
+purgando cada N segundos, como proceso dedicado.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.orders.services import idle_carts_queryset, purge_idle_carts
+from apps.orders.tasks import run_purge_loop
+
+
+class Command(BaseCommand):
+    help = "Elimina carritos inactivos (invitados y, opcionalmente, de usuarios) en lotes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "CART_GUEST_TTL_DAYS", 30),
+            help="Días de inactividad para carritos de invitados",
+        )
+        parser.add_argument(
+            "--user-days",
+            type=int,
+            default=getattr(settings, "CART_USER_TTL_DAYS", None),
+            help="Días de inactividad para carritos de usuarios (por defecto se conservan)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "CART_PURGE_BATCH_SIZE", 500),
+            help="Carritos eliminados por lote",
+        )
+        parser.add_argument(
+            "--sessions",
+            action="store_true",
+            help="También elimina las sesiones expiradas",
+        )
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            help="Repite la purga cada N segundos sin terminar (proceso dedicado)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo cuenta los carritos que se eliminarían",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            count = idle_carts_queryset(options["days"], options["user_days"]).count()
+            self.stdout.write(f"{count} carritos serían eliminados")
+            return
+
+        def purge():
+            result = purge_idle_carts(
+                guest_ttl_days=options["days"],
+                user_ttl_days=options["user_days"],
+                batch_size=options["batch_size"],
+                clear_sessions=options["sessions"],
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{result.carts} carritos y {result.items} items eliminados "
+                    f"en {result.batches} lotes ({result.seconds:.2f}s)"
+                )
+            )
+
+        if options["every"] > 0:
+            run_purge_loop(options["every"], purge)
+        else:
+            purge()
@@ -0,0 +1,45 @@
+"""
+Comando para recalcular los acumulados de ventas del dashboard desde los pedidos.
+Uso: python manage.py rebuild_sales_rollups [--start 2025-01-01] [--end 2025-01-31] [--chunk-days 31]
+Necesario una vez al desplegar (los pedidos existentes no tienen acumulados) o para corregir un rango.
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.orders.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula las ventas por hora y por día a partir de los pedidos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            default=None,
+            help="Primer día (AAAA-MM-DD, por defecto el del primer pedido)",
+        )
+        parser.add_argument(
+            "--end",
+            type=date.fromisoformat,
+            default=None,
+            help="Último día inclusive (AAAA-MM-DD, por defecto hoy)",
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=31,
+            help="Días por transacción",
+        )
+
+    def handle(self, *args, **options):
+        result = rebuild_sales_rollups(
+            start=options["start"], end=options["end"], chunk_days=options["chunk_days"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.days} días recalculados con {result.orders} pedidos ({result.seconds:.2f}s)"
+            )
+        )
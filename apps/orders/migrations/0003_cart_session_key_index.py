@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_cart_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['session_key'], name='orders_cart_session_953ed8_idx'),
+        ),
+    ]
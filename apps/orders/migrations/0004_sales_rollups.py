@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_cart_session_key_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('PROCESSING', 'Procesando'), ('SHIPPED', 'Enviado'), ('DELIVERED', 'Entregado'), ('CANCELLED', 'Cancelado'), ('REFUNDED', 'Reembolsado')], max_length=20, verbose_name='Estado')),
+                ('payment_method', models.CharField(choices=[('CASH', 'Efectivo'), ('CARD', 'Tarjeta'), ('TRANSFER', 'Transferencia'), ('MERCADOPAGO', 'MercadoPago'), ('PSE', 'PSE'), ('PAYPAL', 'PayPal')], max_length=20, verbose_name='Método de pago')),
+                ('paid', models.BooleanField(verbose_name='Pago confirmado')),
+                ('orders', models.IntegerField(default=0, verbose_name='Pedidos')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total')),
+                ('items', models.IntegerField(default=0, verbose_name='Items vendidos')),
+                ('day', models.DateField(verbose_name='Día')),
+            ],
+            options={
+                'verbose_name': 'Ventas por día',
+                'verbose_name_plural': 'Ventas por día',
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'payment_method', 'paid'), name='daily_sales_bucket_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('PROCESSING', 'Procesando'), ('SHIPPED', 'Enviado'), ('DELIVERED', 'Entregado'), ('CANCELLED', 'Cancelado'), ('REFUNDED', 'Reembolsado')], max_length=20, verbose_name='Estado')),
+                ('payment_method', models.CharField(choices=[('CASH', 'Efectivo'), ('CARD', 'Tarjeta'), ('TRANSFER', 'Transferencia'), ('MERCADOPAGO', 'MercadoPago'), ('PSE', 'PSE'), ('PAYPAL', 'PayPal')], max_length=20, verbose_name='Método de pago')),
+                ('paid', models.BooleanField(verbose_name='Pago confirmado')),
+                ('orders', models.IntegerField(default=0, verbose_name='Pedidos')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total')),
+                ('items', models.IntegerField(default=0, verbose_name='Items vendidos')),
+                ('hour', models.DateTimeField(verbose_name='Hora')),
+            ],
+            options={
+                'verbose_name': 'Ventas por hora',
+                'verbose_name_plural': 'Ventas por hora',
+                'constraints': [models.UniqueConstraint(fields=('hour', 'status', 'payment_method', 'paid'), name='hourly_sales_bucket_uniq')],
+            },
+        ),
+    ]
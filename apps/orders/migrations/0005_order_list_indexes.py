@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Trigramas sobre UPPER(col::text), la expresión que genera icontains en PostgreSQL
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(
+        django.contrib.postgres.indexes.OpClass(
+            django.db.models.functions.text.Upper(
+                django.db.models.functions.comparison.Cast(field, models.TextField())
+            ),
+            name="gin_trgm_ops",
+        ),
+        name=f"order_{field}_trgm_idx",
+    )
+    for field in ("shipping_name", "shipping_email", "transaction_id")
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    """Índices GIN solo en PostgreSQL (los tests locales pueden usar SQLite)"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Order = apps.get_model("orders", "Order")
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Order, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Order = apps.get_model("orders", "Order")
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Order, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_sales_rollups'),
+        # Extensión pg_trgm
+        ('products', '0003_product_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_created_f0ce29_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_method', 'created_at', 'id'], name='order_payment_created_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='order', index=index) for index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_indexes, drop_search_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('PENDING', 'Pendiente'), ('PROCESSING', 'Procesando'), ('SHIPPED', 'Enviado'), ('DELIVERED', 'Entregado'), ('CANCELLED', 'Cancelado'), ('REFUNDED', 'Reembolsado')], max_length=20, verbose_name='Estado anterior')),
+                ('to_status', models.CharField(choices=[('PENDING', 'Pendiente'), ('PROCESSING', 'Procesando'), ('SHIPPED', 'Enviado'), ('DELIVERED', 'Entregado'), ('CANCELLED', 'Cancelado'), ('REFUNDED', 'Reembolsado')], max_length=20, verbose_name='Estado nuevo')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Cambiado por')),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='orders.order', verbose_name='Pedido')),
+            ],
+            options={
+                'verbose_name': 'Cambio de estado',
+                'verbose_name_plural': 'Cambios de estado',
+                'indexes': [models.Index(fields=['order', 'created_at'], name='order_status_event_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_status_events'),
+        ('products', '0006_related_products'),
+    ]
+
+    operations = [
+        # Primero el índice nuevo, que también cubre las búsquedas por product_id
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order', 'quantity', 'price'], name='orderitem_product_sales_idx'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='order_items', to='products.product', verbose_name='Producto'),
+        ),
+    ]
@@ -2,9 +2,25 @@ from decimal import Decimal
 from typing import TYPE_CHECKING
 
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.auth.signals import user_logged_in
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Manager
+from django.db.models import (
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Manager,
+    OuterRef,
+    Subquery,
+    Sum,
+    TextField,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, Upper
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
 from apps.products.models import Product
 
@@ -12,6 +28,10 @@ if TYPE_CHECKING:
     from .models import OrderItem, CartItem  # Evita import circular
 
 
+# Campos de texto de Order buscados desde el panel (ver admin.forms.OrderFilterForm)
+_SEARCH_FIELDS = ("shipping_name", "shipping_email", "transaction_id")
+
+
 class Order(models.Model):
     """Modelo para gestionar pedidos/órdenes de compra"""
 
@@ -122,13 +142,37 @@ class Order(models.Model):
         verbose_name_plural = "Pedidos"
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["-created_at"]),
             models.Index(fields=["user", "status"]),
+            # Listado del panel por cursor (ver admin.forms.ORDER_SORT_OPTIONS), solo o
+            # filtrado por estado o medio de pago, con rangos de fecha sobre el mismo índice
+            models.Index(fields=["created_at", "id"], name="order_created_id_idx"),
+            models.Index(fields=["status", "created_at", "id"], name="order_status_created_idx"),
+            models.Index(fields=["payment_method", "created_at", "id"], name="order_payment_created_idx"),
+            # Búsqueda por subcadena (icontains = UPPER(col::text) LIKE ...) en PostgreSQL
+            *(
+                GinIndex(
+                    OpClass(Upper(Cast(field, TextField())), name="gin_trgm_ops"),
+                    name=f"order_{field}_trgm_idx",
+                )
+                for field in _SEARCH_FIELDS
+            ),
         ]
 
     def __str__(self) -> str:
         return f"Pedido #{self.id} - {self.user.username} - {self.get_status_display()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado leído de la BD: al guardar, los acumulados de ventas restan este aporte
+        if not instance.get_deferred_fields() & _SALES_FIELDS:
+            instance._sales_snapshot = instance.sales_snapshot()
+        return instance
+
+    def sales_snapshot(self) -> tuple[tuple, Decimal]:
+        """((creado, estado, medio de pago, pagado), total): aporte a los acumulados de ventas"""
+        return (self.created_at, self.status, self.payment_method, self.payment_status), self.total
+
     def calculate_totals(self) -> None:
         """Calcula y actualiza subtotal, tax, total basado en los items"""
         items = self.items.all()
@@ -157,6 +201,7 @@ class OrderItem(models.Model):
         Product,
         on_delete=models.PROTECT,
         related_name="order_items",
+        db_index=False,  # Cubierto por el índice (product, order, quantity, price)
         verbose_name="Producto",
     )
     quantity = models.PositiveIntegerField(
@@ -176,15 +221,124 @@ class OrderItem(models.Model):
         verbose_name = "Item de pedido"
         verbose_name_plural = "Items de pedido"
         ordering = ["id"]
+        indexes = [
+            # Ventas por producto del panel: se resuelven solo con el índice (más el pedido por PK)
+            models.Index(
+                fields=["product", "order", "quantity", "price"], name="orderitem_product_sales_idx"
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.quantity}x {self.product.name} en Pedido #{self.order.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "quantity" not in instance.get_deferred_fields():
+            instance._sales_quantity = instance.quantity
+        return instance
+
     def get_total_price(self) -> Decimal:
         """Precio total de este ítem"""
         return self.price * Decimal(self.quantity)
 
 
+# Cambios de estado permitidos: estado actual -> estados a los que puede pasar.
+# OrderService.transition los valida en el WHERE del UPDATE.
+STATUS_TRANSITIONS = {
+    Order.OrderStatus.PENDING: {Order.OrderStatus.PROCESSING, Order.OrderStatus.CANCELLED},
+    Order.OrderStatus.PROCESSING: {
+        Order.OrderStatus.PENDING,
+        Order.OrderStatus.SHIPPED,
+        Order.OrderStatus.CANCELLED,
+    },
+    Order.OrderStatus.SHIPPED: {Order.OrderStatus.DELIVERED},
+    Order.OrderStatus.DELIVERED: {Order.OrderStatus.REFUNDED},
+    Order.OrderStatus.CANCELLED: {Order.OrderStatus.PENDING},
+    Order.OrderStatus.REFUNDED: set(),
+}
+
+
+class OrderStatusEvent(models.Model):
+    """Historial de cambios de estado (una fila por pedido y cambio)"""
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="status_events",
+        db_index=False,  # Cubierto por el índice (order, created_at)
+        verbose_name="Pedido",
+    )
+    from_status = models.CharField("Estado anterior", max_length=20, choices=Order.OrderStatus.choices)
+    to_status = models.CharField("Estado nuevo", max_length=20, choices=Order.OrderStatus.choices)
+    changed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Cambiado por",
+    )
+    created_at = models.DateTimeField("Fecha", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Cambio de estado"
+        verbose_name_plural = "Cambios de estado"
+        indexes = [
+            models.Index(fields=["order", "created_at"], name="order_status_event_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Pedido #{self.order_id}: {self.from_status} → {self.to_status}"
+
+
+# Campos de Order que determinan su aporte a los acumulados de ventas
+_SALES_FIELDS = {"created_at", "status", "payment_method", "payment_status", "total"}
+
+
+class SalesRollup(models.Model):
+    """
+    Pedidos, total e items vendidos de una combinación (estado, medio de pago,
+    pagado) en un período. Mantenido por apps/orders/rollups.py.
+    """
+
+    status = models.CharField("Estado", max_length=20, choices=Order.OrderStatus.choices)
+    payment_method = models.CharField("Método de pago", max_length=20, choices=Order.PaymentMethod.choices)
+    paid = models.BooleanField("Pago confirmado")
+    orders = models.IntegerField("Pedidos", default=0)
+    total = models.DecimalField("Total", max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    items = models.IntegerField("Items vendidos", default=0)
+
+    class Meta:
+        abstract = True
+
+
+class HourlySales(SalesRollup):
+    hour = models.DateTimeField("Hora")
+
+    class Meta:
+        verbose_name = "Ventas por hora"
+        verbose_name_plural = "Ventas por hora"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["hour", "status", "payment_method", "paid"], name="hourly_sales_bucket_uniq"
+            ),
+        ]
+
+
+class DailySales(SalesRollup):
+    day = models.DateField("Día")
+
+    class Meta:
+        verbose_name = "Ventas por día"
+        verbose_name_plural = "Ventas por día"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "status", "payment_method", "paid"], name="daily_sales_bucket_uniq"
+            ),
+        ]
+
+
 class Cart(models.Model):
     """Carrito de compras (autenticado o de sesión)"""
 
@@ -203,16 +357,28 @@ class Cart(models.Model):
         blank=True,
         help_text="Para usuarios no autenticados",
     )
+    # Totales denormalizados: se mantienen con F() en cada mutación del carrito
+    item_count = models.PositiveIntegerField("Cantidad de productos", default=0)
+    subtotal = models.DecimalField(
+        "Subtotal",
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal("0.00"),
+    )
     created_at = models.DateTimeField("Fecha de creación", auto_now_add=True)
     updated_at = models.DateTimeField("Última actualización", auto_now=True)
 
     if TYPE_CHECKING:
+        id: int
         items: Manager["CartItem"]
 
     class Meta:
         verbose_name = "Carrito"
         verbose_name_plural = "Carritos"
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(fields=["session_key"]),
+        ]
 
     def __str__(self) -> str:
         if self.user:
@@ -221,13 +387,11 @@ class Cart(models.Model):
 
     def get_total_items(self) -> int:
         """Cantidad total de productos (suma de cantidades)"""
-        return sum(item.quantity for item in self.items.all())
+        return self.item_count
 
     def get_subtotal(self) -> Decimal:
         """Subtotal sin impuestos ni envío"""
-        return sum(
-            (item.get_total_price() for item in self.items.all()), start=Decimal("0.00")
-        )
+        return self.subtotal
 
     def get_tax(self) -> Decimal:
         """IVA 19% sobre el subtotal"""
@@ -240,6 +404,51 @@ class Cart(models.Model):
     def clear(self) -> None:
         """Elimina todos los items del carrito"""
         self.items.all().delete()
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=0, subtotal=Decimal("0.00"), updated_at=timezone.now()
+        )
+        self.item_count = 0
+        self.subtotal = Decimal("0.00")
+
+    @staticmethod
+    def apply_delta(cart_id: int, quantity: int, amount: Decimal) -> None:
+        """Suma (o resta) cantidad y monto a los totales del carrito en la BD"""
+        Cart.objects.filter(pk=cart_id).update(
+            item_count=F("item_count") + quantity,
+            subtotal=F("subtotal") + amount,
+            updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def recalculate_totals(queryset=None) -> int:
+        """
+        Reconcilia item_count y subtotal desde los CartItem en un solo UPDATE.
+        Se usa cuando cambia el precio de un producto o para corregir desvíos.
+
+        Args:
+            queryset: Carritos a reconciliar (todos si es None)
+
+        Returns:
+            Cantidad de carritos actualizados
+        """
+        if queryset is None:
+            queryset = Cart.objects.all()
+        lines = CartItem.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+        line_total = ExpressionWrapper(
+            F("quantity") * F("product__price"),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        return queryset.update(
+            item_count=Coalesce(
+                Subquery(lines.annotate(total=Sum("quantity")).values("total")),
+                Value(0),
+            ),
+            subtotal=Coalesce(
+                Subquery(lines.annotate(total=Sum(line_total)).values("total")),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
 
 
 class CartItem(models.Model):
@@ -278,15 +487,174 @@ class CartItem(models.Model):
         """Precio total de este ítem en el carrito"""
         return self.product.price * Decimal(self.quantity)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Línea leída de la BD: al guardar o eliminar, los totales se corrigen contra ella
+        if not instance.get_deferred_fields() & {"cart", "product", "quantity"}:
+            instance._stored_line = (instance.cart_id, instance.product_id, instance.quantity)
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Mantiene los totales del carrito: al crear suma la cantidad inicial y al
+        editar (p. ej. desde el admin) aplica la diferencia con la línea guardada.
+        """
+        adding = self._state.adding
+        stored = getattr(self, "_stored_line", None)
+        super().save(*args, **kwargs)
+        current = (self.cart_id, self.product_id, self.quantity)
+        self._stored_line = current
+        if adding:
+            if self.quantity:
+                Cart.apply_delta(self.cart_id, self.quantity, self.get_total_price())
+        elif stored is None or stored[:2] != current[:2]:
+            # Otro carrito o producto (o línea sin estado leído): se reconcilian desde la BD
+            cart_ids = {self.cart_id} | ({stored[0]} if stored else set())
+            Cart.recalculate_totals(Cart.objects.filter(pk__in=cart_ids))
+        elif stored[2] != self.quantity:
+            difference = self.quantity - stored[2]
+            Cart.apply_delta(self.cart_id, difference, self.product.price * Decimal(difference))
+
+    def delete(self, *args, **kwargs):
+        """Resta el item de los totales del carrito antes de eliminarlo"""
+        cart_id, _, quantity = getattr(self, "_stored_line", (self.cart_id, None, self.quantity))
+        Cart.apply_delta(cart_id, -quantity, -self.product.price * Decimal(quantity))
+        return super().delete(*args, **kwargs)
+
     def increase_quantity(self, amount: int = 1) -> None:
         """Aumenta la cantidad del producto"""
+        CartItem.objects.filter(pk=self.pk).update(
+            quantity=F("quantity") + amount, updated_at=timezone.now()
+        )
+        Cart.apply_delta(self.cart_id, amount, self.product.price * Decimal(amount))
         self.quantity += amount
-        self.save(update_fields=["quantity", "updated_at"])
+        self._stored_line = (self.cart_id, self.product_id, self.quantity)
 
     def decrease_quantity(self, amount: int = 1) -> None:
         """Disminuye cantidad, elimina si llega a 0 o menos"""
         if self.quantity > amount:
+            CartItem.objects.filter(pk=self.pk).update(
+                quantity=F("quantity") - amount, updated_at=timezone.now()
+            )
+            Cart.apply_delta(
+                self.cart_id, -amount, -self.product.price * Decimal(amount)
+            )
             self.quantity -= amount
-            self.save(update_fields=["quantity", "updated_at"])
+            self._stored_line = (self.cart_id, self.product_id, self.quantity)
         else:
             self.delete()
+
+
+# Reconciliación de totales cuando cambia el catálogo
+def _carts_with_product(product_id: int):
+    return Cart.objects.filter(
+        pk__in=CartItem.objects.filter(product_id=product_id).values("cart_id")
+    )
+
+
+@receiver(post_save, sender=Product)
+def reconcile_cart_totals_on_price_change(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Recalcula los carritos que contienen el producto cuando cambia su precio.
+    Guardar stock, descripción o imagen no toca los carritos; si no se conoce el
+    precio anterior (instancia no leída de la BD) se reconcilia igual.
+    """
+    if update_fields is not None and "price" not in update_fields:
+        return
+    previous = getattr(instance, "_stored_price", None)
+    instance._stored_price = instance.price
+    if created or (previous is not None and previous == instance.price):
+        return
+    Cart.recalculate_totals(_carts_with_product(instance.pk))
+
+
+@receiver(pre_delete, sender=Product)
+def collect_carts_before_product_delete(sender, instance, **kwargs):
+    """Guarda los carritos afectados antes de que el CASCADE borre sus items"""
+    instance._affected_cart_ids = list(
+        _carts_with_product(instance.pk).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def reconcile_cart_totals_on_product_delete(sender, instance, **kwargs):
+    """Recalcula los carritos que tenían el producto eliminado"""
+    cart_ids = getattr(instance, "_affected_cart_ids", None)
+    if cart_ids:
+        Cart.recalculate_totals(Cart.objects.filter(pk__in=cart_ids))
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    """Fusiona el carrito de invitado de la sesión en el carrito del usuario"""
+    if request is None or not hasattr(request, "session"):
+        return
+    from .services import GUEST_CART_SESSION_KEY, CartService  # Evita import circular
+
+    guest_cart_id = request.session.pop(GUEST_CART_SESSION_KEY, None)
+    if guest_cart_id:
+        CartService.merge_guest_cart(guest_cart_id, user)
+
+
+# Acumulados de ventas (ver rollups.py). Los cambios por lotes (queryset.update,
+# bulk_create) no emiten señales y los registran sus servicios.
+@receiver(post_save, sender=Order)
+def update_sales_rollups_on_order_save(sender, instance, created, raw=False, **kwargs):
+    """Mueve el aporte del pedido a su nueva combinación cuando cambia estado, pago o total"""
+    if raw:
+        return
+    from . import rollups  # Evita import circular
+
+    previous = getattr(instance, "_sales_snapshot", None)
+    current = instance.sales_snapshot()
+    instance._sales_snapshot = current
+    if created:
+        # place_order lo registra junto con sus items después del bulk_create
+        if not getattr(instance, "_sales_recorded_later", False):
+            rollups.record_order(None, current, items=0)
+    elif previous is not None and previous != current:
+        rollups.record_order(previous, current, items=rollups.items_of(instance.pk))
+
+
+def _deleting_orders(origin) -> bool:
+    """El borrado empezó en un pedido (instancia o queryset), no en sus items"""
+    return isinstance(origin, Order) or getattr(origin, "model", None) is Order
+
+
+@receiver(pre_delete, sender=Order)
+def update_sales_rollups_on_order_delete(sender, instance, **kwargs):
+    """
+    Resta el pedido completo (con sus unidades) una sola vez, antes de que el
+    CASCADE borre los items; los items de un pedido que se elimina no se restan aparte
+    """
+    from . import rollups  # Evita import circular
+
+    rollups.record_order(
+        getattr(instance, "_sales_snapshot", None) or instance.sales_snapshot(),
+        None,
+        items=rollups.items_of(instance.pk),
+    )
+
+
+@receiver(post_save, sender=OrderItem)
+def update_sales_rollups_on_item_save(sender, instance, created, raw=False, **kwargs):
+    """Suma la diferencia de unidades al período y combinación del pedido"""
+    if raw:
+        return
+    previous = 0 if created else getattr(instance, "_sales_quantity", None)
+    instance._sales_quantity = instance.quantity
+    if previous is not None and previous != instance.quantity:
+        from . import rollups  # Evita import circular
+
+        rollups.record_items(instance.order, instance.quantity - previous)
+
+
+@receiver(pre_delete, sender=OrderItem)
+def update_sales_rollups_on_item_delete(sender, instance, origin=None, **kwargs):
+    """Resta las unidades de un item borrado por sí solo (el pedido todavía existe)"""
+    if _deleting_orders(origin):
+        return  # Ya las restó update_sales_rollups_on_order_delete
+    from . import rollups  # Evita import circular
+
+    rollups.record_items(instance.order, -instance.quantity)
@@ -0,0 +1,336 @@
+"""
+Acumulados de ventas por hora y por día (HourlySales y DailySales) para el dashboard.
+
+Cada fila suma pedidos, total e items vendidos de una combinación (estado, medio
+de pago, pagado) en una hora o un día locales. Cuando un pedido cambia de estado,
+su aporte se resta de la combinación anterior y se suma a la nueva con un
+INSERT ... ON CONFLICT DO UPDATE por tabla, sin recorrer pedidos.
+
+Las señales de Order y OrderItem (models.py) los mantienen pedido por pedido;
+place_order y OrderService.transition los registran una vez por operación.
+rebuild_sales_rollups() los recalcula desde los pedidos (carga inicial o corrección)
+y sales_summary() arma el dashboard leyendo solo los acumulados.
+"""
+
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from decimal import Decimal
+from typing import Iterable, NamedTuple, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import DailySales, HourlySales, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0.00")
+
+_DIMENSIONS = ("status", "payment_method", "paid")
+_MEASURES = ("orders", "total", "items")
+
+_UPSERT_SQL = """
+INSERT INTO {table} ({bucket}, status, payment_method, paid, orders, total, items)
+VALUES {values}
+ON CONFLICT ({bucket}, status, payment_method, paid) DO UPDATE SET
+    orders = {table}.orders + EXCLUDED.orders,
+    total = {table}.total + EXCLUDED.total,
+    items = {table}.items + EXCLUDED.items
+"""
+
+
+class RollupRebuildResult(NamedTuple):
+    """Métricas de un recálculo de acumulados"""
+
+    days: int
+    orders: int
+    seconds: float
+
+
+class Comparison(NamedTuple):
+    """Valor de un período contra el anterior"""
+
+    label: str
+    current: Decimal
+    previous: Decimal
+    money: bool = False
+
+    @property
+    def change(self) -> Optional[float]:
+        """Variación porcentual, None si el período anterior es 0"""
+        if not self.previous:
+            return None
+        return float((self.current - self.previous) / self.previous * 100)
+
+
+def _hour(created_at: datetime) -> datetime:
+    return timezone.localtime(created_at).replace(minute=0, second=0, microsecond=0)
+
+
+def _new_deltas():
+    return defaultdict(lambda: [0, ZERO, 0])
+
+
+def _add(deltas, state: tuple, orders: int, total: Decimal, items: int) -> None:
+    created_at, status, payment_method, paid = state
+    delta = deltas[(_hour(created_at), status, payment_method, paid)]
+    delta[0] += orders
+    delta[1] += total
+    delta[2] += items
+
+
+def record_order(previous: Optional[tuple], current: Optional[tuple], items: int) -> None:
+    """
+    Mueve el aporte de un pedido entre combinaciones.
+
+    Args:
+        previous: Order.sales_snapshot() anterior (None si el pedido es nuevo)
+        current: Order.sales_snapshot() actual (None si se eliminó)
+        items: Unidades del pedido
+    """
+    record_orders([(previous, current, items)])
+
+
+def record_orders(changes: Iterable[tuple]) -> None:
+    """Como record_order para varios pedidos, con un solo upsert por tabla"""
+    deltas = _new_deltas()
+    for previous, current, items in changes:
+        if previous is not None:
+            state, total = previous
+            _add(deltas, state, -1, -total, -items)
+        if current is not None:
+            state, total = current
+            _add(deltas, state, 1, total, items)
+    _apply(deltas)
+
+
+def record_items(order: Order, quantity: int) -> None:
+    """Suma (o resta) unidades vendidas en la combinación actual del pedido"""
+    deltas = _new_deltas()
+    state, _ = order.sales_snapshot()
+    _add(deltas, state, 0, ZERO, quantity)
+    _apply(deltas)
+
+
+def items_of(order_id: int) -> int:
+    """Unidades de un pedido"""
+    return OrderItem.objects.filter(order_id=order_id).aggregate(n=Sum("quantity"))["n"] or 0
+
+
+def items_by_order(order_ids: Iterable[int]) -> dict[int, int]:
+    """Unidades de cada pedido (los pedidos sin items no aparecen)"""
+    return dict(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .order_by()
+        .values("order_id")
+        .annotate(n=Sum("quantity"))
+        .values_list("order_id", "n")
+    )
+
+
+def _grouped(orders) -> dict:
+    """(hora local, estado, medio de pago, pagado) -> [pedidos, total, items] de los pedidos"""
+    tz = timezone.get_current_timezone()
+    grouped = _new_deltas()
+    rows = (
+        orders.order_by()
+        .annotate(bucket=TruncHour("created_at", tzinfo=tz))
+        .values_list("bucket", "status", "payment_method", "payment_status")
+        .annotate(count=Count("pk"), amount=Sum("total"))
+    )
+    for bucket, status, payment_method, paid, count, amount in rows:
+        delta = grouped[(timezone.localtime(bucket, tz), status, payment_method, paid)]
+        delta[0] += count
+        delta[1] += amount or ZERO
+
+    items = (
+        OrderItem.objects.filter(order__in=orders)
+        .order_by()
+        .annotate(bucket=TruncHour("order__created_at", tzinfo=tz))
+        .values_list("bucket", "order__status", "order__payment_method", "order__payment_status")
+        .annotate(units=Sum("quantity"))
+    )
+    for bucket, status, payment_method, paid, units in items:
+        grouped[(timezone.localtime(bucket, tz), status, payment_method, paid)][2] += units or 0
+    return grouped
+
+
+def _by_day(hourly: dict) -> dict:
+    daily = _new_deltas()
+    for (hour, *dimensions), (orders, total, items) in hourly.items():
+        delta = daily[(hour.date(), *dimensions)]
+        delta[0] += orders
+        delta[1] += total
+        delta[2] += items
+    return daily
+
+
+def _apply(deltas: dict) -> None:
+    hourly = {key: value for key, value in deltas.items() if any(value)}
+    if not hourly:
+        return
+    _upsert(HourlySales, "hour", hourly)
+    _upsert(DailySales, "day", _by_day(hourly))
+
+
+def _upsert(model, bucket: str, deltas: dict) -> None:
+    fields = [model._meta.get_field(name) for name in (bucket, *_DIMENSIONS, *_MEASURES)]
+    params = []
+    for key, measures in sorted(deltas.items(), key=lambda item: item[0]):
+        params.extend(
+            field.get_db_prep_save(value, connection) for field, value in zip(fields, (*key, *measures))
+        )
+    row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    sql = _UPSERT_SQL.format(
+        table=model._meta.db_table, bucket=bucket, values=", ".join([row] * len(deltas))
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def rebuild_sales_rollups(
+    start: Optional[date] = None, end: Optional[date] = None, chunk_days: int = 31
+) -> RollupRebuildResult:
+    """
+    Recalcula los acumulados desde los pedidos, por tramos de chunk_days días.
+    Usado por el comando rebuild_sales_rollups (carga inicial o corrección).
+
+    Args:
+        start: Primer día local (por defecto el del primer pedido)
+        end: Último día local inclusive (por defecto hoy)
+        chunk_days: Días por transacción
+
+    Returns:
+        RollupRebuildResult con días y pedidos procesados
+    """
+    started = time.perf_counter()
+    if start is None:
+        first = Order.objects.aggregate(first=Min("created_at"))["first"]
+        if first is None:
+            return RollupRebuildResult(0, 0, time.perf_counter() - started)
+        start = timezone.localtime(first).date()
+    end = end or timezone.localdate()
+
+    days = orders = 0
+    day = start
+    while day <= end:
+        chunk_end = min(day + timedelta(days=chunk_days), end + timedelta(days=1))
+        low = timezone.make_aware(datetime.combine(day, dtime.min))
+        high = timezone.make_aware(datetime.combine(chunk_end, dtime.min))
+        with transaction.atomic():
+            HourlySales.objects.filter(hour__gte=low, hour__lt=high).delete()
+            DailySales.objects.filter(day__gte=day, day__lt=chunk_end).delete()
+            hourly = _grouped(Order.objects.filter(created_at__gte=low, created_at__lt=high))
+            for model, bucket, deltas in (
+                (HourlySales, "hour", hourly),
+                (DailySales, "day", _by_day(hourly)),
+            ):
+                model.objects.bulk_create(
+                    [
+                        model(**dict(zip((bucket, *_DIMENSIONS, *_MEASURES), (*key, *measures))))
+                        for key, measures in deltas.items()
+                    ],
+                    batch_size=1000,
+                )
+        orders += sum(count for count, _, _ in hourly.values())
+        days += (chunk_end - day).days
+        day = chunk_end
+
+    result = RollupRebuildResult(days, orders, time.perf_counter() - started)
+    logger.info(f"Acumulados de ventas: {result.days} días, {result.orders} pedidos ({result.seconds:.2f}s)")
+    return result
+
+
+def sales_summary(days: int = 30) -> dict:
+    """
+    Datos del dashboard desde los acumulados: totales, tendencia diaria y por hora,
+    comparaciones y desglose por estado y medio de pago. Tres consultas sobre tablas
+    que crecen con los días, no con los pedidos.
+
+    Args:
+        days: Días de la tendencia y del desglose (al menos 14 para comparar semanas)
+    """
+    today = timezone.localdate()
+    paid = Q(paid=True)
+    totals = DailySales.objects.aggregate(
+        orders=Sum("orders"), revenue=Sum("total", filter=paid), items=Sum("items")
+    )
+
+    series = {today - timedelta(days=offset): [0, ZERO] for offset in range(days - 1, -1, -1)}
+    by_status = defaultdict(lambda: [0, ZERO])
+    by_method = defaultdict(lambda: [0, ZERO])
+    recent = DailySales.objects.filter(day__gt=today - timedelta(days=days)).values_list(
+        "day", "status", "payment_method", "paid", "orders", "total"
+    )
+    for day, status, payment_method, is_paid, count, total in recent:
+        revenue = total if is_paid else ZERO
+        for bucket in (series.get(day), by_status[status], by_method[payment_method]):
+            if bucket is not None:
+                bucket[0] += count
+                bucket[1] += revenue
+
+    now = timezone.localtime().replace(minute=0, second=0, microsecond=0)
+    hours = {now - timedelta(hours=offset): [0, ZERO] for offset in range(23, -1, -1)}
+    for hour, count, revenue in (
+        HourlySales.objects.filter(hour__gt=now - timedelta(hours=24))
+        .values("hour")
+        .annotate(count=Sum("orders"), revenue=Sum("total", filter=paid))
+        .values_list("hour", "count", "revenue")
+    ):
+        bucket = hours.get(timezone.localtime(hour))
+        if bucket is not None:
+            bucket[0] += count
+            bucket[1] += revenue or ZERO
+
+    daily = list(series.values())
+
+    def window(start: int, length: int) -> tuple[int, Decimal]:
+        values = daily[len(daily) - start - length:len(daily) - start]
+        return sum(v[0] for v in values), sum((v[1] for v in values), ZERO)
+
+    today_orders, today_revenue = window(0, 1)
+    yesterday_orders, yesterday_revenue = window(1, 1)
+    week_orders, week_revenue = window(0, 7)
+    last_week_orders, last_week_revenue = window(7, 7)
+
+    return {
+        "total_revenue": totals["revenue"] or ZERO,
+        "total_orders": totals["orders"] or 0,
+        "total_items": totals["items"] or 0,
+        "daily_sales": _chart(series),
+        "hourly_sales": _chart(hours),
+        "comparisons": [
+            Comparison("Ingresos hoy vs. ayer", today_revenue, yesterday_revenue, money=True),
+            Comparison("Pedidos hoy vs. ayer", today_orders, yesterday_orders),
+            Comparison("Ingresos 7 días vs. 7 anteriores", week_revenue, last_week_revenue, money=True),
+            Comparison("Pedidos 7 días vs. 7 anteriores", week_orders, last_week_orders),
+        ],
+        "sales_by_status": _breakdown(by_status, Order.OrderStatus),
+        "sales_by_payment_method": _breakdown(by_method, Order.PaymentMethod),
+    }
+
+
+def _chart(series: dict) -> list[dict]:
+    """Puntos de un gráfico de barras con su alto relativo al máximo (0-100)"""
+    peak = max((revenue for _, revenue in series.values()), default=ZERO) or 1
+    return [
+        {"label": key, "orders": count, "revenue": revenue, "percent": int(revenue * 100 / peak)}
+        for key, (count, revenue) in series.items()
+    ]
+
+
+def _breakdown(groups: dict, choices) -> list[dict]:
+    labels = dict(choices.choices)
+    return sorted(
+        (
+            {"label": labels.get(key, key), "orders": count, "revenue": revenue}
+            for key, (count, revenue) in groups.items()
+            if count
+        ),
+        key=lambda row: -row["orders"],
+    )
@@ -0,0 +1,797 @@
+"""
+Servicios del carrito y pedidos - Lógica de negocio separada de las vistas.
+Centraliza la lectura del carrito para que cada request lo consulte una sola vez,
+aplica cada mutación en una sola sentencia SQL y crea pedidos en bloque.
+"""
+
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from apps.products.images import responsive_image
+from apps.products.models import Product
+from apps.products.related import apply_status_changes
+from .models import STATUS_TRANSITIONS, Cart, CartItem, Order, OrderItem, OrderStatusEvent
+from . import rollups
+
+logger = logging.getLogger(__name__)
+
+# Atributo del request donde se guarda la foto del carrito
+_SNAPSHOT_ATTR = "_cart_snapshot"
+
+# Clave de sesión con el ID del carrito de invitado; sobrevive al cambio de
+# session_key que hace login(), así el carrito se puede fusionar después
+GUEST_CART_SESSION_KEY = "guest_cart_id"
+
+
+class CartSnapshot:
+    """
+    Foto del carrito para el request actual.
+    Carga items, productos y categorías en una sola consulta y toma los
+    totales de la fila del carrito; context processor, vistas y endpoints AJAX
+    la comparten en lugar de recorrer el carrito cada uno por su cuenta.
+    """
+
+    def __init__(self, cart: Optional[Cart], items: list[CartItem]):
+        self.cart = cart
+        self.items = items
+        # Totales leídos de las columnas denormalizadas del carrito
+        self.count = cart.get_total_items() if cart else 0
+        self.subtotal = cart.get_subtotal() if cart else Decimal("0.00")
+        self.tax = cart.get_tax() if cart else Decimal("0.00")
+        self.total = self.subtotal + self.tax
+
+    @classmethod
+    def empty(cls) -> "CartSnapshot":
+        """Snapshot vacío para visitantes sin carrito"""
+        return cls(None, [])
+
+    @classmethod
+    def load(cls, request) -> "CartSnapshot":
+        """
+        Carga el carrito del usuario o de la sesión con un único JOIN
+        CartItem -> Cart -> Product -> Category.
+
+        Args:
+            request: HttpRequest object
+
+        Returns:
+            CartSnapshot con items y totales calculados
+        """
+        lookup = _owner_lookup(request)
+        if lookup is None:
+            return cls.empty()
+
+        items = list(
+            CartItem.objects.filter(**lookup)
+            .select_related("cart", "product", "product__category")
+            .order_by("added_at")
+        )
+        cart = items[0].cart if items else None
+        # Todas las filas apuntan al mismo carrito: compartir una sola instancia
+        for item in items:
+            item.cart = cart
+        return cls(cart, items)
+
+    def get_item(self, item_id: int) -> Optional[CartItem]:
+        """Busca un item del snapshot por id sin volver a la base de datos"""
+        for item in self.items:
+            if item.id == item_id:
+                return item
+        return None
+
+    def as_document(self) -> dict:
+        """
+        Documento JSON compacto del carrito para clientes de la API.
+        Las imágenes usan el preset "thumb" (src y srcset), nunca el original.
+        """
+        images = {item.id: responsive_image(item.product.image, "thumb") for item in self.items}
+        return {
+            "count": self.count,
+            "subtotal": str(self.subtotal),
+            "tax": str(self.tax),
+            "total": str(self.total),
+            "items": [
+                {
+                    "id": item.id,
+                    "product_id": item.product_id,
+                    "name": item.product.name,
+                    "category": str(item.product.category),
+                    "image": images[item.id].src if images[item.id] else None,
+                    "image_srcset": images[item.id].srcset if images[item.id] else None,
+                    "price": str(item.product.price),
+                    "quantity": item.quantity,
+                    "line_total": str(item.get_total_price()),
+                }
+                for item in self.items
+            ],
+        }
+
+    def as_context(self) -> dict:
+        """Variables de template usadas por navbar, mini carrito, carrito y checkout"""
+        return {
+            "cart": self.cart,
+            "cart_items": self.items,
+            "cart_count": self.count,
+            "cart_subtotal": self.subtotal,
+            "cart_tax": self.tax,
+            "cart_total": self.total,
+        }
+
+
+def _owner_lookup(request) -> Optional[dict]:
+    """Filtro de CartItem según el dueño del carrito (usuario o sesión)"""
+    if request.user.is_authenticated:
+        return {"cart__user": request.user}
+    if request.session.session_key:
+        return {"cart__session_key": request.session.session_key}
+    return None
+
+
+def cart_state_key(request) -> str:
+    """
+    Identifica el contenido del carrito del request (líneas y cantidades).
+    Sin sesión no consulta nada; con sesión carga la foto del carrito, que el
+    context processor reutiliza si después se renderiza la página.
+    """
+    if not request.user.is_authenticated and not request.session.session_key:
+        return "empty"
+    snapshot = get_cart_snapshot(request)
+    if not snapshot.items:
+        return "empty"
+    return ",".join(f"{item.pk}x{item.quantity}" for item in snapshot.items)
+
+
+def peek_cart_snapshot(request) -> Optional[CartSnapshot]:
+    """Retorna la foto del carrito solo si ya fue cargada en este request"""
+    return getattr(request, _SNAPSHOT_ATTR, None)
+
+
+def get_cart_snapshot(request, refresh: bool = False) -> CartSnapshot:
+    """
+    Retorna la foto del carrito del request, cargándola solo la primera vez.
+
+    Args:
+        request: HttpRequest object
+        refresh: Fuerza recargar el carrito (después de una mutación)
+
+    Returns:
+        CartSnapshot compartido por todo el request
+    """
+    snapshot = getattr(request, _SNAPSHOT_ATTR, None)
+    if snapshot is None or refresh:
+        snapshot = CartSnapshot.load(request)
+        setattr(request, _SNAPSHOT_ATTR, snapshot)
+    return snapshot
+
+
+class CartMutation(NamedTuple):
+    """Resultado de una mutación: estado de la línea y nuevos totales del carrito"""
+
+    item_id: int
+    quantity: int  # 0 si la línea fue eliminada
+    price: Decimal
+    cart_count: int
+    cart_subtotal: Decimal
+
+    @property
+    def line_total(self) -> Decimal:
+        return self.price * Decimal(self.quantity)
+
+
+_CART = Cart._meta.db_table
+_ITEM = CartItem._meta.db_table
+_PRODUCT = Product._meta.db_table
+
+# Inserta o suma la línea y actualiza los totales del carrito en la misma sentencia.
+# Bloquea primero la fila del carrito, como apply_batch: siempre carrito y después líneas
+_ADD_SQL = f"""
+WITH locked AS (
+    SELECT id FROM {_CART} WHERE id = %(cart_id)s FOR UPDATE
+),
+price AS (
+    SELECT price FROM {_PRODUCT} WHERE id = %(product_id)s
+),
+line AS (
+    INSERT INTO {_ITEM} (cart_id, product_id, quantity, added_at, updated_at)
+    SELECT locked.id, %(product_id)s, %(quantity)s, now(), now() FROM price, locked
+    ON CONFLICT (cart_id, product_id) DO UPDATE
+        SET quantity = {_ITEM}.quantity + EXCLUDED.quantity, updated_at = now()
+    RETURNING id, quantity
+),
+totals AS (
+    UPDATE {_CART}
+    SET item_count = item_count + %(quantity)s,
+        subtotal = subtotal + %(quantity)s * (SELECT price FROM price),
+        updated_at = now()
+    WHERE id = %(cart_id)s AND EXISTS (SELECT 1 FROM line)
+    RETURNING item_count, subtotal
+)
+SELECT line.id, line.quantity, (SELECT price FROM price), totals.item_count, totals.subtotal
+FROM line, totals
+"""
+
+# Suma delta a la línea; si la cantidad llega a 0 o menos la elimina.
+# Ambas ramas son excluyentes, así que solo una toca la fila. El carrito se bloquea primero.
+_CHANGE_SQL = f"""
+WITH locked AS (
+    SELECT id FROM {_CART} WHERE id = %(cart_id)s FOR UPDATE
+),
+upd AS (
+    UPDATE {_ITEM} AS ci
+    SET quantity = ci.quantity + %(delta)s, updated_at = now()
+    FROM {_PRODUCT} AS p, locked
+    WHERE ci.id = %(item_id)s AND ci.cart_id = locked.id AND p.id = ci.product_id
+        AND ci.quantity + %(delta)s > 0
+    RETURNING ci.id, ci.quantity, p.price, %(delta)s AS delta
+),
+del AS (
+    DELETE FROM {_ITEM} AS ci
+    USING {_PRODUCT} AS p, locked
+    WHERE ci.id = %(item_id)s AND ci.cart_id = locked.id AND p.id = ci.product_id
+        AND ci.quantity + %(delta)s <= 0
+    RETURNING ci.id, 0 AS quantity, p.price, -ci.quantity AS delta
+),
+line AS (
+    SELECT * FROM upd UNION ALL SELECT * FROM del
+),
+totals AS (
+    UPDATE {_CART} AS c
+    SET item_count = c.item_count + line.delta,
+        subtotal = c.subtotal + line.delta * line.price,
+        updated_at = now()
+    FROM line
+    WHERE c.id = %(cart_id)s
+    RETURNING c.item_count, c.subtotal
+)
+SELECT line.id, line.quantity, line.price, totals.item_count, totals.subtotal
+FROM line, totals
+"""
+
+
+# Mueve todas las líneas del carrito invitado al del usuario sumando cantidades
+_MERGE_SQL = f"""
+WITH moved AS (
+    INSERT INTO {_ITEM} (cart_id, product_id, quantity, added_at, updated_at)
+    SELECT %(user_cart_id)s, product_id, quantity, added_at, now()
+    FROM {_ITEM}
+    WHERE cart_id = %(guest_cart_id)s
+    ON CONFLICT (cart_id, product_id) DO UPDATE
+        SET quantity = {_ITEM}.quantity + EXCLUDED.quantity, updated_at = now()
+    RETURNING 1
+)
+SELECT count(*) FROM moved
+"""
+
+
+class CartOperation(NamedTuple):
+    """Operación de un lote: identifica la línea por item o producto y cambia por delta o cantidad"""
+
+    item_id: Optional[int] = None
+    product_id: Optional[int] = None
+    delta: Optional[int] = None
+    quantity: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CartOperation":
+        """
+        Construye la operación validando el payload del cliente.
+
+        Raises:
+            ValueError: Si falta el identificador o el cambio, o no son enteros
+        """
+        if not isinstance(data, dict):
+            raise ValueError("Operación inválida")
+        values = {}
+        for key in cls._fields:
+            if data.get(key) is not None:
+                try:
+                    values[key] = int(data[key])
+                except (TypeError, ValueError):
+                    raise ValueError(f"{key} debe ser un entero")
+        if ("item_id" in values) == ("product_id" in values):
+            raise ValueError("Indica item_id o product_id")
+        if ("delta" in values) == ("quantity" in values):
+            raise ValueError("Indica delta o quantity")
+        if values.get("quantity", 0) < 0:
+            raise ValueError("La cantidad no puede ser negativa")
+        return cls(**values)
+
+
+class CartService:
+    """
+    Mutaciones del carrito en un solo viaje a la base de datos.
+    En PostgreSQL cada operación es una sola sentencia (INSERT ... ON CONFLICT
+    o UPDATE/DELETE ... RETURNING) que también actualiza los totales del carrito.
+    En otros motores usa el ORM con F() dentro de una transacción.
+    """
+
+    # Delta suficientemente negativo para eliminar cualquier línea
+    _REMOVE_DELTA = -(2**31)
+
+    @staticmethod
+    def add_product(cart: Cart, product_id: int, quantity: int = 1) -> Optional[CartMutation]:
+        """
+        Agrega quantity unidades del producto al carrito.
+
+        Args:
+            cart: Carrito destino
+            product_id: ID del producto
+            quantity: Unidades a sumar
+
+        Returns:
+            CartMutation o None si el producto no existe
+        """
+        if connection.vendor == "postgresql":
+            return CartService._execute(
+                _ADD_SQL,
+                {"cart_id": cart.pk, "product_id": product_id, "quantity": quantity},
+            )
+
+        with transaction.atomic():
+            product = Product.objects.filter(pk=product_id).only("price").first()
+            if product is None:
+                return None
+            item, created = CartItem.objects.select_for_update().get_or_create(
+                cart=cart, product=product, defaults={"quantity": 0}
+            )
+            item.increase_quantity(quantity)
+            return CartService._orm_result(cart, item, product.price, item.pk)
+
+    @staticmethod
+    def change_quantity(cart: Cart, item_id: int, delta: int) -> Optional[CartMutation]:
+        """
+        Suma delta (positivo o negativo) a una línea; la elimina si llega a 0.
+
+        Args:
+            cart: Carrito dueño de la línea
+            item_id: ID del CartItem
+            delta: Unidades a sumar o restar
+
+        Returns:
+            CartMutation o None si la línea no pertenece al carrito
+        """
+        if connection.vendor == "postgresql":
+            return CartService._execute(
+                _CHANGE_SQL, {"cart_id": cart.pk, "item_id": item_id, "delta": delta}
+            )
+
+        with transaction.atomic():
+            item = (
+                CartItem.objects.select_for_update()
+                .select_related("product")
+                .filter(pk=item_id, cart=cart)
+                .first()
+            )
+            if item is None:
+                return None
+            if delta >= 0:
+                item.increase_quantity(delta)
+            else:
+                item.decrease_quantity(-delta)  # Elimina la línea si llega a 0
+            return CartService._orm_result(cart, item, item.product.price, item_id)
+
+    @staticmethod
+    def remove_item(cart: Cart, item_id: int) -> Optional[CartMutation]:
+        """Elimina una línea del carrito"""
+        return CartService.change_quantity(cart, item_id, CartService._REMOVE_DELTA)
+
+    @staticmethod
+    def apply_batch(cart: Cart, operations: list[CartOperation]) -> int:
+        """
+        Aplica un lote de operaciones en una transacción: bloquea la fila del
+        carrito, lee sus líneas, hace un upsert masivo, un DELETE y suma la
+        diferencia a los totales, sin importar cuántas operaciones o líneas haya.
+        El bloqueo es sobre el carrito y no solo sobre las líneas existentes: un
+        add_product concurrente no puede insertar una línea que el lote leyó como 0.
+
+        Args:
+            cart: Carrito a modificar
+            operations: Operaciones en el orden en que el usuario las hizo
+
+        Returns:
+            Cantidad de líneas modificadas
+        """
+        with transaction.atomic():
+            Cart.objects.select_for_update().only("pk").get(pk=cart.pk)
+            current = {
+                row["product_id"]: row
+                for row in CartItem.objects.filter(cart=cart).values(
+                    "id", "product_id", "quantity", price=F("product__price")
+                )
+            }
+            product_by_item = {row["id"]: pid for pid, row in current.items()}
+
+            # Cantidad final por producto, respetando el orden de las operaciones
+            targets: dict[int, int] = {}
+            for op in operations:
+                if op.item_id is not None:
+                    product_id = product_by_item.get(op.item_id)
+                    if product_id is None:
+                        continue  # La línea no pertenece a este carrito
+                else:
+                    product_id = op.product_id
+                if op.quantity is not None:
+                    quantity = op.quantity
+                else:
+                    existing = current.get(product_id, {}).get("quantity", 0)
+                    quantity = targets.get(product_id, existing) + op.delta
+                targets[product_id] = max(quantity, 0)
+
+            prices = {pid: row["price"] for pid, row in current.items()}
+            new_products = [pid for pid, qty in targets.items() if qty and pid not in current]
+            if new_products:
+                prices.update(Product.objects.filter(pk__in=new_products).values_list("pk", "price"))
+                targets = {pid: qty for pid, qty in targets.items() if pid in prices}
+
+            upserts = [
+                CartItem(cart=cart, product_id=pid, quantity=qty)
+                for pid, qty in targets.items()
+                if qty > 0 and qty != current.get(pid, {}).get("quantity")
+            ]
+            removed = [pid for pid, qty in targets.items() if qty == 0 and pid in current]
+
+            if upserts:
+                CartItem.objects.bulk_create(
+                    upserts,
+                    update_conflicts=True,
+                    unique_fields=["cart", "product"],
+                    update_fields=["quantity", "updated_at"],
+                )
+            if removed:
+                CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+            if upserts or removed:
+                # Misma lógica incremental que CartItem.save(): solo la diferencia por línea
+                changes = {
+                    pid: qty - current.get(pid, {}).get("quantity", 0)
+                    for pid, qty in targets.items()
+                    if pid in current or qty > 0
+                }
+                Cart.apply_delta(
+                    cart.pk,
+                    sum(changes.values()),
+                    sum((prices[pid] * diff for pid, diff in changes.items()), start=Decimal("0.00")),
+                )
+            return len(upserts) + len(removed)
+
+    @staticmethod
+    def merge_guest_cart(guest_cart_id: int, user) -> int:
+        """
+        Fusiona el carrito de invitado en el del usuario al iniciar sesión:
+        un upsert masivo suma cantidades por (cart, product), se reconcilian
+        los totales y se elimina el carrito invitado.
+        El carrito invitado se bloquea primero, así dos logins simultáneos
+        (dos pestañas) se serializan y el segundo no encuentra nada que fusionar.
+
+        Args:
+            guest_cart_id: ID del carrito de sesión
+            user: Usuario que acaba de autenticarse
+
+        Returns:
+            Cantidad de líneas fusionadas
+        """
+        with transaction.atomic():
+            guest = (
+                Cart.objects.select_for_update()
+                .filter(pk=guest_cart_id, user__isnull=True)
+                .only("pk")
+                .first()
+            )
+            if guest is None:
+                return 0
+            user_cart, _ = Cart.objects.get_or_create(user=user)
+
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        _MERGE_SQL,
+                        {"user_cart_id": user_cart.pk, "guest_cart_id": guest.pk},
+                    )
+                    merged = cursor.fetchone()[0]
+            else:
+                guest_items = list(
+                    CartItem.objects.filter(cart=guest).values_list("product_id", "quantity")
+                )
+                existing = dict(
+                    CartItem.objects.select_for_update()
+                    .filter(cart=user_cart, product_id__in=[pid for pid, _ in guest_items])
+                    .values_list("product_id", "quantity")
+                )
+                CartItem.objects.bulk_create(
+                    [
+                        CartItem(cart=user_cart, product_id=pid, quantity=qty + existing.get(pid, 0))
+                        for pid, qty in guest_items
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["cart", "product"],
+                    update_fields=["quantity", "updated_at"],
+                )
+                merged = len(guest_items)
+
+            if merged:
+                Cart.recalculate_totals(Cart.objects.filter(pk=user_cart.pk))
+            delete_carts_in_batches(Cart.objects.filter(pk=guest.pk, user__isnull=True))
+            return merged
+
+    @staticmethod
+    def _execute(sql: str, params: dict) -> Optional[CartMutation]:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        return CartMutation(*row) if row else None
+
+    @staticmethod
+    def _orm_result(cart, item, price, item_id) -> CartMutation:
+        totals = Cart.objects.filter(pk=cart.pk).values("item_count", "subtotal").get()
+        return CartMutation(
+            item_id=item_id,
+            quantity=item.quantity if item.pk else 0,  # pk es None si se eliminó
+            price=price,
+            cart_count=totals["item_count"],
+            cart_subtotal=totals["subtotal"],
+        )
+
+
+_ORDER = Order._meta.db_table
+
+# Valida la transición en el mismo UPDATE: solo cambian los pedidos cuyo estado
+# actual puede pasar al nuevo.
+_TRANSITION_SQL = f"""
+UPDATE {_ORDER} SET status = %s, updated_at = %s
+WHERE id IN ({{ids}}) AND status IN ({{sources}})
+RETURNING id
+"""
+
+# Máximo de pedidos por cambio de estado masivo
+MAX_TRANSITION_IDS = 1000
+
+
+class TransitionResult(NamedTuple):
+    """Pedidos que cambiaron de estado y los rechazados (inexistentes o transición no permitida)"""
+
+    updated: list[int]
+    rejected: list[int]
+
+
+class OrderService:
+    """Creación de pedidos a partir del carrito y cambios de estado por lotes"""
+
+    @staticmethod
+    def place_order(cart: Cart, order: Order) -> Order:
+        """
+        Convierte el carrito en un pedido: lee las líneas con sus productos en
+        una consulta, calcula los totales en memoria, inserta el Order una vez,
+        crea los OrderItem con bulk_create y vacía el carrito.
+        Usado por el checkout y por la captura de PayPal.
+
+        Args:
+            cart: Carrito a convertir
+            order: Pedido sin guardar con los datos de envío y pago
+
+        Returns:
+            El pedido guardado
+
+        Raises:
+            ValueError: Si el carrito está vacío
+        """
+        with transaction.atomic():
+            items = list(
+                CartItem.objects.select_for_update(of=("self",))
+                .filter(cart=cart)
+                .select_related("product")
+                .order_by("added_at")
+            )
+            if not items:
+                raise ValueError("El carrito está vacío")
+
+            lines = [
+                OrderItem(product=item.product, quantity=item.quantity, price=item.product.price)
+                for item in items
+            ]
+            order.subtotal = sum(
+                (line.get_total_price() for line in lines), start=Decimal("0.00")
+            )
+            order.tax = Decimal("0.00")  # IVA deshabilitado
+            order.total = order.subtotal + order.tax + order.shipping_cost - order.discount
+            # bulk_create no emite señales: el pedido y sus items se registran juntos
+            order._sales_recorded_later = True
+            order.save()
+
+            for line in lines:
+                line.order = order
+            OrderItem.objects.bulk_create(lines)
+            rollups.record_order(None, order.sales_snapshot(), items=sum(line.quantity for line in lines))
+            cart.clear()
+        return order
+
+    @staticmethod
+    def transition(order_ids, status: str, user=None) -> TransitionResult:
+        """
+        Pasa los pedidos al estado indicado con un solo UPDATE validado contra
+        STATUS_TRANSITIONS, registra un OrderStatusEvent por pedido con bulk_create
+        y mueve su aporte en los acumulados de ventas una vez por lote (y en los
+        pares de comprados juntos si se cancela, reembolsa o reactiva).
+        Los pedidos cuyo estado actual no permite el cambio quedan como están.
+
+        Args:
+            order_ids: IDs de pedidos (a lo sumo MAX_TRANSITION_IDS)
+            status: Estado nuevo
+            user: Quién hace el cambio (para el historial)
+
+        Returns:
+            TransitionResult con los IDs actualizados y rechazados
+
+        Raises:
+            ValueError: Si el estado no existe o hay demasiados pedidos
+        """
+        if status not in Order.OrderStatus.values:
+            raise ValueError(f"Estado inválido: {status}")
+        ids = sorted(set(order_ids))
+        if len(ids) > MAX_TRANSITION_IDS:
+            raise ValueError(f"Máximo {MAX_TRANSITION_IDS} pedidos por cambio")
+        sources = sorted(source for source, targets in STATUS_TRANSITIONS.items() if status in targets)
+        if not ids or not sources:
+            return TransitionResult([], ids)
+
+        with transaction.atomic():
+            # Bloquea los candidatos y lee su estado anterior (para el historial y los acumulados);
+            # RETURNING OLD no existe en todas las bases
+            locked = {
+                pk: (created_at, previous, method, paid, total)
+                for pk, previous, created_at, method, paid, total in Order.objects.select_for_update()
+                .filter(pk__in=ids, status__in=sources)
+                .order_by("pk")
+                .values_list("pk", "status", "created_at", "payment_method", "payment_status", "total")
+            }
+            if not locked:
+                return TransitionResult([], ids)
+            now = timezone.now()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    _TRANSITION_SQL.format(
+                        ids=", ".join(["%s"] * len(locked)), sources=", ".join(["%s"] * len(sources))
+                    ),
+                    [status, now, *locked, *sources],
+                )
+                updated = sorted(row[0] for row in cursor.fetchall())
+
+            OrderStatusEvent.objects.bulk_create(
+                [
+                    OrderStatusEvent(
+                        order_id=pk, from_status=locked[pk][1], to_status=status, changed_by=user, created_at=now
+                    )
+                    for pk in updated
+                ]
+            )
+            items = rollups.items_by_order(updated)
+            rollups.record_orders(
+                (
+                    ((created_at, previous, method, paid), total),
+                    ((created_at, status, method, paid), total),
+                    items.get(pk, 0),
+                )
+                for pk, (created_at, previous, method, paid, total) in ((pk, locked[pk]) for pk in updated)
+            )
+            apply_status_changes((pk, locked[pk][1], status) for pk in updated)
+
+        return TransitionResult(updated, sorted(set(ids) - set(updated)))
+
+
+class CartPurgeResult(NamedTuple):
+    """Métricas de una purga de carritos"""
+
+    carts: int
+    items: int
+    batches: int
+    seconds: float
+
+
+def delete_carts_in_batches(queryset, batch_size: Optional[int] = None) -> CartPurgeResult:
+    """
+    Elimina los carritos del queryset (y sus items) en lotes acotados,
+    paginando por clave (pk > último) para que cada DELETE sea corto y use el índice.
+    El filtro se vuelve a aplicar al borrar, así un carrito reactivado entre la
+    lectura y el borrado no se elimina.
+
+    Args:
+        queryset: Carritos candidatos
+        batch_size: Carritos por lote (CART_PURGE_BATCH_SIZE por defecto)
+
+    Returns:
+        CartPurgeResult con conteos y duración
+    """
+    batch_size = batch_size or getattr(settings, "CART_PURGE_BATCH_SIZE", 500)
+    started = time.monotonic()
+    carts = items = batches = 0
+    last_pk = 0
+
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            _, per_model = queryset.filter(pk__in=ids).delete()
+        carts += per_model.get(Cart._meta.label, 0)
+        items += per_model.get(CartItem._meta.label, 0)
+        batches += 1
+        last_pk = ids[-1]
+        if len(ids) < batch_size:
+            break
+
+    return CartPurgeResult(carts, items, batches, time.monotonic() - started)
+
+
+def idle_carts_queryset(guest_ttl_days: int, user_ttl_days: Optional[int] = None):
+    """
+    Carritos abandonados: invitados sin actividad en guest_ttl_days o cuya sesión
+    ya expiró, y opcionalmente carritos de usuarios sin actividad en user_ttl_days.
+    """
+    now = timezone.now()
+    idle = Q(user__isnull=True, updated_at__lt=now - timedelta(days=guest_ttl_days))
+
+    if settings.SESSION_ENGINE == "django.contrib.sessions.backends.db":
+        from django.contrib.sessions.models import Session
+
+        live_session = Session.objects.filter(
+            session_key=OuterRef("session_key"), expire_date__gt=now
+        )
+        idle |= Q(user__isnull=True) & ~Exists(live_session)
+
+    if user_ttl_days:
+        idle |= Q(user__isnull=False, updated_at__lt=now - timedelta(days=user_ttl_days))
+
+    return Cart.objects.filter(idle)
+
+
+def purge_idle_carts(
+    guest_ttl_days: Optional[int] = None,
+    user_ttl_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    clear_sessions: bool = False,
+) -> CartPurgeResult:
+    """
+    Purga carritos abandonados y, opcionalmente, las sesiones expiradas.
+    Usado por el comando purge_carts y por la tarea periódica en proceso.
+
+    Args:
+        guest_ttl_days: Días de inactividad para carritos de invitados
+        user_ttl_days: Días de inactividad para carritos de usuarios (None = conservar)
+        batch_size: Carritos por lote
+        clear_sessions: También elimina sesiones expiradas (como clearsessions)
+
+    Returns:
+        CartPurgeResult con conteos y duración
+    """
+    if guest_ttl_days is None:
+        guest_ttl_days = getattr(settings, "CART_GUEST_TTL_DAYS", 30)
+    if user_ttl_days is None:
+        user_ttl_days = getattr(settings, "CART_USER_TTL_DAYS", None)
+
+    result = delete_carts_in_batches(
+        idle_carts_queryset(guest_ttl_days, user_ttl_days), batch_size
+    )
+    logger.info(
+        f"Purga de carritos: {result.carts} carritos, {result.items} items "
+        f"en {result.batches} lotes ({result.seconds:.2f}s)"
+    )
+
+    if clear_sessions:
+        engine = import_module(settings.SESSION_ENGINE)
+        try:
+            engine.SessionStore.clear_expired()
+        except NotImplementedError:
+            logger.warning(f"El backend de sesiones {settings.SESSION_ENGINE} no soporta clear_expired")
+
+    return result
@@ -0,0 +1,37 @@
+"""
+Purga periódica de carritos en un proceso dedicado.
+Alternativa al cron con `manage.py purge_carts` cuando no hay un scheduler
+externo: `manage.py purge_carts --every 3600` (servicio cart-purge de
+docker-compose). Nunca se inicia desde los workers web, así cada lote lo
+borra un solo proceso.
+"""
+
+import logging
+import threading
+from typing import Optional
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def run_purge_loop(interval: int, purge, stop: Optional[threading.Event] = None) -> None:
+    """
+    Ejecuta purge() ahora y luego cada interval segundos hasta que se active stop.
+    Un error en una corrida se registra y no detiene el ciclo.
+
+    Args:
+        interval: Segundos entre corridas
+        purge: Función sin argumentos que purga y retorna el CartPurgeResult
+        stop: Evento para detener el ciclo (None = hasta que termine el proceso)
+    """
+    stop = stop or threading.Event()
+    while True:
+        try:
+            purge()
+        except Exception as e:
+            logger.error(f"Error en la purga periódica de carritos: {str(e)}")
+        finally:
+            close_old_connections()
+        if stop.wait(interval):
+            return
@@ -1,3 +1,824 @@
-from django.test import TestCase
+"""
+Tests del carrito de compras.
+Cubren la foto del carrito por request, los totales denormalizados,
+el número de consultas de los endpoints AJAX, la creación de pedidos,
+la fusión al iniciar sesión y la purga de carritos.
+"""
 
-# Create your tests here.
+import re
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+import cloudinary
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.products.models import Category, Product
+from .context_processors import cart_context
+from . import rollups
+from .admin import CartItemInline
+from .tasks import run_purge_loop
+from .models import Cart, CartItem, DailySales, HourlySales, Order, OrderItem, OrderStatusEvent
+from .services import (
+    GUEST_CART_SESSION_KEY,
+    CartService,
+    OrderService,
+    get_cart_snapshot,
+    purge_idle_carts,
+)
+
+
+class CartTestMixin:
+    """Datos comunes: un usuario con un carrito de varios productos."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username="buyer@example.com", email="buyer@example.com", password="pass12345"
+        )
+        self.category = Category.objects.create(name="Servicios", slug="servicios")
+        self.products = [
+            Product.objects.create(
+                name=f"Producto {i}", price=Decimal("10.50"), category=self.category
+            )
+            for i in range(5)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        for i, product in enumerate(self.products):
+            CartItem.objects.create(cart=self.cart, product=product, quantity=i + 1)
+
+    def _add_products(self, count):
+        """Agrega count productos nuevos al carrito"""
+        for i in range(count):
+            product = Product.objects.create(
+                name=f"Extra {i}", price=Decimal("1.00"), category=self.category
+            )
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+
+    def _request(self):
+        request = self.factory.get("/")
+        request.user = self.user
+        return request
+
+
+class CartSnapshotTest(CartTestMixin, TestCase):
+    """Tests para CartSnapshot y el context processor."""
+
+    def test_snapshot_totals(self):
+        """Los totales se calculan una vez a partir de los items cargados."""
+        snapshot = get_cart_snapshot(self._request())
+        self.assertEqual(snapshot.cart, self.cart)
+        self.assertEqual(snapshot.count, 15)
+        self.assertEqual(snapshot.subtotal, Decimal("157.50"))
+        self.assertEqual(snapshot.total, Decimal("157.50"))
+
+    def test_snapshot_single_query(self):
+        """Cargar el carrito y recorrer productos/categorías cuesta una consulta."""
+        request = self._request()
+        with self.assertNumQueries(1):
+            snapshot = get_cart_snapshot(request)
+            for item in snapshot.items:
+                str(item.product.category)
+                item.cart.id
+
+    def test_context_processor_reuses_snapshot(self):
+        """Varios renders en el mismo request no vuelven a consultar el carrito."""
+        request = self._request()
+        with self.assertNumQueries(1):
+            first = cart_context(request)
+            second = cart_context(request)
+        self.assertEqual(first["cart_count"], second["cart_count"])
+
+    def test_anonymous_without_session(self):
+        """Visitante sin sesión: snapshot vacío sin tocar la base de datos."""
+        request = self.factory.get("/")
+        request.user = type("Anon", (), {"is_authenticated": False})()
+        request.session = type("Session", (), {"session_key": None})()
+        with self.assertNumQueries(0):
+            ctx = cart_context(request)
+        self.assertEqual(ctx["cart_count"], 0)
+        self.assertEqual(ctx["cart_items"], [])
+
+    def test_cart_view_renders_totals(self):
+        """La página del carrito muestra los totales del snapshot."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("orders:cart_view"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cart_count"], 15)
+        self.assertEqual(response.context["cart_subtotal"], Decimal("157.50"))
+
+
+class CartTotalsTest(CartTestMixin, TestCase):
+    """Tests para los totales denormalizados del carrito."""
+
+    def assertTotals(self, count, subtotal):
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, count)
+        self.assertEqual(self.cart.subtotal, Decimal(subtotal))
+
+    def test_totals_on_create(self):
+        """Crear items suma su cantidad y monto."""
+        self.assertTotals(15, "157.50")
+
+    def test_increase_and_decrease(self):
+        """Aumentar y disminuir actualizan los totales con F()."""
+        item = CartItem.objects.get(cart=self.cart, product=self.products[0])
+        item.increase_quantity(2)
+        self.assertTotals(17, "178.50")
+        item.decrease_quantity()
+        self.assertTotals(16, "168.00")
+        item.decrease_quantity(5)
+        self.assertFalse(CartItem.objects.filter(pk=item.pk).exists())
+        self.assertTotals(14, "147.00")
+
+    def test_clear(self):
+        """Vaciar el carrito deja los totales en cero."""
+        self.cart.clear()
+        self.assertTotals(0, "0.00")
+
+    def test_price_change_reconciles(self):
+        """Cambiar el precio de un producto recalcula los carritos que lo contienen."""
+        product = self.products[4]
+        product.price = Decimal("20.50")
+        product.save()
+        self.assertTotals(15, "207.50")
+
+    def test_saving_without_price_change_skips_carts(self):
+        """Guardar otros campos del producto no recalcula los carritos."""
+        product = Product.objects.get(pk=self.products[4].pk)
+        product.description = "Nueva descripción"
+        with CaptureQueriesContext(connection) as ctx:
+            product.save()
+        self.assertFalse([q for q in ctx.captured_queries if Cart._meta.db_table in q["sql"]])
+
+        product.price = Decimal("20.50")
+        product.save(update_fields=["price"])
+        self.assertTotals(15, "207.50")
+        with self.assertNumQueries(1):
+            product.save()
+
+    def test_product_delete_reconciles(self):
+        """Eliminar un producto descuenta sus items del carrito."""
+        self.products[4].delete()
+        self.assertTotals(10, "105.00")
+
+    def test_edit_applies_difference(self):
+        """Editar la cantidad con save() (p. ej. desde el admin) aplica la diferencia."""
+        item = CartItem.objects.get(cart=self.cart, product=self.products[1])
+        item.quantity = 5
+        item.save()
+        self.assertTotals(18, "189.00")
+        item.save()
+        self.assertTotals(18, "189.00")
+
+        other = Cart.objects.create(session_key="otra-sesion")
+        item.cart = other
+        item.save()
+        self.assertTotals(13, "136.50")
+        other.refresh_from_db()
+        self.assertEqual((other.item_count, other.subtotal), (5, Decimal("52.50")))
+
+    def test_admin_edits_keep_totals(self):
+        """El inline del carrito y el borrado masivo del admin mantienen los totales."""
+        request = self.factory.post("/")
+        request.user = User.objects.create_superuser(username="root", password="pass12345")
+        items = list(CartItem.objects.filter(cart=self.cart).order_by("pk"))
+        data = {"items-TOTAL_FORMS": len(items), "items-INITIAL_FORMS": len(items)}
+        for i, item in enumerate(items):
+            data.update(
+                {
+                    f"items-{i}-id": item.pk,
+                    f"items-{i}-cart": self.cart.pk,
+                    f"items-{i}-product": item.product_id,
+                    f"items-{i}-quantity": 5 if i == 1 else item.quantity,
+                }
+            )
+        data["items-4-DELETE"] = "on"
+        formset = CartItemInline(Cart, site).get_formset(request, self.cart)(data, instance=self.cart, prefix="items")
+        self.assertTrue(formset.is_valid(), formset.errors)
+        formset.save()
+        # 15 + 3 (segunda línea de 2 a 5) - 5 (línea eliminada)
+        self.assertTotals(13, "136.50")
+
+        site._registry[CartItem].delete_queryset(request, CartItem.objects.filter(pk__in=[items[1].pk, items[2].pk]))
+        self.assertTotals(5, "52.50")
+
+    def test_badge_reads_columns(self):
+        """Los totales del carrito no consultan los items."""
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_total_items(), 15)
+            self.assertEqual(cart.get_total(), Decimal("157.50"))
+
+
+class CartServiceTest(CartTestMixin, TestCase):
+    """Tests para las mutaciones del carrito."""
+
+    def test_add_existing_product(self):
+        """Agregar un producto existente suma cantidad y retorna los nuevos totales."""
+        mutation = CartService.add_product(self.cart, self.products[0].pk, 2)
+        self.assertEqual(mutation.quantity, 3)
+        self.assertEqual(mutation.cart_count, 17)
+        self.assertEqual(mutation.cart_subtotal, Decimal("178.50"))
+
+    def test_add_missing_product(self):
+        """Un producto inexistente no modifica el carrito."""
+        self.assertIsNone(CartService.add_product(self.cart, 999999, 1))
+
+    def test_change_quantity_to_zero_removes(self):
+        """Restar hasta cero elimina la línea."""
+        item = CartItem.objects.get(cart=self.cart, product=self.products[0])
+        mutation = CartService.change_quantity(self.cart, item.pk, -1)
+        self.assertEqual(mutation.quantity, 0)
+        self.assertEqual(mutation.cart_count, 14)
+        self.assertFalse(CartItem.objects.filter(pk=item.pk).exists())
+
+    @skipUnless(connection.vendor == "postgresql", "Las sentencias de una sola consulta son de PostgreSQL")
+    def test_postgresql_mutations_are_one_statement(self):
+        """Insertar, sumar, restar y eliminar líneas son una sola consulta que también mueve los totales."""
+        new = Product.objects.create(name="Nuevo", price=Decimal("2.25"), category=self.category)
+        with self.assertNumQueries(1):
+            added = CartService.add_product(self.cart, new.pk, 2)
+        with self.assertNumQueries(1):
+            summed = CartService.add_product(self.cart, new.pk, 1)
+        self.assertEqual((added.quantity, summed.quantity, summed.item_id), (2, 3, added.item_id))
+
+        with self.assertNumQueries(1):
+            changed = CartService.change_quantity(self.cart, added.item_id, -1)
+        item = CartItem.objects.get(cart=self.cart, product=self.products[4])
+        with self.assertNumQueries(1):
+            removed = CartService.remove_item(self.cart, item.pk)
+        self.assertEqual(changed.quantity, 2)
+        self.assertEqual(removed.quantity, 0)
+        self.assertFalse(CartItem.objects.filter(pk=item.pk).exists())
+
+        # 15 + 3 - 1 - 5 unidades; 157.50 + 3 * 2.25 - 2.25 - 5 * 10.50
+        self.assertEqual((removed.cart_count, removed.cart_subtotal), (12, Decimal("109.50")))
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (12, Decimal("109.50")))
+
+    def test_remove_foreign_item(self):
+        """No se pueden eliminar líneas de otro carrito."""
+        other = Cart.objects.create(session_key="otra-sesion")
+        item = CartItem.objects.create(cart=other, product=self.products[0])
+        self.assertIsNone(CartService.remove_item(self.cart, item.pk))
+
+
+class CartEndpointQueriesTest(CartTestMixin, TestCase):
+    """El número de consultas de los endpoints no depende del tamaño del carrito."""
+
+    def _count_queries(self, url, data=None, content_type=None):
+        kwargs = {"content_type": content_type} if content_type else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data or {}, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    # Sesión, usuario, carrito, la mutación y la foto del carrito para la respuesta
+    PG_QUERIES = 5
+
+    def _assert_constant(self, make_request, orm_queries):
+        small = make_request()
+        self._add_products(30)
+        large = make_request()
+        self.assertEqual(small, large)
+        # En PostgreSQL la mutación es una sola sentencia; en otros motores, el ORM con savepoint
+        expected = self.PG_QUERIES if connection.vendor == "postgresql" else orm_queries
+        self.assertEqual(large, expected)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_add_to_cart_queries(self):
+        url = reverse("orders:add_to_cart", args=[self.products[0].pk])
+        self._assert_constant(
+            lambda: self._count_queries(url, '{"quantity": 1}', "application/json"), orm_queries=12
+        )
+
+    def test_add_missing_product_returns_json_404(self):
+        response = self.client.post(
+            reverse("orders:add_to_cart", args=[999999]), '{"quantity": 1}', content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"success": False, "error": "Producto no encontrado"})
+
+    def test_update_cart_item_queries(self):
+        item = CartItem.objects.get(cart=self.cart, product=self.products[4])
+        url = reverse("orders:update_cart_item", args=[item.pk])
+        self._assert_constant(lambda: self._count_queries(url, {"action": "decrease"}), orm_queries=10)
+
+    def test_remove_from_cart_queries(self):
+        items = iter(CartItem.objects.filter(cart=self.cart).values_list("pk", flat=True))
+        self._assert_constant(
+            lambda: self._count_queries(reverse("orders:remove_from_cart", args=[next(items)])),
+            orm_queries=10,
+        )
+
+
+class CheckoutTest(CartTestMixin, TestCase):
+    """El checkout crea el pedido en bloque con un número fijo de consultas."""
+
+    form_data = {
+        "shipping_name": "Ana Pérez",
+        "shipping_email": "ana@example.com",
+        "shipping_phone": "3001234567",
+        "shipping_address": "Calle 1 # 2-3",
+        "shipping_city": "Bogotá",
+        "payment_method": "CASH",
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def _checkout(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("orders:checkout"), self.form_data)
+        self.assertRedirects(response, reverse("orders:order_success"), fetch_redirect_response=False)
+        return len(ctx.captured_queries)
+
+    def test_checkout_creates_order(self):
+        self._checkout()
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.items.count(), 5)
+        self.assertEqual(order.subtotal, Decimal("157.50"))
+        self.assertEqual(order.total, Decimal("157.50"))
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 0)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_checkout_queries_constant(self):
+        small = self._checkout()
+        self._add_products(30)
+        for product in self.products:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+        large = self._checkout()
+        self.assertEqual(small, large)
+        self.assertEqual(Order.objects.order_by("-id").first().items.count(), 35)
+
+
+class CartBatchTest(CartTestMixin, TestCase):
+    """Tests para el endpoint de lotes del carrito."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("orders:batch_update_cart")
+        self.items = {
+            item.product_id: item for item in CartItem.objects.filter(cart=self.cart)
+        }
+
+    def _post(self, operations):
+        import json
+
+        return self.client.post(
+            self.url, json.dumps({"operations": operations}), content_type="application/json"
+        )
+
+    def test_batch_applies_operations_in_order(self):
+        """Deltas, cantidades absolutas, productos nuevos y eliminaciones en un lote."""
+        new_product = Product.objects.create(
+            name="Nuevo", price=Decimal("2.00"), category=self.category
+        )
+        first, second = self.items[self.products[0].pk], self.items[self.products[1].pk]
+        response = self._post([
+            {"item_id": first.pk, "delta": 1},
+            {"item_id": first.pk, "delta": 1},
+            {"item_id": second.pk, "quantity": 0},
+            {"product_id": new_product.pk, "delta": 3},
+            {"product_id": 999999, "delta": 1},
+        ])
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(data["changed"], 3)
+        self.assertEqual(data["items"][str(first.pk)], 3)
+        self.assertNotIn(str(second.pk), data["items"])
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 18)
+        self.assertEqual(self.cart.subtotal, Decimal("163.50"))
+
+    def test_batch_queries_constant(self):
+        """El costo del lote no crece con el número de operaciones."""
+        ops = [{"item_id": item.pk, "delta": 1} for item in self.items.values()]
+        with CaptureQueriesContext(connection) as small:
+            self._post(ops[:1])
+        with CaptureQueriesContext(connection) as large:
+            self._post(ops)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_batch_applies_difference_to_totals(self):
+        """Los totales se mueven por la diferencia del lote, sin volver a sumar el carrito."""
+        first = self.items[self.products[0].pk]
+        with CaptureQueriesContext(connection) as ctx:
+            self._post([{"item_id": first.pk, "quantity": 4}, {"product_id": self.products[4].pk, "delta": -5}])
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith(f'UPDATE "{Cart._meta.db_table}"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn("SUM(", updates[0])
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (13, Decimal("136.50")))
+
+    def test_invalid_batch(self):
+        """Payloads inválidos retornan 400 sin tocar el carrito."""
+        self.assertEqual(self._post([{"delta": 1}]).status_code, 400)
+        self.assertEqual(self._post([{"item_id": 1, "delta": "x"}]).status_code, 400)
+        self.assertEqual(self._post([{"item_id": 1, "delta": 1}] * 51).status_code, 400)
+
+
+class CartDocumentModeTest(CartTestMixin, TestCase):
+    """Tests para el modo de respuesta JSON sin render de templates."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.item = CartItem.objects.get(cart=self.cart, product=self.products[1])
+        self.url = reverse("orders:update_cart_item", args=[self.item.pk])
+
+    def test_accept_header_returns_document(self):
+        """Con Accept: application/json se retorna el documento y no HTML."""
+        response = self.client.post(
+            self.url, {"action": "increase"}, HTTP_ACCEPT="application/json"
+        )
+        data = response.json()
+        self.assertNotIn("mini_cart_html", data)
+        self.assertNotIn("cart_html", data)
+        self.assertEqual(data["cart"]["count"], 16)
+        self.assertEqual(data["cart"]["total"], "168.00")
+        line = next(i for i in data["cart"]["items"] if i["id"] == self.item.pk)
+        self.assertEqual(line["quantity"], 3)
+        self.assertEqual(line["line_total"], "31.50")
+        self.assertEqual(line["category"], "Servicios")
+
+    def test_document_images_use_thumb_preset(self):
+        """Las imágenes del documento son miniaturas con srcset, no el original."""
+        previous_cloud = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name="demo")
+        self.addCleanup(cloudinary.config, cloud_name=previous_cloud)
+        Product.objects.filter(pk=self.products[1].pk).update(image="image/upload/v1700000000/products/redmi.jpg")
+        data = self.client.post(self.url, {"action": "increase"}, HTTP_ACCEPT="application/json").json()
+        line = next(i for i in data["cart"]["items"] if i["id"] == self.item.pk)
+        self.assertIn(",w_48/", line["image"])
+        self.assertIn("w_96/v1700000000/products/redmi.jpg 96w", line["image_srcset"])
+        self.assertIsNone(next(i for i in data["cart"]["items"] if i["id"] != self.item.pk)["image"])
+
+    def test_line_templates_match_document_fields(self):
+        """La página trae los <template> de línea y cada campo que completan existe en el documento."""
+        html = self.client.get(reverse("orders:cart_view")).content.decode()
+        self.assertIn('<template id="mini-cart-line-template">', html)
+        self.assertIn('<template id="cart-table-line-template">', html)
+        self.assertIn(f'data-cart-line="{self.item.pk}"', html)
+
+        line = self.client.post(self.url, {"action": "increase"}, HTTP_ACCEPT="application/json").json()["cart"]["items"][0]
+        fields = set(re.findall(r'data-cart-field="(\w+)"', html)) - {"count", "total"}
+        self.assertEqual(fields, {"name", "category", "price", "line_total"})
+        self.assertLessEqual(fields, set(line))
+
+    def test_query_param_returns_document(self):
+        """?format=json también activa el modo documento."""
+        response = self.client.post(f"{self.url}?format=json", {"action": "decrease"})
+        self.assertIn("cart", response.json())
+
+    def test_default_mode_renders_html(self):
+        """Sin opt-in se mantienen los parciales HTML."""
+        data = self.client.post(self.url, {"action": "increase"}).json()
+        self.assertIn("mini_cart_html", data)
+        self.assertNotIn("cart", data)
+
+
+class LazyCartTest(TestCase):
+    """Los visitantes anónimos no crean sesión ni carrito al solo leer."""
+
+    def test_anonymous_cart_view_does_not_persist(self):
+        from django.contrib.sessions.models import Session
+
+        response = self.client.get(reverse("orders:cart_view"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cart_count"], 0)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_anonymous_update_without_cart(self):
+        """Modificar una línea sin carrito retorna 404 sin crear nada."""
+        response = self.client.post(reverse("orders:update_cart_item", args=[1]), {"action": "increase"})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_authenticated_cart_view_does_not_create_cart(self):
+        user = User.objects.create_user(username="lazy", password="pass12345")
+        self.client.force_login(user)
+        self.client.get(reverse("orders:cart_view"))
+        self.assertFalse(Cart.objects.filter(user=user).exists())
+
+
+class CartPurgeTest(TestCase):
+    """Purga de carritos abandonados en lotes acotados."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Servicios", slug="servicios")
+        self.product = Product.objects.create(name="Producto", price=Decimal("5.00"), category=category)
+        self.old = timezone.now() - timedelta(days=60)
+
+    def _guest_cart(self, live_session=True, idle=False):
+        session = SessionStore()
+        session.create()
+        if not live_session:
+            session.delete()
+        cart = Cart.objects.create(session_key=session.session_key)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        if idle:
+            Cart.objects.filter(pk=cart.pk).update(updated_at=self.old)
+        return cart
+
+    def test_purges_idle_guest_carts_in_batches(self):
+        idle = [self._guest_cart(idle=True) for _ in range(5)]
+        active = self._guest_cart()
+
+        result = purge_idle_carts(guest_ttl_days=30, batch_size=2)
+
+        self.assertEqual(result.carts, 5)
+        self.assertEqual(result.items, 5)
+        self.assertEqual(result.batches, 3)
+        self.assertFalse(Cart.objects.filter(pk__in=[c.pk for c in idle]).exists())
+        self.assertTrue(Cart.objects.filter(pk=active.pk).exists())
+
+    def test_purges_guest_cart_without_live_session(self):
+        orphan = self._guest_cart(live_session=False)
+        purge_idle_carts(guest_ttl_days=30)
+        self.assertFalse(Cart.objects.filter(pk=orphan.pk).exists())
+
+    def test_user_carts_kept_by_default(self):
+        user = User.objects.create_user(username="keeper", password="pass12345")
+        cart = Cart.objects.create(user=user)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=self.old)
+
+        purge_idle_carts(guest_ttl_days=30)
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+        purge_idle_carts(guest_ttl_days=30, user_ttl_days=30)
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+
+    def test_command(self):
+        self._guest_cart(idle=True)
+        out = StringIO()
+        call_command("purge_carts", "--dry-run", stdout=out)
+        self.assertIn("1 carritos", out.getvalue())
+        self.assertEqual(Cart.objects.count(), 1)
+
+        call_command("purge_carts", "--batch-size", "1", "--sessions", stdout=out)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_purge_loop_survives_errors_until_stopped(self):
+        stop = threading.Event()
+        calls = []
+
+        def purge():
+            calls.append(1)
+            if len(calls) == 3:
+                stop.set()
+            raise RuntimeError("BD no disponible")
+
+        # En otro hilo: close_old_connections() cerraría la conexión de la transacción del test
+        loop = threading.Thread(target=run_purge_loop, args=(0.01, purge, stop))
+        with self.assertLogs("apps.orders.tasks", level="ERROR"):
+            loop.start()
+            loop.join(5)
+        self.assertFalse(loop.is_alive())
+        self.assertEqual(len(calls), 3)
+
+
+class GuestCartMergeTest(CartTestMixin, TestCase):
+    """Fusión del carrito de invitado al iniciar sesión."""
+
+    def setUp(self):
+        super().setUp()
+        session = self.client.session
+        session.save()
+        self.guest = Cart.objects.create(session_key=session.session_key)
+        self.extra = Product.objects.create(
+            name="Extra", price=Decimal("2.00"), category=self.category
+        )
+        CartItem.objects.create(cart=self.guest, product=self.products[0], quantity=2)
+        CartItem.objects.create(cart=self.guest, product=self.extra, quantity=3)
+        session[GUEST_CART_SESSION_KEY] = self.guest.pk
+        session.save()
+
+    def test_login_merges_guest_cart(self):
+        self.client.force_login(self.user)
+
+        self.assertFalse(Cart.objects.filter(pk=self.guest.pk).exists())
+        quantities = dict(self.cart.items.values_list("product_id", "quantity"))
+        self.assertEqual(quantities[self.products[0].pk], 3)
+        self.assertEqual(quantities[self.extra.pk], 3)
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 20)
+        self.assertEqual(self.cart.subtotal, Decimal("184.50"))
+        self.assertNotIn(GUEST_CART_SESSION_KEY, self.client.session)
+
+    def test_login_creates_user_cart_when_missing(self):
+        user = User.objects.create_user(username="nuevo", password="pass12345")
+        self.client.force_login(user)
+
+        cart = Cart.objects.get(user=user)
+        self.assertEqual(cart.item_count, 5)
+        self.assertEqual(cart.subtotal, Decimal("27.00"))
+
+    def test_repeated_merge_is_noop(self):
+        """Un segundo login (otra pestaña) no vuelve a sumar cantidades."""
+        self.assertEqual(CartService.merge_guest_cart(self.guest.pk, self.user), 2)
+        self.assertEqual(CartService.merge_guest_cart(self.guest.pk, self.user), 0)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 20)
+
+    def test_user_cart_is_never_merged(self):
+        other = User.objects.create_user(username="otro", password="pass12345")
+        self.assertEqual(CartService.merge_guest_cart(self.cart.pk, other), 0)
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk, user=self.user).exists())
+
+
+class SalesRollupTest(CartTestMixin, TestCase):
+    """Los acumulados de ventas siguen a los pedidos y coinciden con un recálculo."""
+
+    def _place(self, **fields):
+        order = Order(
+            user=self.user,
+            shipping_name="Ana",
+            shipping_email="ana@example.com",
+            shipping_phone="3000000000",
+            shipping_address="Calle 1",
+            shipping_city="Bogotá",
+            **fields,
+        )
+        return OrderService.place_order(self.cart, order)
+
+    def _rows(self):
+        return {
+            model.__name__: sorted(
+                (
+                    row
+                    for row in model.objects.values_list(
+                        bucket, "status", "payment_method", "paid", "orders", "total", "items"
+                    )
+                    if any(row[4:])
+                ),
+                key=str,
+            )
+            for model, bucket in ((HourlySales, "hour"), (DailySales, "day"))
+        }
+
+    def _assert_matches_rebuild(self):
+        incremental = self._rows()
+        rollups.rebuild_sales_rollups()
+        self.assertEqual(incremental, self._rows())
+
+    def test_place_order_records_order_and_items(self):
+        self._place()
+        row = DailySales.objects.get()
+        self.assertEqual((row.status, row.paid, row.orders, row.items), ("PENDING", False, 1, 15))
+        self.assertEqual(row.total, Decimal("157.50"))
+        self.assertEqual(HourlySales.objects.get().hour, timezone.localtime().replace(minute=0, second=0, microsecond=0))
+
+    def test_status_change_moves_contribution(self):
+        order = self._place()
+        order = Order.objects.get(pk=order.pk)
+        order.status = Order.OrderStatus.DELIVERED
+        order.payment_status = True
+        order.save()
+        rows = {(row.status, row.paid): (row.orders, row.items) for row in DailySales.objects.all()}
+        self.assertEqual(rows[("PENDING", False)], (0, 0))
+        self.assertEqual(rows[("DELIVERED", True)], (1, 15))
+        self._assert_matches_rebuild()
+
+    def test_bulk_update_and_delete(self):
+        first = self._place()
+        for product in self.products[:2]:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=2)
+        self._place(payment_method=Order.PaymentMethod.PAYPAL)
+        OrderItem.objects.filter(order=first).first().delete()
+
+        result = OrderService.transition(Order.objects.values_list("pk", flat=True), Order.OrderStatus.PROCESSING)
+        self.assertEqual(len(result.updated), 2)
+        self._assert_matches_rebuild()
+
+        Order.objects.get(pk=first.pk).delete()
+        self._assert_matches_rebuild()
+        self.assertEqual(sum(DailySales.objects.values_list("orders", flat=True)), 1)
+
+    def test_deleting_orders_subtracts_each_order_once(self):
+        large = self._place()
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=3)
+        small = self._place()
+
+        # El costo no depende de los items: sin un SELECT del pedido ni un upsert por item
+        with CaptureQueriesContext(connection) as five_items:
+            Order.objects.get(pk=large.pk).delete()
+        self._assert_matches_rebuild()
+        with CaptureQueriesContext(connection) as one_item:
+            Order.objects.get(pk=small.pk).delete()
+        self.assertEqual(len(five_items.captured_queries), len(one_item.captured_queries))
+
+        for _ in range(2):
+            CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=2)
+            self._place()
+        Order.objects.all().delete()
+        self._assert_matches_rebuild()
+        self.assertFalse(DailySales.objects.exclude(orders=0, total=0, items=0).exists())
+
+    def test_rebuild_restores_bulk_created_orders(self):
+        Order.objects.bulk_create(
+            [Order(user=self.user, total=Decimal("10.00"), payment_status=i % 2 == 0) for i in range(4)]
+        )
+        self.assertFalse(DailySales.objects.exists())
+        out = StringIO()
+        call_command("rebuild_sales_rollups", stdout=out)
+        self.assertIn("4 pedidos", out.getvalue())
+        summary = rollups.sales_summary()
+        self.assertEqual(summary["total_orders"], 4)
+        self.assertEqual(summary["total_revenue"], Decimal("20.00"))
+        self.assertEqual(summary["daily_sales"][-1]["orders"], 4)
+        self.assertEqual(summary["comparisons"][1].current, 4)
+
+    def test_dashboard_queries_do_not_grow_with_orders(self):
+        staff = User.objects.create_user(username="staff@example.com", password="pass12345", is_staff=True)
+        self.client.force_login(staff)
+        self._place()
+        # La primera visita cachea los conteos de usuarios y productos
+        self.client.get(reverse("admin:admin_dashboard"))
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse("admin:admin_dashboard"))
+        Order.objects.bulk_create([Order(user=self.user, total=Decimal("1.00")) for _ in range(50)])
+        rollups.rebuild_sales_rollups()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse("admin:admin_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(response.context["total_orders"], 51)
+        self.assertFalse(any("SUM" in q["sql"] and '"orders_order"' in q["sql"] for q in large.captured_queries))
+
+
+class OrderTransitionTest(TestCase):
+    """Los cambios de estado por lote validan la transición, dejan historial y mueven los acumulados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff@example.com", is_staff=True)
+        category = Category.objects.create(name="Servicios", slug="servicios")
+        product = Product.objects.create(name="Liberación", price=Decimal("10.00"), category=category)
+        statuses = [Order.OrderStatus.PENDING, Order.OrderStatus.PROCESSING, Order.OrderStatus.DELIVERED]
+        for i in range(6):
+            order = Order.objects.create(user=cls.staff, status=statuses[i % 3], total=Decimal("10.00") * (i + 1))
+            OrderItem.objects.create(order=order, product=product, quantity=i + 1, price=Decimal("10.00"))
+        cls.orders = list(Order.objects.order_by("pk"))
+
+    def _pks(self, status):
+        return [order.pk for order in self.orders if order.status == status]
+
+    def test_only_allowed_transitions_apply(self):
+        result = OrderService.transition([order.pk for order in self.orders], Order.OrderStatus.CANCELLED, self.staff)
+        self.assertEqual(result.updated, sorted(self._pks("PENDING") + self._pks("PROCESSING")))
+        self.assertEqual(result.rejected, self._pks("DELIVERED"))
+        self.assertEqual(
+            set(Order.objects.filter(pk__in=result.rejected).values_list("status", flat=True)), {"DELIVERED"}
+        )
+        # DELIVERED no puede volver a PENDING
+        result = OrderService.transition(self._pks("DELIVERED"), Order.OrderStatus.PENDING)
+        self.assertEqual(result.updated, [])
+
+    def test_events_recorded_per_order(self):
+        pks = self._pks("PENDING")
+        OrderService.transition(pks + [999999], Order.OrderStatus.PROCESSING, self.staff)
+        events = OrderStatusEvent.objects.order_by("order_id").values_list(
+            "order_id", "from_status", "to_status", "changed_by"
+        )
+        self.assertEqual(list(events), [(pk, "PENDING", "PROCESSING", self.staff.pk) for pk in pks])
+
+    def test_rollups_match_rebuild(self):
+        OrderService.transition([order.pk for order in self.orders], Order.OrderStatus.CANCELLED)
+        OrderService.transition(self._pks("DELIVERED"), Order.OrderStatus.REFUNDED)
+        incremental = sorted(DailySales.objects.filter(orders__gt=0).values_list("status", "orders", "total", "items"))
+        rollups.rebuild_sales_rollups()
+        self.assertEqual(incremental, sorted(DailySales.objects.values_list("status", "orders", "total", "items")))
+        self.assertEqual(dict((row[0], row[1]) for row in incremental), {"CANCELLED": 4, "REFUNDED": 2})
+
+    def test_queries_do_not_grow_with_batch(self):
+        with CaptureQueriesContext(connection) as one:
+            OrderService.transition(self._pks("PENDING")[:1], Order.OrderStatus.CANCELLED)
+        with CaptureQueriesContext(connection) as many:
+            OrderService.transition(self._pks("PROCESSING") + self._pks("PENDING")[1:], Order.OrderStatus.CANCELLED)
+        self.assertEqual(len(one.captured_queries), len(many.captured_queries))
+
+    def test_invalid_status_or_batch(self):
+        with self.assertRaises(ValueError):
+            OrderService.transition([self.orders[0].pk], "LOST")
+        with self.assertRaises(ValueError):
+            OrderService.transition(range(2000), Order.OrderStatus.CANCELLED)
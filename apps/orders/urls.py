@@ -14,4 +14,5 @@ urlpatterns = [
     path('api/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('api/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('api/update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
+    path('api/batch/', views.batch_update_cart, name='batch_update_cart'),
 ]
@@ -1,45 +1,106 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.template.loader import render_to_string
 from django.contrib import messages
-from django.db import transaction
-from apps.products.models import Product
-from .models import Cart, CartItem, Order, OrderItem
+from .models import Cart, Order
 from .forms import CheckoutForm
+from .services import (
+    GUEST_CART_SESSION_KEY,
+    CartOperation,
+    CartService,
+    OrderService,
+    get_cart_snapshot,
+    peek_cart_snapshot,
+)
 
 
-def _get_cart(request):
-    """Helper para obtener o crear el carrito basado en sesión o usuario"""
+def _get_cart(request, create=True):
+    """
+    Helper para obtener el carrito basado en sesión o usuario.
+    Solo con create=True (primera mutación) se crean la sesión y el carrito;
+    las lecturas y mutaciones sobre líneas existentes retornan None si no hay carrito.
+    """
+    # Reutiliza el carrito de la foto del request si ya fue cargada
+    snapshot = peek_cart_snapshot(request)
+    if snapshot is not None and snapshot.cart is not None:
+        return snapshot.cart
+
     if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        lookup = {'user': request.user}
     else:
         if not request.session.session_key:
+            if not create:
+                return None
             request.session.create()
-        
-        cart, created = Cart.objects.get_or_create(
-            session_key=request.session.session_key,
-            defaults={'user': None}
-        )
+        lookup = {'session_key': request.session.session_key}
+
+    if create:
+        cart, created = Cart.objects.get_or_create(**lookup)
+        if created and not request.user.is_authenticated:
+            # Permite fusionarlo con el carrito del usuario al iniciar sesión
+            request.session[GUEST_CART_SESSION_KEY] = cart.pk
+    else:
+        cart = Cart.objects.filter(**lookup).first()
+    if snapshot is not None:
+        snapshot.cart = cart
     return cart
 
 
-def _get_cart_context(cart):
+def _get_cart_context(request, refresh=False):
     """Helper para generar contexto consistente del carrito"""
-    # Forzar refresco de los items para evitar caché de objeto
-    cart_items = list(CartItem.objects.filter(cart=cart).select_related('product').order_by('added_at'))
-    cart_count = sum(item.quantity for item in cart_items)
-    
-    # Recalcular totales manualmente por si el objeto cart tiene valores viejos
-    subtotal = sum(item.get_total_price() for item in cart_items)
-    
-    return {
-        'cart': cart,
-        'cart_items': cart_items,
-        'cart_count': cart_count,
-        'cart_total': subtotal,
+    # refresh=True recarga la foto del carrito después de una mutación
+    return get_cart_snapshot(request, refresh=refresh).as_context()
+
+
+def _wants_cart_document(request):
+    """El cliente pide el carrito como JSON (Accept o ?format=json) en lugar de HTML"""
+    return (
+        request.GET.get('format') == 'json'
+        or 'application/json' in request.headers.get('Accept', '')
+    )
+
+
+def _cart_payload(request, snapshot, include_table=True):
+    """
+    Representación del carrito para las respuestas AJAX.
+    En modo JSON (el que usa cart.js) retorna el documento del carrito y no se
+    renderiza ningún template: el navegador clona las líneas de los <template>
+    que trae la página. Sin opt-in renderiza los parciales HTML, sin request para
+    que no corran los context processors (cart_context leería el carrito otra vez).
+    """
+    if _wants_cart_document(request):
+        return {'cart': snapshot.as_document()}
+
+    ctx = snapshot.as_context()
+    data = {'mini_cart_html': render_to_string('components/mini_cart.html', ctx)}
+    if include_table:
+        try:
+            data['cart_html'] = render_to_string('orders/partials/cart_table.html', ctx)
+        except Exception as e:
+            print(f"Error rendering cart_table: {e}")
+            data['cart_html'] = None
+    return data
+
+
+def _cart_mutation_data(request, mutation, include_table=True):
+    """
+    Respuesta JSON común de los endpoints AJAX del carrito.
+    Los totales vienen de la misma sentencia que aplicó la mutación;
+    los parciales reutilizan una única recarga de la foto del carrito.
+    """
+    snapshot = get_cart_snapshot(request, refresh=True)
+    data = {
+        'success': True,
+        'cart_count': mutation.cart_count,
+        'item_total': float(mutation.line_total),
+        'cart_subtotal': str(mutation.cart_subtotal),
+        'cart_tax': str(snapshot.tax),
+        'cart_total': str(mutation.cart_subtotal + snapshot.tax),
     }
+    data.update(_cart_payload(request, snapshot, include_table))
+    return data
 
 
 @require_POST
@@ -60,149 +121,117 @@ def add_to_cart(request, product_id):
         quantity = 1
 
     cart = _get_cart(request)
-    product = get_object_or_404(Product, id=product_id)
-    
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 0}
-    )
-    cart_item.increase_quantity(quantity)
-    
-    # Contexto actualizado
-    ctx = _get_cart_context(cart)
-    mini_cart_html = render_to_string('components/mini_cart.html', ctx, request=request)
-    
-    return JsonResponse({
-        'success': True,
-        'cart_count': ctx['cart_count'],
-        'cart_subtotal': str(cart.get_subtotal()),
-        'cart_tax': str(cart.get_tax()),
-        'cart_total': str(ctx['cart_total']),
-        'mini_cart_html': mini_cart_html,
-        'message': f'{product.name} agregado al carrito'
-    })
+    mutation = CartService.add_product(cart, product_id, max(quantity, 1))
+    if mutation is None:
+        return JsonResponse({'success': False, 'error': 'Producto no encontrado'}, status=404)
+
+    data = _cart_mutation_data(request, mutation, include_table=False)
+    # El nombre del producto sale de la foto ya cargada, sin otra consulta
+    item = get_cart_snapshot(request).get_item(mutation.item_id)
+    data['message'] = f'{item.product.name if item else "Producto"} agregado al carrito'
+    return JsonResponse(data)
 
 
 @require_POST
 def remove_from_cart(request, item_id):
     """API Endpoint para eliminar item"""
-    cart = _get_cart(request)
-    try:
-        item = CartItem.objects.get(id=item_id, cart=cart)
-        item.delete()
-        
-        ctx = _get_cart_context(cart)
-        mini_cart_html = render_to_string('components/mini_cart.html', ctx, request=request)
-        
-        try:
-            cart_html = render_to_string('orders/partials/cart_table.html', ctx, request=request)
-        except Exception as e:
-            print(f"Error rendering cart_table: {e}")
-            cart_html = None
-        
-        return JsonResponse({
-            'success': True,
-            'cart_count': ctx['cart_count'],
-            'cart_subtotal': str(cart.get_subtotal()),
-            'cart_tax': str(cart.get_tax()),
-            'cart_total': str(ctx['cart_total']),
-            'mini_cart_html': mini_cart_html,
-            'cart_html': cart_html,
-            'message': 'Producto eliminado'
-        })
-    except CartItem.DoesNotExist:
+    cart = _get_cart(request, create=False)
+    mutation = CartService.remove_item(cart, item_id) if cart else None
+    if mutation is None:
         return JsonResponse({'success': False, 'error': 'Item no encontrado'}, status=404)
+    data = _cart_mutation_data(request, mutation)
+    data['message'] = 'Producto eliminado'
+    return JsonResponse(data)
 
 
 @require_POST
 def update_cart_item(request, item_id):
     """API Endpoint para actualizar la cantidad (+/-)"""
-    cart = _get_cart(request)
+    cart = _get_cart(request, create=False)
     action = request.POST.get('action')
-    
-    try:
-        item = CartItem.objects.get(id=item_id, cart=cart)
-        
-        if action == 'increase':
-            item.increase_quantity()
-        elif action == 'decrease':
-            item.decrease_quantity()
-        
-        # Verificar si el item aún existe
-        try:
-            item.refresh_from_db()
-            item_total = float(item.get_total_price())
-        except CartItem.DoesNotExist:
-            item_total = 0
+    delta = {'increase': 1, 'decrease': -1}.get(action, 0)
 
-        ctx = _get_cart_context(cart)
-        mini_cart_html = render_to_string('components/mini_cart.html', ctx, request=request)
-        
-        try:
-            cart_html = render_to_string('orders/partials/cart_table.html', ctx, request=request)
-        except Exception as e:
-            print(f"Error rendering cart_table: {e}")
-            cart_html = None
+    mutation = CartService.change_quantity(cart, item_id, delta) if cart else None
+    if mutation is None:
+        return JsonResponse({'success': False}, status=404)
+    return JsonResponse(_cart_mutation_data(request, mutation))
+
+
+# Límite de operaciones por lote para acotar el trabajo de cada request
+CART_BATCH_MAX_OPERATIONS = 50
+
+
+@require_POST
+def batch_update_cart(request):
+    """
+    API Endpoint para aplicar varias operaciones del carrito en un solo request.
+    Body JSON: {"operations": [{"item_id"|"product_id": int, "delta"|"quantity": int}, ...]}
+    """
+    import json
+    try:
+        data = json.loads(request.body)
+        raw_operations = data['operations']
+        if not isinstance(raw_operations, list) or len(raw_operations) > CART_BATCH_MAX_OPERATIONS:
+            raise ValueError(f'Máximo {CART_BATCH_MAX_OPERATIONS} operaciones por lote')
+        operations = [CartOperation.from_dict(op) for op in raw_operations]
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': str(e) or 'Lote inválido'}, status=400)
 
+    # Agregar productos nuevos requiere sesión iniciada, igual que add_to_cart
+    if not request.user.is_authenticated and any(op.product_id for op in operations):
         return JsonResponse({
-            'success': True,
-            'cart_count': ctx['cart_count'],
-            'item_total': item_total,
-            'cart_subtotal': str(cart.get_subtotal()),
-            'cart_tax': str(cart.get_tax()),
-            'cart_total': str(ctx['cart_total']),
-            'mini_cart_html': mini_cart_html,
-            'cart_html': cart_html
-        })
-        
-    except CartItem.DoesNotExist:
-        return JsonResponse({'success': False}, status=404)
+            'success': False,
+            'error': 'login_required',
+            'message': 'Debes iniciar sesión para comprar.'
+        }, status=403)
+
+    # Solo se persiste un carrito nuevo si el lote agrega productos
+    cart = _get_cart(request, create=any(op.product_id for op in operations))
+    changed = CartService.apply_batch(cart, operations) if cart else 0
+
+    snapshot = get_cart_snapshot(request, refresh=True)
+    data = {
+        'success': True,
+        'changed': changed,
+        'cart_count': snapshot.count,
+        'cart_subtotal': str(snapshot.subtotal),
+        'cart_tax': str(snapshot.tax),
+        'cart_total': str(snapshot.total),
+        'items': {str(item.id): item.quantity for item in snapshot.items},
+    }
+    data.update(_cart_payload(request, snapshot))
+    return JsonResponse(data)
 
 
 def cart_view(request):
     """Vista principal del carrito de compras"""
-    cart = _get_cart(request)
-    ctx = _get_cart_context(cart)
+    # Solo lectura: no crea sesión ni carrito para visitantes sin carrito
+    ctx = _get_cart_context(request)
     return render(request, 'orders/cart.html', ctx)
 
 
 @login_required
 def checkout(request):
     """Vista de Checkout: Procesa el pedido"""
-    cart = _get_cart(request)
-    
-    if cart.get_total_items() == 0:
+    if get_cart_snapshot(request).count == 0:
         messages.warning(request, "Tu carrito está vacío.")
         return redirect('orders:cart_view')
+
+    cart = _get_cart(request)
     
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
             try:
-                with transaction.atomic():
-                    order = form.save(commit=False)
-                    if request.user.is_authenticated:
-                        order.user = request.user
-                    order.status = Order.OrderStatus.PENDING
-                    order.save()
-                    
-                    cart_items = cart.items.all()
-                    for item in cart_items:
-                        OrderItem.objects.create(
-
-                            order=order,
-                            product=item.product,
-                            quantity=item.quantity,
-                            price=item.product.price
-                        )
-                    
-                    order.calculate_totals()
-                    cart.clear()
-                    
-                    request.session['order_id'] = order.id
-                    return redirect('orders:order_success')
-                    
+                order = form.save(commit=False)
+                if request.user.is_authenticated:
+                    order.user = request.user
+                order.status = Order.OrderStatus.PENDING
+                OrderService.place_order(cart, order)
+
+                request.session['order_id'] = order.id
+                return redirect('orders:order_success')
+
             except Exception as e:
                 messages.error(request, f"Error al procesar el pedido: {str(e)}")
     else:
@@ -218,7 +247,7 @@ def checkout(request):
             }
         form = CheckoutForm(initial=initial_data)
     
-    ctx = _get_cart_context(cart)
+    ctx = _get_cart_context(request)
     ctx['form'] = form
     return render(request, 'orders/checkout.html', ctx)
 
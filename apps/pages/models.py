@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from cloudinary.models import CloudinaryField
 from django_ckeditor_5.fields import CKEditor5Field
@@ -64,3 +66,13 @@ class Testimonial(models.Model):
 
     def __str__(self):
         return f"Testimonio de {self.user.username} ({self.rating} estrellas)"
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Testimonial)
+def invalidate_home_cache(sender, instance, **kwargs):
+    from apps.products.catalog_cache import invalidate  # Evita import circular
+
+    invalidate("home")
@@ -1,3 +1,68 @@
+"""
+Tests de regresión de consultas.
+Recorren los escenarios de core.benchmarks con volúmenes chicos pero mayores
+que los presupuestos, así un N+1 los excede; los tiempos solo se verifican
+en el benchmark completo (tests/benchmark_queries.py).
+"""
+
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from apps.orders.models import Cart, CartItem, Order, OrderItem
+from apps.pages.models import Banner, Testimonial
+from core.benchmarks import SCENARIOS, check_budgets, format_table, measure, seed_benchmark_data
+
+
+class QueryBudgetTest(TestCase):
+    """Cada página y endpoint respeta su presupuesto de consultas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_benchmark_data(products=60, orders=40, cart_lines=30, customers=10)
+
+    def test_scenarios_within_query_budget(self):
+        for scenario in SCENARIOS:
+            with self.subTest(scenario=scenario.name):
+                cache.clear()  # En frío: la caché del catálogo escondería un N+1
+                result = measure(scenario, self.data, repeat=1)
+                violations = check_budgets([result], timings=False)
+                self.assertEqual(violations, [], format_table([result]))
+
+    def test_queries_do_not_grow_with_data(self):
+        """Más líneas de carrito y de pedidos no agregan consultas."""
+        scenarios = [s for s in SCENARIOS if s.name in ("cart_view", "checkout", "profile")]
+        before = [measure(s, self.data, repeat=1).queries for s in scenarios]
+
+        cart = Cart.objects.get(user=self.data.customer)
+        order = Order.objects.get(pk=self.data.order_id)
+        extra = self.data.product_ids[30:50]
+        CartItem.objects.bulk_create([CartItem(cart=cart, product_id=pk) for pk in extra])
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product_id=pk, quantity=1, price=Decimal("1.00")) for pk in extra]
+        )
+
+        after = [measure(s, self.data, repeat=1).queries for s in scenarios]
+        self.assertEqual(before, after)
+
+
+class HomeCacheTest(TestCase):
+    """El inicio sale de la caché del catálogo hasta que cambian banners o testimonios."""
+
+    def setUp(self):
+        cache.clear()
+        self.data = seed_benchmark_data(products=10, orders=0, cart_lines=0, customers=1)
+
+    def test_home_cached_and_invalidated(self):
+        url = reverse("pages:home")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        banner = Banner.objects.create(title="Nuevo banner", position=9)
+        self.assertIn(banner, self.client.get(url).context["banners"])
 
-# Create your tests here.
+        Testimonial.objects.all().delete()
+        self.assertEqual(list(self.client.get(url).context["testimonials"]), [])
@@ -1,31 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from apps.products.models import Product
 from apps.orders.models import Order
 from .models import Testimonial
-from apps.pages.models import About, Banner
-from apps.products.models import Favorite
+from apps.pages.models import About
+from apps.products.services import FavoriteService
+from apps.products import catalog_cache
+from apps.products.page_cache import cache_anonymous_page, home_last_modified
 
 # Create your views here.
+@cache_anonymous_page(["home"], home_last_modified)
 def home(request):
-    banners = Banner.objects.filter(is_active=True)
-    # Fetch latest services and products separately
-    services = Product.objects.filter(catalog_type=Product.CatalogType.SERVICE).order_by('-id')[:4]
-    products = Product.objects.filter(catalog_type=Product.CatalogType.PRODUCT).order_by('-id')[:4]
-    
-    # Obtener testimonios aprobados
-    testimonials = Testimonial.objects.all().order_by('-created_at')[:6]
-    
-    # Obtener IDs de favoritos del usuario si está autenticado
-    user_favorites = []
-    if request.user.is_authenticated:
-        user_favorites = Favorite.objects.filter(user=request.user).values_list('product_id', flat=True)
-    
+    # Banners, últimos servicios/productos y testimonios salen de la caché del catálogo
+    blocks = catalog_cache.home_blocks()
+
+    # IDs de favoritos como frozenset (vacío para anónimos)
+    user_favorites = FavoriteService.ids_for(request)
+
     return render(request, 'pages/home.html', {
-        'banners': banners,
-        'products': products,
-        'services': services,
-        'testimonials': testimonials,
+        **blocks,
         'user_favorites': user_favorites
     })
 
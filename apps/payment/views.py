@@ -135,7 +135,8 @@ def capture_paypal_order(request, order_id):
     Returns:
         JsonResponse con status de la captura
     """
-    from apps.orders.models import Order, OrderItem, Cart
+    from apps.orders.models import Order, Cart
+    from apps.orders.services import OrderService
     from django.db import transaction as db_transaction
     
     # 1. Obtener Token de Acceso de PayPal
@@ -184,8 +185,8 @@ def capture_paypal_order(request, order_id):
                     # Obtener carrito del usuario
                     cart = Cart.objects.get(user=request.user)
                     
-                    # Crear Order
-                    order = Order.objects.create(
+                    # Crear Order con sus items en bloque y vaciar el carrito
+                    order = OrderService.place_order(cart, Order(
                         user=request.user,
                         shipping_name=checkout_data['shipping_name'],
                         shipping_email=checkout_data['shipping_email'],
@@ -199,20 +200,7 @@ def capture_paypal_order(request, order_id):
                         transaction_id=order_id,  # ID de PayPal
                         status=Order.OrderStatus.PENDING,
                         notes=checkout_data.get('notes', '')
-                    )
-                    
-                    # Crear OrderItems desde el carrito
-                    cart_items = cart.items.all()
-                    for item in cart_items:
-                        OrderItem.objects.create(
-                            order=order,
-                            product=item.product,
-                            quantity=item.quantity,
-                            price=item.product.price
-                        )
-                    
-                    # Calcular totales del Order
-                    order.calculate_totals()
+                    ))
                     
                     # Crear Transaction vinculada al Order
                     amount = response_data['purchase_units'][0]['payments']['captures'][0]['amount']['value']
@@ -222,9 +210,6 @@ def capture_paypal_order(request, order_id):
                         status='COMPLETED'
                     )
                     
-                    # Limpiar carrito
-                    cart.clear()
-                    
                     # Guardar order_id en sesión para la página de éxito
                     request.session['order_id'] = order.id
                     
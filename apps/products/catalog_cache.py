@@ -0,0 +1,165 @@
+"""
+Caché de lectura del catálogo.
+Guarda en el cache de Django (memoria local, archivo o Redis según settings.CACHES)
+los productos, las páginas del listado y los bloques del inicio.
+
+Cada grupo de claves tiene un número de versión propio ("product:<pk>",
+"category:<pk>", "listing", "home", "related"). Invalidar es subir esa versión: las entradas
+anteriores quedan huérfanas y expiran solas, sin buscar ni borrar claves.
+Lo hacen las señales post_save/post_delete de Product, Category, Banner y
+Testimonial, así que también cubre los cambios hechos desde el panel.
+
+Las versiones viven en el mismo cache, así que con varios procesos tiene que ser
+compartido (file o redis): con locmem cada worker sube solo su propia versión.
+"""
+
+import time
+from typing import Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product, RelatedProduct
+
+_MISSING = object()
+
+
+def _timeout(timeout: Optional[int]) -> int:
+    return timeout if timeout is not None else getattr(settings, "CATALOG_CACHE_SECONDS", 300)
+
+
+def namespace_version(name: str) -> int:
+    """
+    Versión actual de un grupo de claves.
+    Arranca en el reloj en nanosegundos: si el cache descarta la versión, la nueva
+    nunca coincide con una anterior y no se pueden servir entradas viejas.
+    """
+    return namespace_versions([name])[name]
+
+
+def namespace_versions(names: Iterable[str]) -> dict[str, int]:
+    """
+    Versiones de varios grupos con un solo get_many.
+    Las que falten se inicializan igual que en namespace_version (add y relectura).
+    """
+    keys = {f"catalog:version:{name}": name for name in names}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        found.update(cache.get_many(missing))
+    now = time.time_ns()
+    return {name: found.get(key, now) for key, name in keys.items()}
+
+
+def invalidate(*names: str) -> None:
+    """Sube la versión de los grupos indicados (p. ej. "listing", "product:12")"""
+    for name in names:
+        key = f"catalog:version:{name}"
+        try:
+            cache.incr(key)
+        except ValueError:  # La versión no existía o fue descartada
+            cache.set(key, time.time_ns(), None)
+
+
+def cached(namespace: str, key: str, producer: Callable, timeout: Optional[int] = None):
+    """
+    Retorna el valor cacheado bajo la versión actual del grupo o lo calcula con producer().
+
+    Args:
+        namespace: Grupo de claves que invalida la entrada
+        key: Identificador de la entrada dentro del grupo
+        producer: Función sin argumentos que calcula el valor (debe poder serializarse)
+        timeout: Segundos de vida (CATALOG_CACHE_SECONDS por defecto)
+    """
+    cache_key = f"catalog:{namespace}:{key}"
+    version = namespace_version(namespace)
+    value = cache.get(cache_key, _MISSING, version=version)
+    if value is _MISSING:
+        value = producer()
+        cache.set(cache_key, value, _timeout(timeout), version=version)
+    return value
+
+
+def get_product(pk: int) -> Optional[Product]:
+    """
+    Producto con su categoría, o None si no existe.
+    La entrada recuerda la versión de la categoría con la que se armó: renombrar la
+    categoría la invalida sin tener que recorrer sus productos.
+    """
+    entry = cached(f"product:{pk}", "detail", lambda: _load_product(pk))
+    if entry is None:
+        return None
+    product, category_version = entry
+    if category_version != namespace_version(f"category:{product.category_id}"):
+        invalidate(f"product:{pk}")
+        product, _ = cached(f"product:{pk}", "detail", lambda: _load_product(pk))
+    return product
+
+
+def _load_product(pk: int):
+    product = Product.objects.select_related("category").filter(pk=pk).first()
+    if product is None:
+        return None
+    return product, namespace_version(f"category:{product.category_id}")
+
+
+def home_blocks() -> dict:
+    """Banners, últimos servicios y productos y testimonios de la página de inicio"""
+    from apps.pages.models import Banner, Testimonial  # Evita import circular
+
+    def load():
+        return {
+            "banners": list(Banner.objects.filter(is_active=True)),
+            "services": list(
+                Product.objects.filter(catalog_type=Product.CatalogType.SERVICE).order_by("-id")[:4]
+            ),
+            "products": list(
+                Product.objects.filter(catalog_type=Product.CatalogType.PRODUCT).order_by("-id")[:4]
+            ),
+            "testimonials": list(
+                Testimonial.objects.select_related("user__profile").order_by("-created_at")[:6]
+            ),
+        }
+
+    return cached("home", "blocks", load)
+
+
+def related_products(pk: int) -> dict[str, list[Product]]:
+    """
+    Listas precalculadas de relacionados del producto, por tipo (RelatedProduct.Kind).
+    Una consulta por el índice (product, kind, rank); el cálculo las invalida todas
+    juntas. Como get_product, la entrada recuerda la versión de cada producto
+    mostrado y se rearma si alguno cambió.
+    """
+    entry = cached("related", str(pk), lambda: _load_related(pk))
+    blocks, versions = entry
+    if versions != _related_versions(blocks):
+        blocks, versions = entry = _load_related(pk)
+        cache.set(f"catalog:related:{pk}", entry, _timeout(None), version=namespace_version("related"))
+    return blocks
+
+
+def related_ids(pk: int) -> list[int]:
+    """IDs de todos los productos que muestra el bloque de relacionados"""
+    return [product.pk for products in related_products(pk).values() for product in products]
+
+
+def _related_versions(blocks: dict) -> list[int]:
+    names = [f"product:{product.pk}" for products in blocks.values() for product in products]
+    versions = namespace_versions(names)
+    return [versions[name] for name in names]
+
+
+def _load_related(pk: int):
+    blocks = {kind: [] for kind in RelatedProduct.Kind.values}
+    entries = (
+        RelatedProduct.objects.filter(product_id=pk)
+        .select_related("related")
+        .defer("related__search_vector")
+        .order_by("kind", "rank")
+    )
+    for entry in entries:
+        blocks[entry.kind].append(entry.related)
+    return blocks, _related_versions(blocks)
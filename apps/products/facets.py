@@ -0,0 +1,233 @@
+"""
+Filtros por facetas del catálogo (categoría, tipo, etiqueta, precio y calificación).
+
+Los conteos salen de un único GROUP BY sobre el catálogo sin filtrar por facetas:
+una fila por combinación (categoría, tipo, etiqueta, rango de precio, calificación)
+con su cantidad de productos. Ese "cubo" tiene a lo sumo unas pocas miles de filas
+sin importar el tamaño del catálogo, se cachea hasta que cambie el catálogo y de él
+se derivan en memoria los conteos de cada faceta para cualquier selección, sin un
+COUNT por valor.
+"""
+
+import hashlib
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from . import catalog_cache
+from .models import Product
+
+# Rangos de precio: (clave en la URL, etiqueta, desde inclusive, hasta exclusive)
+PRICE_BUCKETS = [
+    ("0-50", "Hasta $50", None, Decimal("50")),
+    ("50-100", "$50 a $100", Decimal("50"), Decimal("100")),
+    ("100-250", "$100 a $250", Decimal("100"), Decimal("250")),
+    ("250-500", "$250 a $500", Decimal("250"), Decimal("500")),
+    ("500-", "Más de $500", Decimal("500"), None),
+]
+# Calificación mínima: (clave en la URL, etiqueta); acumulativa, 3 incluye 4 y 5
+RATING_BUCKETS = [
+    ("4", "4 ★ o más"),
+    ("3", "3 ★ o más"),
+    ("2", "2 ★ o más"),
+    ("1", "1 ★ o más"),
+]
+
+# Facetas en el orden en que se muestran: parámetro de la URL -> título
+FACETS = {
+    "category": "Categoría",
+    "type": "Tipo",
+    "tag": "Etiqueta",
+    "price": "Precio",
+    "rating": "Calificación",
+}
+
+_PRICE_KEYS = [key for key, *_ in PRICE_BUCKETS]
+_RATING_KEYS = [key for key, _ in RATING_BUCKETS]
+
+
+class FacetOption(NamedTuple):
+    """Valor de una faceta con la cantidad de productos que tendría al elegirlo"""
+
+    value: str
+    label: str
+    count: int
+    selected: bool
+
+
+def parse_selection(params) -> dict[str, list[str]]:
+    """
+    Lee las facetas elegidas de los parámetros GET (?category=a&category=b&price=0-50).
+    Ignora valores desconocidos de precio y calificación; la calificación admite uno solo.
+    """
+    selection = {}
+    for name in FACETS:
+        values = [v for v in dict.fromkeys(params.getlist(name)) if v]
+        if name == "price":
+            values = [v for v in values if v in _PRICE_KEYS]
+        elif name == "rating":
+            values = [v for v in values if v in _RATING_KEYS][:1]
+        if values:
+            selection[name] = values
+    return selection
+
+
+def _price_q(key: str) -> Q:
+    _, _, low, high = PRICE_BUCKETS[_PRICE_KEYS.index(key)]
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def _facet_q(name: str, values: list[str]) -> Q:
+    """Dentro de una faceta los valores se combinan con OR; entre facetas, con AND"""
+    if name == "category":
+        return Q(category__slug__in=values)
+    if name == "type":
+        return Q(catalog_type__in=values)
+    if name == "tag":
+        return Q(tag__in=values)
+    if name == "price":
+        q = Q()
+        for key in values:
+            q |= _price_q(key)
+        return q
+    return Q(rating__gte=int(values[0]))
+
+
+class FacetEngine:
+    """
+    Aplica las facetas elegidas a un queryset de productos y calcula sus conteos.
+
+    Los conteos de cada faceta consideran las demás facetas elegidas pero no la
+    propia, así al elegir una categoría siguen viéndose las otras con su cantidad.
+
+    Args:
+        queryset: Productos base (sin facetas; puede venir de la búsqueda)
+        params: QueryDict con la selección (request.GET)
+    """
+
+    def __init__(self, queryset, params):
+        self.queryset = queryset
+        self.selection = parse_selection(params)
+
+    def filter(self):
+        """Queryset con todas las facetas elegidas aplicadas"""
+        queryset = self.queryset
+        for name, values in self.selection.items():
+            queryset = queryset.filter(_facet_q(name, values))
+        return queryset
+
+    def counts(self) -> dict[str, list[FacetOption]]:
+        """
+        Opciones de cada faceta con su conteo (a lo sumo una consulta, cacheada).
+
+        Returns:
+            Diccionario parámetro -> opciones, en el orden de FACETS
+        """
+        cube = self._cube()
+        totals = {name: {} for name in FACETS}
+        labels = {"category": {}, "type": dict(Product.CatalogType.choices), "tag": {}}
+
+        for slug, category, catalog_type, tag, price, rating, count in cube:
+            labels["category"][slug] = category
+            labels["tag"][tag] = tag
+            row = {
+                "category": slug,
+                "type": catalog_type,
+                "tag": tag,
+                "price": _PRICE_KEYS[price],
+                "rating": rating,
+            }
+            for name in FACETS:
+                if not self._matches(row, exclude=name):
+                    continue
+                if name == "rating":
+                    # Acumulativa: una fila con 4 cuenta para "4", "3", "2" y "1"
+                    for key in _RATING_KEYS:
+                        if rating >= int(key):
+                            totals[name][key] = totals[name].get(key, 0) + count
+                else:
+                    totals[name][row[name]] = totals[name].get(row[name], 0) + count
+
+        facets = {}
+        for name in FACETS:
+            selected = self.selection.get(name, [])
+            if name == "price":
+                options = [(key, label) for key, label, *_ in PRICE_BUCKETS]
+            elif name == "rating":
+                options = RATING_BUCKETS
+            else:
+                options = sorted(
+                    ((value, labels[name].get(value, value)) for value in totals[name] if value),
+                    key=lambda option: option[1],
+                )
+            facets[name] = [
+                FacetOption(value, label, totals[name].get(value, 0), value in selected)
+                for value, label in options
+                if totals[name].get(value, 0) or value in selected
+            ]
+        return facets
+
+    def _matches(self, row: dict, exclude: Optional[str] = None) -> bool:
+        for name, values in self.selection.items():
+            if name == exclude:
+                continue
+            if name == "rating":
+                if row["rating"] < int(values[0]):
+                    return False
+            elif row[name] not in values:
+                return False
+        return True
+
+    def _cube(self) -> list[tuple]:
+        """
+        Filas (slug, categoría, tipo, etiqueta, índice de precio, calificación entera, cantidad)
+        del queryset base. No depende de la selección, así todas las combinaciones de
+        filtros sobre la misma búsqueda comparten la misma entrada de cache.
+        """
+        queryset = self.queryset.order_by()
+        sql, params = queryset.values("pk").query.sql_with_params()
+
+        def load():
+            price_bucket = Case(
+                *[
+                    When(price__lt=high, then=Value(index))
+                    for index, (_, _, _, high) in enumerate(PRICE_BUCKETS)
+                    if high is not None
+                ],
+                default=Value(len(PRICE_BUCKETS) - 1),
+                output_field=IntegerField(),
+            )
+            rating_floor = Case(
+                *[When(rating__gte=int(key), then=Value(int(key))) for key in _RATING_KEYS],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            return [
+                tuple(row)
+                for row in queryset.annotate(
+                    facet_price=price_bucket, facet_rating=rating_floor
+                )
+                .values_list(
+                    "category__slug",
+                    "category__name",
+                    "catalog_type",
+                    "tag",
+                    "facet_price",
+                    "facet_rating",
+                )
+                .annotate(facet_count=Count("pk"))
+            ]
+
+        return catalog_cache.cached(
+            "listing",
+            "facets:" + hashlib.md5(f"{sql}{params}".encode()).hexdigest(),
+            load,
+            timeout=getattr(settings, "CATALOG_FACET_CACHE_SECONDS", 60),
+        )
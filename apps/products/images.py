@@ -0,0 +1,103 @@
+"""
+URLs responsivas para las imágenes de Cloudinary (productos, banners y avatares).
+
+Cada preset define los anchos que se piden a Cloudinary y el atributo sizes del
+lugar donde se muestra la imagen. Las URLs de transformación usan f_auto y q_auto:
+Cloudinary entrega AVIF o WebP según el Accept del navegador y ajusta la calidad,
+y c_limit nunca agranda el original.
+
+Solo se arman URLs (sin llamadas a la API), así que funciona sin conexión. El
+resultado se cachea en memoria por public_id, versión y preset: la versión cambia
+al reemplazar la imagen, por lo que la caché nunca queda vieja.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from cloudinary import CloudinaryResource
+
+
+class ImagePreset(NamedTuple):
+    """Anchos pedidos, sizes y dimensiones nominales (evitan saltos de layout)"""
+
+    widths: tuple[int, ...]
+    sizes: str
+    width: int
+    height: int
+
+
+PRESETS = {
+    # Tarjeta del catálogo: 1 a 4 columnas según el ancho de pantalla
+    "card": ImagePreset(
+        (160, 240, 320, 480, 640, 800),
+        "(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw",
+        400,
+        400,
+    ),
+    # Imagen principal del detalle: hasta 500px en escritorio
+    "detail": ImagePreset((320, 480, 640, 800, 1000), "(min-width: 768px) 500px, 100vw", 500, 500),
+    # Carrusel del inicio a todo el ancho
+    "banner": ImagePreset((640, 960, 1280, 1600, 1920), "100vw", 1500, 360),
+    # Miniaturas de carrito, pedidos y listas del panel
+    "thumb": ImagePreset((48, 96, 160), "48px", 48, 48),
+    "avatar": ImagePreset((96, 192), "96px", 96, 96),
+}
+
+
+class ResponsiveImage(NamedTuple):
+    """Atributos listos para un <img>"""
+
+    src: str
+    srcset: str
+    sizes: str
+    width: int
+    height: int
+
+
+def responsive_image(image, preset: str = "card") -> Optional[ResponsiveImage]:
+    """
+    Atributos responsivos de una imagen de CloudinaryField.
+
+    Args:
+        image: Valor del campo (CloudinaryResource) o None
+        preset: Clave de PRESETS
+
+    Returns:
+        ResponsiveImage, o None si no hay imagen
+    """
+    if not image or not getattr(image, "public_id", None):
+        return None
+    return _build(
+        image.public_id,
+        getattr(image, "version", None),
+        getattr(image, "format", None),
+        getattr(image, "type", None) or "upload",
+        getattr(image, "resource_type", None) or "image",
+        preset,
+    )
+
+
+@lru_cache(maxsize=4096)
+def _build(public_id, version, file_format, delivery_type, resource_type, preset) -> ResponsiveImage:
+    config = PRESETS[preset]
+    resource = CloudinaryResource(
+        public_id, format=file_format, version=version, type=delivery_type, resource_type=resource_type
+    )
+
+    def url(width: int) -> str:
+        return resource.build_url(width=width, crop="limit", fetch_format="auto", quality="auto")
+
+    # src para navegadores sin srcset: el ancho que cubre la medida nominal
+    fallback = next((width for width in config.widths if width >= config.width), config.widths[-1])
+    return ResponsiveImage(
+        src=url(fallback),
+        srcset=", ".join(f"{url(width)} {width}w" for width in config.widths),
+        sizes=config.sizes,
+        width=config.width,
+        height=config.height,
+    )
+
+
+def clear_cache() -> None:
+    """Vacía la caché en memoria (p. ej. tras cambiar la configuración de Cloudinary)"""
+    _build.cache_clear()
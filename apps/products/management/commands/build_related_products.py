@@ -0,0 +1,52 @@
+"""
+Comando para precalcular los productos relacionados del detalle.
+Uso: python manage.py build_related_products [--full] [--limit 4] [--batch-size 5000] [--order-delay 300]
+Pensado para cron: sin --full solo procesa los pedidos y productos nuevos desde la última corrida.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.products.related import build_related_products
+
+
+class Command(BaseCommand):
+    help = "Actualiza las listas de comprados juntos y similares de cada producto"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Descarta lo calculado y recalcula desde el primer pedido",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Productos por lista (por defecto RELATED_PRODUCTS_LIMIT)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Pedidos por transacción (por defecto RELATED_PRODUCTS_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--order-delay",
+            type=int,
+            default=None,
+            help="Segundos de antigüedad mínima de un pedido para procesarlo",
+        )
+
+    def handle(self, *args, **options):
+        result = build_related_products(
+            full=options["full"],
+            limit=options["limit"],
+            batch_size=options["batch_size"],
+            order_delay_seconds=options["order_delay"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.orders} pedidos procesados; {result.bought_together} listas de comprados "
+                f"juntos y {result.similar} de similares actualizadas ({result.seconds:.2f}s)"
+            )
+        )
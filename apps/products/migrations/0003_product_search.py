@@ -0,0 +1,96 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# El vector se calcula en la BD para que también lo mantengan bulk_create,
+# queryset.update() y los cambios de nombre de la categoría
+TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION products_product_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('spanish', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(NEW.tag, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(
+            (SELECT name FROM products_category WHERE id = NEW.category_id), '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_product_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, tag, description, category_id ON products_product
+FOR EACH ROW EXECUTE FUNCTION products_product_search_vector();
+
+CREATE OR REPLACE FUNCTION products_category_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE products_product SET category_id = category_id WHERE category_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_category_search_vector_trigger
+AFTER UPDATE OF name ON products_category
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION products_category_search_vector();
+
+UPDATE products_product SET category_id = category_id;
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS products_category_search_vector_trigger ON products_category;
+DROP FUNCTION IF EXISTS products_category_search_vector();
+DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;
+DROP FUNCTION IF EXISTS products_product_search_vector();
+"""
+
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="product_search_idx"),
+    django.contrib.postgres.indexes.GinIndex(
+        fields=["name"], opclasses=["gin_trgm_ops"], name="product_name_trgm_idx"
+    ),
+]
+
+
+def create_search_objects(apps, schema_editor):
+    """Índices GIN y triggers solo en PostgreSQL (los tests locales pueden usar SQLite)"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Product, index)
+    schema_editor.execute(TRIGGERS_SQL)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    schema_editor.execute(DROP_TRIGGERS_SQL)
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Product, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_product_keyset_indexes"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="product", index=index) for index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_objects, drop_search_objects),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductsCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.BigIntegerField(default=0, verbose_name='último pedido procesado')),
+                ('products_checked_at', models.DateTimeField(blank=True, null=True, verbose_name='productos revisados hasta')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='fecha de actualización')),
+            ],
+            options={
+                'verbose_name': 'avance de productos relacionados',
+                'verbose_name_plural': 'avance de productos relacionados',
+            },
+        ),
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='pedidos')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'compra conjunta',
+                'verbose_name_plural': 'compras conjuntas',
+                'constraints': [models.UniqueConstraint(fields=('product', 'other'), name='copurchase_pair_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('BOUGHT_TOGETHER', 'Comprados juntos'), ('SIMILAR', 'Similares')], max_length=20, verbose_name='tipo')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='posición')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='products.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'producto relacionado',
+                'verbose_name_plural': 'productos relacionados',
+                'constraints': [models.UniqueConstraint(fields=('product', 'kind', 'rank'), name='related_product_rank_uniq')],
+            },
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
 
 class Category(models.Model):
@@ -31,14 +35,37 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products', verbose_name="categoría")
     tag = models.CharField(max_length=50, blank=True, verbose_name="etiqueta")
     rating = models.DecimalField(max_digits=3, decimal_places=1, blank=True, null=True, verbose_name="calificación")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="fecha de actualización")
+    # Mantenido por un trigger de PostgreSQL (nombre, etiqueta, categoría y descripción)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "producto"
         verbose_name_plural = "productos"
+        indexes = [
+            # Rangos de la paginación por cursor (ver pagination.SORT_OPTIONS)
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["name", "id"], name="product_name_id_idx"),
+            # Facetas (ver facets.py): filtro por categoría/tipo con el orden por defecto o por precio
+            models.Index(fields=["category", "id"], name="product_category_id_idx"),
+            models.Index(fields=["category", "price", "id"], name="product_category_price_idx"),
+            models.Index(fields=["catalog_type", "price", "id"], name="product_type_price_idx"),
+            models.Index(fields=["rating", "id"], name="product_rating_id_idx"),
+            # Búsqueda de texto completo y por similitud (ver search.py)
+            GinIndex(fields=["search_vector"], name="product_search_idx"),
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"], name="product_name_trgm_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Precio guardado: los carritos se reconcilian solo si cambia (ver apps/orders/models.py)
+        instance._stored_price = instance.__dict__.get("price")
+        return instance
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
@@ -53,6 +80,55 @@ class Favorite(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
 
+class RelatedProduct(models.Model):
+    """Lista precalculada de productos relacionados (ver related.py)"""
+
+    class Kind(models.TextChoices):
+        BOUGHT_TOGETHER = 'BOUGHT_TOGETHER', 'Comprados juntos'
+        SIMILAR = 'SIMILAR', 'Similares'
+
+    # Sin índice propio: lo cubre la restricción única (product, kind, rank)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries', db_index=False)
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name="tipo")
+    rank = models.PositiveSmallIntegerField(verbose_name="posición")
+
+    class Meta:
+        verbose_name = "producto relacionado"
+        verbose_name_plural = "productos relacionados"
+        constraints = [
+            # También es el índice de la lectura del detalle: product = X ORDER BY kind, rank
+            models.UniqueConstraint(fields=["product", "kind", "rank"], name="related_product_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.kind} #{self.rank})"
+
+class CoPurchase(models.Model):
+    """Cantidad de pedidos en que se compraron juntos dos productos (ambos sentidos)"""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0, verbose_name="pedidos")
+
+    class Meta:
+        verbose_name = "compra conjunta"
+        verbose_name_plural = "compras conjuntas"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "other"], name="copurchase_pair_uniq"),
+        ]
+
+class RelatedProductsCheckpoint(models.Model):
+    """Hasta dónde llegó el último cálculo incremental (una sola fila)"""
+
+    last_order_id = models.BigIntegerField(default=0, verbose_name="último pedido procesado")
+    products_checked_at = models.DateTimeField(null=True, blank=True, verbose_name="productos revisados hasta")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="fecha de actualización")
+
+    class Meta:
+        verbose_name = "avance de productos relacionados"
+        verbose_name_plural = "avance de productos relacionados"
+
 class FileResource(models.Model):
     title = models.CharField(max_length=255, verbose_name="título")
     file = models.FileField(upload_to='file_resources/', null=True, default=None)
@@ -67,4 +143,29 @@ class FileResource(models.Model):
     
     def __str__(self):
         return f"{self.title} ({'Activo' if self.is_active else 'Inactivo'})"
-    
\ No newline at end of file
+    
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    from .catalog_cache import invalidate  # Evita import circular
+
+    invalidate(f"product:{instance.pk}", "listing", "home")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    from .catalog_cache import invalidate  # Evita import circular
+
+    # El detalle de sus productos compara la versión de la categoría al leerse
+    invalidate(f"category:{instance.pk}", "listing", "home")
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_favorites_cache(sender, instance, **kwargs):
+    from .services import FavoriteService  # Evita import circular
+
+    FavoriteService.invalidate(instance.user_id)
@@ -0,0 +1,142 @@
+"""
+Caché de página completa para visitantes anónimos (inicio, catálogo y detalle).
+
+La clave combina la URL, el idioma, el contenido del carrito de la sesión y las
+versiones de catalog_cache de las que depende la página: las señales que
+invalidan el catálogo invalidan también estas páginas, URL por URL.
+La misma clave es el ETag, y Last-Modified sale del último updated_at de los
+modelos mostrados, así un GET condicional responde 304 sin renderizar nada.
+Un borrado no cambia ningún updated_at pero sí las versiones, y el ETag tiene
+precedencia sobre If-Modified-Since.
+"""
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Iterable, Optional, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.translation import get_language
+
+from apps.orders.services import cart_state_key
+
+from . import catalog_cache
+from .models import Product
+
+
+def cache_anonymous_page(
+    namespaces: Union[Iterable[str], Callable[..., Iterable[str]]],
+    last_modified: Optional[Callable[..., Optional[datetime]]] = None,
+):
+    """
+    Decorador de vista: sirve y guarda la página para GET/HEAD anónimos.
+
+    Args:
+        namespaces: Grupos de catalog_cache de los que depende la página, o una
+            función que los calcula con los kwargs de la URL
+        last_modified: Función (con los kwargs de la URL) que retorna el último
+            cambio de los datos mostrados
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            names = namespaces(**kwargs) if callable(namespaces) else namespaces
+            key = hashlib.md5(
+                repr(
+                    (
+                        request.build_absolute_uri(),
+                        get_language(),
+                        cart_state_key(request),
+                        [catalog_cache.namespace_version(name) for name in names],
+                    )
+                ).encode()
+            ).hexdigest()
+            etag = f'"{key}"'
+            modified = last_modified(**kwargs) if last_modified else None
+            # La página no lleva token, pero el carrito hace POST con la cookie CSRF
+            get_token(request)
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=int(modified.timestamp()) if modified else None
+            )
+            if response is None:
+                cached = cache.get(f"catalog:page:{key}")
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                else:
+                    response = view(request, *args, **kwargs)
+                    if hasattr(response, "render"):
+                        response.render()
+                    if response.status_code != 200:
+                        return response
+                    cache.set(
+                        f"catalog:page:{key}",
+                        (response.content, response["Content-Type"]),
+                        getattr(settings, "PAGE_CACHE_SECONDS", 300),
+                    )
+
+            response["ETag"] = etag
+            if modified:
+                response["Last-Modified"] = http_date(modified.timestamp())
+            # El navegador puede guardarla pero debe revalidar: el carrito cambia la página
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ("Cookie", "Accept-Language"))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _latest(*values) -> Optional[datetime]:
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def home_last_modified() -> Optional[datetime]:
+    """Último cambio de lo que muestra el inicio (sale de los bloques ya cacheados)"""
+    blocks = catalog_cache.home_blocks()
+    return _latest(
+        *(banner.updated_at for banner in blocks["banners"]),
+        *(product.updated_at for product in blocks["products"] + blocks["services"]),
+        *(testimonial.created_at for testimonial in blocks["testimonials"]),
+    )
+
+
+def listing_last_modified() -> Optional[datetime]:
+    """Último cambio de productos o de sus categorías (una consulta, cacheada)"""
+
+    def load():
+        latest = Product.objects.aggregate(
+            product=Max("updated_at"), category=Max("category__updated_at")
+        )
+        return _latest(latest["product"], latest["category"])
+
+    return catalog_cache.cached("listing", "last_modified", load)
+
+
+def product_namespaces(pk: int) -> list[str]:
+    """El detalle depende del producto, de su categoría y de cada relacionado que muestra"""
+    product = catalog_cache.get_product(pk)
+    if product is None:
+        return [f"product:{pk}"]
+    related = [f"product:{related_pk}" for related_pk in catalog_cache.related_ids(pk)]
+    return [f"product:{pk}", f"category:{product.category_id}", "related", *related]
+
+
+def product_last_modified(pk: int) -> Optional[datetime]:
+    product = catalog_cache.get_product(pk)
+    if product is None:
+        return None
+    return _latest(product.updated_at, product.category.updated_at)
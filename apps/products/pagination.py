@@ -0,0 +1,231 @@
+"""
+Paginación por cursor (keyset) del catálogo.
+Cada página es un rango del índice a partir de la última fila vista
+(WHERE (precio, id) > (...) ORDER BY precio, id LIMIT n) en lugar de OFFSET,
+así cualquier página cuesta lo mismo sin importar su profundidad.
+"""
+
+import hashlib
+from functools import reduce
+from operator import or_
+from typing import Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+from . import catalog_cache
+
+# Ordenamientos soportados: nombre en la URL -> campos (siempre terminan en id para desempatar)
+SORT_OPTIONS = {
+    "newest": ("-id",),
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+    "name": ("name", "id"),
+    "relevance": ("-relevance", "-id"),  # Requiere la anotación de search.search_products
+}
+SORT_LABELS = {
+    "relevance": "Relevancia",
+    "newest": "Más recientes",
+    "price": "Menor precio",
+    "-price": "Mayor precio",
+    "name": "Nombre (A-Z)",
+}
+DEFAULT_SORT = "newest"
+
+_CURSOR_SALT = "products.cursor"
+# Por debajo de esta estimación el COUNT(*) es barato y reltuples puede estar desactualizado
+_ESTIMATE_MIN_ROWS = 10_000
+
+
+def encode_cursor(sort: str, values: list, direction: str) -> str:
+    """Cursor opaco, firmado y seguro para URLs con la fila límite de la página"""
+    return signing.dumps({"s": sort, "v": values, "d": direction}, salt=_CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor: str) -> Optional[dict]:
+    """Retorna el contenido del cursor o None si está mal formado o fue alterado"""
+    try:
+        data = signing.loads(cursor, salt=_CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get("d") not in ("next", "prev"):
+        return None
+    return data
+
+
+def approximate_count(queryset) -> tuple[int, bool]:
+    """
+    Total de filas sin un COUNT(*) por request: el resultado se cachea por
+    CATALOG_COUNT_CACHE_SECONDS (o hasta que cambie el catálogo). Sin filtros en
+    PostgreSQL ni siquiera cuenta, usa la estimación del planner (pg_class.reltuples).
+
+    Returns:
+        (total, es_estimado)
+    """
+    sql, params = queryset.values("pk").query.sql_with_params()
+    return catalog_cache.cached(
+        "listing",
+        "count:" + hashlib.md5(f"{sql}{params}".encode()).hexdigest(),
+        lambda: _estimated_count(queryset) or (queryset.count(), False),
+        timeout=getattr(settings, "CATALOG_COUNT_CACHE_SECONDS", 60),
+    )
+
+
+def _estimated_count(queryset) -> Optional[tuple[int, bool]]:
+    if queryset.query.where or connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < _ESTIMATE_MIN_ROWS:  # -1 si la tabla nunca fue analizada
+        return None
+    return row[0], True
+
+
+class CursorPage:
+    """Página de resultados con los cursores de la anterior y la siguiente"""
+
+    def __init__(self, object_list, sort, has_next, has_previous, next_cursor, previous_cursor, params):
+        self.object_list = object_list
+        self.sort = sort
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+    def _query(self, cursor) -> str:
+        params = {k: v for k, v in self._params.items() if k not in ("cursor", "page")}
+        params["cursor"] = cursor
+        return "?" + urlencode(params)
+
+    @property
+    def next_query(self) -> str:
+        """Querystring de la página siguiente (conserva filtros y orden)"""
+        return self._query(self.next_cursor)
+
+    @property
+    def previous_query(self) -> str:
+        """Querystring de la página anterior"""
+        return self._query(self.previous_cursor)
+
+
+class KeysetPaginator:
+    """
+    Pagina un queryset por cursor sobre uno de los ordenamientos de options.
+
+    Args:
+        queryset: Queryset a paginar (puede venir filtrado)
+        per_page: Filas por página
+        sort: Clave de options (default si no es válida)
+        default: Orden por defecto (DEFAULT_SORT)
+        options: Ordenamientos soportados (SORT_OPTIONS del catálogo por defecto)
+    """
+
+    def __init__(
+        self,
+        queryset,
+        per_page: int,
+        sort: Optional[str] = None,
+        default: str = DEFAULT_SORT,
+        options: Optional[dict] = None,
+    ):
+        options = options or SORT_OPTIONS
+        self.queryset = queryset
+        self.per_page = per_page
+        self.sort = sort if sort in options else default
+        if self.sort == "relevance" and "relevance" not in queryset.query.annotations:
+            self.sort = DEFAULT_SORT
+        self.fields = [
+            (name.lstrip("-"), name.startswith("-")) for name in options[self.sort]
+        ]
+
+    def count(self) -> tuple[int, bool]:
+        return approximate_count(self.queryset)
+
+    def page(self, cursor: Optional[str] = None, params=None) -> CursorPage:
+        """
+        Retorna la página que sigue (o precede) al cursor; sin cursor, la primera.
+        Un cursor inválido o de otro ordenamiento vuelve a la primera página.
+        """
+        data = decode_cursor(cursor) if cursor else None
+        if data is not None and data.get("s") != self.sort:
+            data = None
+
+        forward = data is None or data["d"] == "next"
+        queryset = self.queryset.order_by(*self._ordering(forward))
+        if data is not None:
+            values = self._to_python(data["v"])
+            if values is None:
+                return self.page(params=params)
+            queryset = queryset.filter(self._after(values, forward))
+
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        has_next = has_more if forward else True
+        has_previous = data is not None if forward else has_more
+        return CursorPage(
+            rows,
+            self.sort,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=encode_cursor(self.sort, self._values(rows[-1]), "next") if rows else None,
+            previous_cursor=encode_cursor(self.sort, self._values(rows[0]), "prev") if rows else None,
+            params=params or {},
+        )
+
+    def _ordering(self, forward: bool) -> list[str]:
+        return [
+            f"-{name}" if desc == forward else name for name, desc in self.fields
+        ]
+
+    def _after(self, values: list, forward: bool) -> Q:
+        """(a, b) > (x, y) expandido: a > x OR (a = x AND b > y)"""
+        clauses = []
+        equal = {}
+        for (name, desc), value in zip(self.fields, values):
+            lookup = "lt" if desc == forward else "gt"
+            clauses.append(Q(**equal, **{f"{name}__{lookup}": value}))
+            equal[name] = value
+        return reduce(or_, clauses)
+
+    def _values(self, obj) -> list:
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value if isinstance(value, (int, str)) else str(value))
+        return values
+
+    def _to_python(self, raw) -> Optional[list]:
+        if not isinstance(raw, list) or len(raw) != len(self.fields):
+            return None
+        annotations = self.queryset.query.annotations
+        opts = self.queryset.model._meta
+        try:
+            return [
+                (annotations[name].output_field if name in annotations else opts.get_field(name))
+                .to_python(value)
+                for (name, _), value in zip(self.fields, raw)
+            ]
+        except ValidationError:
+            return None
@@ -0,0 +1,284 @@
+"""
+Productos relacionados precalculados para el detalle.
+
+build_related_products() llena la tabla RelatedProduct con dos listas por producto:
+
+- Comprados juntos: productos presentes en los mismos pedidos. Los pares se
+  acumulan en CoPurchase solo con los pedidos nuevos desde la última corrida
+  (RelatedProductsCheckpoint), y se recalcula el top de los productos tocados.
+  Los pedidos cancelados o reembolsados no cuentan; si un pedido ya sumado se
+  cancela después, OrderService.transition le resta sus pares (apply_status_changes).
+- Similares: vecinos de la misma categoría por cercanía de precio, recalculados
+  para las categorías con productos modificados desde la última corrida (y la
+  categoría anterior de los que se movieron).
+
+El detalle lee ambas listas con una consulta sobre el índice (product, kind, rank).
+"""
+
+import logging
+import time
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem
+
+from . import catalog_cache
+from .models import CoPurchase, Product, RelatedProduct, RelatedProductsCheckpoint
+
+logger = logging.getLogger(__name__)
+
+_COPURCHASE = CoPurchase._meta.db_table
+_ITEM = OrderItem._meta.db_table
+_ORDER = Order._meta.db_table
+
+# Filas por INSERT al reescribir listas
+_INSERT_CHUNK = 1000
+
+# Estados cuyos pedidos no cuentan como comprados juntos
+EXCLUDED_STATUSES = (Order.OrderStatus.CANCELLED, Order.OrderStatus.REFUNDED)
+
+# Suma a cada par (en ambos sentidos) los pedidos que lo contienen; {where} elige los pedidos.
+# Vale para PostgreSQL y SQLite (INSERT ... SELECT con WHERE y ON CONFLICT).
+_PAIRS_SQL = f"""
+INSERT INTO {_COPURCHASE} (product_id, other_id, orders)
+SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id)
+FROM {_ITEM} AS a
+JOIN {_ITEM} AS b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+JOIN {_ORDER} AS o ON o.id = a.order_id
+WHERE {{where}}
+GROUP BY a.product_id, b.product_id
+ON CONFLICT (product_id, other_id) DO UPDATE SET orders = {_COPURCHASE}.orders + EXCLUDED.orders
+"""
+# Resta de cada par de los productos de {ids} los pedidos de {ids} que lo contienen.
+# UPDATE y no el INSERT con signo negativo: la fila propuesta violaría orders >= 0
+_UNPAIR_SQL = f"""
+UPDATE {_COPURCHASE} SET orders = orders - (
+    SELECT COUNT(DISTINCT a.order_id)
+    FROM {_ITEM} AS a
+    JOIN {_ITEM} AS b ON b.order_id = a.order_id
+    WHERE a.product_id = {_COPURCHASE}.product_id AND b.product_id = {_COPURCHASE}.other_id
+    AND a.order_id IN ({{ids}})
+)
+WHERE product_id IN (SELECT product_id FROM {_ITEM} WHERE order_id IN ({{ids}}))
+"""
+_RANGE_WHERE = "a.order_id > %s AND a.order_id <= %s AND o.status NOT IN ({statuses})".format(
+    statuses=", ".join(["%s"] * len(EXCLUDED_STATUSES))
+)
+
+
+class RelatedBuildResult(NamedTuple):
+    """Métricas de un cálculo de productos relacionados"""
+
+    orders: int
+    bought_together: int
+    similar: int
+    seconds: float
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def build_related_products(
+    full: bool = False,
+    limit: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    order_delay_seconds: Optional[int] = None,
+) -> RelatedBuildResult:
+    """
+    Actualiza las listas de relacionados. Usado por el comando build_related_products.
+
+    Args:
+        full: Descarta todo y recalcula desde el primer pedido y para todas las categorías
+        limit: Productos por lista (RELATED_PRODUCTS_LIMIT)
+        batch_size: Pedidos por transacción (RELATED_PRODUCTS_BATCH_SIZE)
+        order_delay_seconds: Solo procesa pedidos con al menos esta antigüedad, para
+            no saltear uno con ID menor que todavía no hizo commit
+
+    Returns:
+        RelatedBuildResult con pedidos procesados y productos recalculados por lista
+    """
+    started = time.perf_counter()
+    limit = limit or _setting("RELATED_PRODUCTS_LIMIT", 4)
+    batch_size = batch_size or _setting("RELATED_PRODUCTS_BATCH_SIZE", 5000)
+    if order_delay_seconds is None:
+        order_delay_seconds = _setting("RELATED_PRODUCTS_ORDER_DELAY_SECONDS", 300)
+
+    if full:
+        with transaction.atomic():
+            RelatedProduct.objects.all().delete()
+            CoPurchase.objects.all().delete()
+            RelatedProductsCheckpoint.objects.all().delete()
+    checkpoint, _ = RelatedProductsCheckpoint.objects.get_or_create(pk=1)
+    checked_at = timezone.now()
+
+    orders, bought_together = _refresh_bought_together(checkpoint, limit, batch_size, order_delay_seconds)
+    similar = _refresh_similar(checkpoint, limit, checked_at)
+
+    if bought_together or similar:
+        catalog_cache.invalidate("related")
+    result = RelatedBuildResult(orders, bought_together, similar, time.perf_counter() - started)
+    logger.info(
+        f"Productos relacionados: {result.orders} pedidos, {result.bought_together} listas de "
+        f"comprados juntos y {result.similar} de similares ({result.seconds:.2f}s)"
+    )
+    return result
+
+
+def _refresh_bought_together(checkpoint, limit: int, batch_size: int, order_delay_seconds: int):
+    """Suma los pedidos nuevos a CoPurchase por lotes y recalcula el top de los productos tocados"""
+    last_id = Order.objects.filter(
+        created_at__lte=timezone.now() - timedelta(seconds=order_delay_seconds)
+    ).aggregate(last=Max("id"))["last"]
+    if last_id is None or last_id <= checkpoint.last_order_id:
+        return 0, 0
+
+    orders = products = 0
+    while checkpoint.last_order_id < last_id:
+        low = checkpoint.last_order_id
+        high = min(low + batch_size, last_id)
+        with transaction.atomic():
+            # Serializa con apply_status_changes: un cambio de estado ve el lote completo o nada
+            RelatedProductsCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+            with connection.cursor() as cursor:
+                cursor.execute(_PAIRS_SQL.format(where=_RANGE_WHERE), [low, high, *EXCLUDED_STATUSES])
+            touched = set(
+                OrderItem.objects.filter(order_id__gt=low, order_id__lte=high)
+                .values_list("product_id", flat=True)
+                .distinct()
+            )
+            orders += Order.objects.filter(id__gt=low, id__lte=high).count()
+            products += _rank_bought_together(touched, limit)
+            checkpoint.last_order_id = high
+            checkpoint.save(update_fields=["last_order_id", "updated_at"])
+    return orders, products
+
+
+def apply_status_changes(changes) -> int:
+    """
+    Corrige CoPurchase para pedidos ya procesados que entran o salen de
+    EXCLUDED_STATUSES: resta sus pares al cancelarse o reembolsarse y los vuelve
+    a sumar si se reactivan. Los pedidos posteriores al checkpoint se cuentan
+    con su estado cuando los procese build_related_products.
+    Debe llamarse dentro de la transacción que cambia los estados.
+
+    Args:
+        changes: Tuplas (order_id, estado anterior, estado nuevo)
+
+    Returns:
+        Productos cuya lista de comprados juntos se recalculó
+    """
+    retract, restore = [], []
+    for pk, previous, status in changes:
+        if previous in EXCLUDED_STATUSES and status not in EXCLUDED_STATUSES:
+            restore.append(pk)
+        elif previous not in EXCLUDED_STATUSES and status in EXCLUDED_STATUSES:
+            retract.append(pk)
+    if not retract and not restore:
+        return 0
+    checkpoint = RelatedProductsCheckpoint.objects.select_for_update().filter(pk=1).first()
+    if checkpoint is None:
+        return 0
+
+    retract = [pk for pk in retract if pk <= checkpoint.last_order_id]
+    restore = [pk for pk in restore if pk <= checkpoint.last_order_id]
+    if not retract and not restore:
+        return 0
+    with connection.cursor() as cursor:
+        if retract:
+            ids = ", ".join(["%s"] * len(retract))
+            cursor.execute(_UNPAIR_SQL.format(ids=ids), [*retract, *retract])
+        if restore:
+            where = "a.order_id IN ({})".format(", ".join(["%s"] * len(restore)))
+            cursor.execute(_PAIRS_SQL.format(where=where), restore)
+    touched = set(OrderItem.objects.filter(order_id__in=retract + restore).values_list("product_id", flat=True))
+    CoPurchase.objects.filter(product_id__in=touched, orders__lte=0).delete()
+    count = _rank_bought_together(touched, _setting("RELATED_PRODUCTS_LIMIT", 4))
+    catalog_cache.invalidate("related")
+    return count
+
+
+def _rank_bought_together(product_ids: set[int], limit: int, chunk: int = _INSERT_CHUNK) -> int:
+    """Reemplaza las listas de comprados juntos con los limit pares más frecuentes"""
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), chunk):
+        ids = product_ids[start:start + chunk]
+        top = (
+            CoPurchase.objects.filter(product_id__in=ids)
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("product_id"),
+                    order_by=[F("orders").desc(), F("other_id").asc()],
+                )
+            )
+            .filter(position__lte=limit)
+            .values_list("product_id", "other_id", "position")
+        )
+        rows = [
+            RelatedProduct(product_id=pid, related_id=other, kind=RelatedProduct.Kind.BOUGHT_TOGETHER, rank=rank)
+            for pid, other, rank in top
+        ]
+        RelatedProduct.objects.filter(product_id__in=ids, kind=RelatedProduct.Kind.BOUGHT_TOGETHER).delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=chunk)
+    return len(product_ids)
+
+
+def _refresh_similar(checkpoint, limit: int, checked_at) -> int:
+    """
+    Recalcula los similares de las categorías con productos nuevos o modificados.
+    Un producto que cambió de categoría sigue en las listas de la anterior: esas
+    categorías se detectan por las filas que apuntan a él desde otra categoría.
+    """
+    products = Product.objects.all()
+    if checkpoint.products_checked_at:
+        products = products.filter(updated_at__gte=checkpoint.products_checked_at)
+    category_ids = set(products.order_by().values_list("category_id", flat=True).distinct())
+    category_ids.update(
+        RelatedProduct.objects.filter(kind=RelatedProduct.Kind.SIMILAR, related__in=products)
+        .exclude(product__category_id=F("related__category_id"))
+        .order_by()
+        .values_list("product__category_id", flat=True)
+        .distinct()
+    )
+    category_ids = sorted(category_ids)
+
+    count = 0
+    for category_id in category_ids:
+        with transaction.atomic():
+            count += _rank_similar(category_id, limit)
+    checkpoint.products_checked_at = checked_at
+    checkpoint.save(update_fields=["products_checked_at", "updated_at"])
+    return count
+
+
+def _rank_similar(category_id: int, limit: int) -> int:
+    """
+    Para cada producto de la categoría, los limit más cercanos en precio.
+    Con la categoría ordenada por precio, los candidatos son los limit vecinos a cada
+    lado: recorrido lineal, sin comparar todos contra todos.
+    """
+    catalog = list(
+        Product.objects.filter(category_id=category_id).order_by("price", "id").values_list("id", "price")
+    )
+    RelatedProduct.objects.filter(product__category_id=category_id, kind=RelatedProduct.Kind.SIMILAR).delete()
+    rows = []
+    for index, (pid, price) in enumerate(catalog):
+        neighbours = catalog[max(index - limit, 0):index] + catalog[index + 1:index + 1 + limit]
+        neighbours.sort(key=lambda item: (abs(item[1] - price), item[0]))
+        rows.extend(
+            RelatedProduct(product_id=pid, related_id=other, kind=RelatedProduct.Kind.SIMILAR, rank=rank)
+            for rank, (other, _) in enumerate(neighbours[:limit], start=1)
+        )
+        # Se inserta por tramos para no retener todas las filas de una categoría grande
+        if len(rows) >= _INSERT_CHUNK:
+            RelatedProduct.objects.bulk_create(rows, batch_size=_INSERT_CHUNK)
+            rows = []
+    RelatedProduct.objects.bulk_create(rows, batch_size=_INSERT_CHUNK)
+    return len(catalog)
@@ -0,0 +1,58 @@
+"""
+Búsqueda de productos.
+En PostgreSQL usa texto completo en español (search_vector, índice GIN,
+mantenido por trigger) y, si no hay coincidencias, similitud de trigramas
+sobre el nombre, para que errores como "redmy note" encuentren el modelo.
+En otros motores usa icontains sin ranking.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast
+
+# Configuración de texto completo (stemming en español, el sitio es es-la)
+SEARCH_CONFIG = "spanish"
+# Largo máximo de la búsqueda aceptada desde la URL
+MAX_QUERY_LENGTH = 100
+
+
+def normalize_query(query: str) -> str:
+    """Colapsa espacios y recorta la búsqueda del usuario"""
+    return " ".join((query or "").split())[:MAX_QUERY_LENGTH]
+
+
+def search_products(queryset, query: str):
+    """
+    Filtra el queryset por la búsqueda y anota `relevance` (mayor es mejor).
+
+    Args:
+        queryset: Productos a filtrar (puede venir filtrado)
+        query: Texto escrito por el usuario
+
+    Returns:
+        Queryset filtrado con la anotación relevance
+    """
+    query = normalize_query(query)
+    if not query:
+        return queryset
+
+    if connection.vendor != "postgresql":
+        return queryset.filter(
+            Q(name__icontains=query)
+            | Q(description__icontains=query)
+            | Q(tag__icontains=query)
+            | Q(category__name__icontains=query)
+        ).annotate(relevance=Value(0.0, output_field=FloatField()))
+
+    # Texto completo primero (índice GIN); los trigramas solo si no hubo coincidencias,
+    # así el ranking se calcula sobre pocas filas y los errores de tipeo igual encuentran algo
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+    matches = queryset.filter(search_vector=search_query)
+    if matches.exists():
+        return matches.annotate(
+            relevance=Cast(SearchRank(F("search_vector"), search_query), FloatField())
+        )
+    return queryset.filter(name__trigram_word_similar=query).annotate(
+        relevance=Cast(TrigramWordSimilarity(query, "name"), FloatField())
+    )
@@ -0,0 +1,129 @@
+"""
+Servicios de productos - Lógica de negocio separada de las vistas.
+Los favoritos del usuario se leen una vez por request como frozenset de IDs,
+así cada tarjeta resuelve `product.id in user_favorites` sin consultas ni recorridos.
+Marcar y desmarcar son operaciones idempotentes de una sola sentencia.
+"""
+
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import Favorite, Product
+
+# Atributo del request donde se guardan los IDs de favoritos
+_FAVORITES_ATTR = "_favorite_ids"
+
+
+# Máximo de productos por sincronización masiva
+MAX_SYNC_IDS = 500
+
+_FAVORITE = Favorite._meta.db_table
+_PRODUCT = Product._meta.db_table
+
+# Inserta solo los productos que existen e ignora los que ya eran favoritos.
+# El SELECT sobre productos reemplaza la verificación de la FK: en PostgreSQL
+# Django la crea DEFERRABLE INITIALLY DEFERRED y su error llegaría recién al commit.
+_ADD_SQL = f"""
+INSERT INTO {_FAVORITE} (user_id, product_id, created_at)
+SELECT %s, id, %s FROM {_PRODUCT} WHERE id IN ({{ids}})
+ON CONFLICT (user_id, product_id) DO NOTHING
+"""
+
+_REMOVE_SQL = f"DELETE FROM {_FAVORITE} WHERE user_id = %s AND product_id IN ({{ids}})"
+
+
+def _cache_key(user_id: int) -> str:
+    return f"favorites:{user_id}"
+
+
+def _execute(sql: str, params: list, ids: list[int]) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(ids=", ".join(["%s"] * len(ids))), params + ids)
+        return cursor.rowcount
+
+
+class FavoriteService:
+    """Favoritos por usuario: lectura cacheada y cambios idempotentes con invalidación"""
+
+    @staticmethod
+    def ids_for(request) -> frozenset[int]:
+        """
+        IDs de productos favoritos del usuario del request.
+        Se cargan una sola vez por request y se cachean por usuario hasta que
+        cambie alguno de sus favoritos (señales de Favorite).
+
+        Args:
+            request: HttpRequest object
+
+        Returns:
+            frozenset vacío para anónimos
+        """
+        if not request.user.is_authenticated:
+            return frozenset()
+        ids = getattr(request, _FAVORITES_ATTR, None)
+        if ids is None:
+            ids = FavoriteService.ids_for_user(request.user.pk)
+            setattr(request, _FAVORITES_ATTR, ids)
+        return ids
+
+    @staticmethod
+    def ids_for_user(user_id: int) -> frozenset[int]:
+        """IDs de favoritos de un usuario desde la caché (una consulta si no están)"""
+        ids = cache.get(_cache_key(user_id))
+        if ids is None:
+            ids = frozenset(
+                Favorite.objects.filter(user_id=user_id).values_list("product_id", flat=True)
+            )
+            cache.set(_cache_key(user_id), ids, getattr(settings, "FAVORITES_CACHE_SECONDS", 3600))
+        return ids
+
+    @staticmethod
+    def invalidate(user_id: int) -> None:
+        """
+        Descarta los favoritos cacheados del usuario.
+        Con locmem solo alcanza al proceso actual; los demás los ven al expirar
+        FAVORITES_CACHE_SECONDS (acotado al TTL del catálogo en ese caso)
+        """
+        cache.delete(_cache_key(user_id))
+
+    @staticmethod
+    def add(user_id: int, product_ids: Iterable[int]) -> int:
+        """
+        Marca los productos como favoritos (INSERT ... ON CONFLICT DO NOTHING).
+        Repetirla no cambia nada; los productos inexistentes se ignoran.
+
+        Args:
+            user_id: ID del usuario
+            product_ids: IDs de productos (a lo sumo MAX_SYNC_IDS)
+
+        Returns:
+            Cantidad de favoritos nuevos
+        """
+        ids = sorted(set(product_ids))
+        if not ids:
+            return 0
+        added = _execute(_ADD_SQL, [user_id, timezone.now()], ids)
+        if added:
+            # Sin save() no hay señales: se invalida acá
+            FavoriteService.invalidate(user_id)
+        return added
+
+    @staticmethod
+    def remove(user_id: int, product_ids: Iterable[int]) -> int:
+        """
+        Quita los productos de los favoritos con un único DELETE (idempotente).
+
+        Returns:
+            Cantidad de favoritos eliminados
+        """
+        ids = sorted(set(product_ids))
+        if not ids:
+            return 0
+        removed = _execute(_REMOVE_SQL, [user_id], ids)
+        if removed:
+            FavoriteService.invalidate(user_id)
+        return removed
@@ -0,0 +1,68 @@
+"""
+Tags de imágenes responsivas de Cloudinary (ver apps/products/images.py).
+
+    {% load image_tags %}
+    {% responsive_img product.image "card" alt=product.name class="w-full h-full object-cover" %}
+    {% responsive_img banner.image "banner" eager=forloop.first alt=banner.title %}
+    {% image_url user.profile.avatar "avatar" %}
+    {% preset_img "thumb" class="w-full h-full object-contain" %}
+"""
+
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from apps.products.images import PRESETS, responsive_image
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_img(image, preset="card", eager=False, **attrs):
+    """
+    <img> con src, srcset, sizes y dimensiones del preset.
+    Carga diferida salvo eager=True (imagen visible al cargar, p. ej. el primer banner).
+    Los demás argumentos se agregan como atributos y pisan los calculados.
+    """
+    data = responsive_image(image, preset)
+    if data is None:
+        return ""
+    values = {
+        "src": data.src,
+        "srcset": data.srcset,
+        "sizes": data.sizes,
+        "width": data.width,
+        "height": data.height,
+        "loading": "eager" if eager else "lazy",
+        "decoding": "async",
+    }
+    if eager:
+        values["fetchpriority"] = "high"
+    values.update(attrs)
+    return format_html("<img{}>", flatatt(values))
+
+
+@register.simple_tag
+def preset_img(preset="thumb", **attrs):
+    """
+    <img> sin src con el sizes y las dimensiones del preset, para los <template>
+    que JavaScript clona y completa con el src y srcset de la API (p. ej. el carrito)
+    """
+    config = PRESETS[preset]
+    values = {
+        "alt": "",
+        "sizes": config.sizes,
+        "width": config.width,
+        "height": config.height,
+        "loading": "lazy",
+        "decoding": "async",
+    }
+    values.update(attrs)
+    return format_html("<img{}>", flatatt(values))
+
+
+@register.simple_tag
+def image_url(image, preset="thumb"):
+    """URL de un solo ancho, para usos sin srcset (atributos data-* o JavaScript)"""
+    data = responsive_image(image, preset)
+    return data.src if data else ""
@@ -1,3 +1,736 @@
-from django.test import TestCase
+"""
+Tests del catálogo.
+Cubren la paginación por cursor, la búsqueda, las facetas y las cachés del catálogo.
+"""
 
-# Create your tests here.
+import json
+from decimal import Decimal
+
+from unittest import skipUnless
+
+import cloudinary
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.http import QueryDict
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.orders.models import Cart, CartItem, Order, OrderItem
+from apps.orders.services import OrderService
+
+from . import catalog_cache
+from .facets import FacetEngine
+from .images import clear_cache, responsive_image
+from .models import Category, CoPurchase, Favorite, Product, RelatedProduct
+from .pagination import SORT_OPTIONS, KeysetPaginator
+from .related import build_related_products
+from .search import search_products
+from .services import FavoriteService
+
+
+class KeysetPaginationTest(TestCase):
+    """Recorrer el catálogo por cursores devuelve cada producto una sola vez y en orden."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Servicios", slug="servicios")
+        # Precios repetidos para probar el desempate por id
+        Product.objects.bulk_create(
+            [
+                Product(name=f"Producto {i:02d}", price=Decimal(10 + i % 4), category=category)
+                for i in range(30)
+            ]
+        )
+
+    def _walk(self, sort, per_page=7):
+        paginator = KeysetPaginator(Product.objects.all(), per_page, sort=sort)
+        page = paginator.page()
+        pages = [page]
+        while page.has_next:
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+        return paginator, pages
+
+    def test_forward_walk_matches_ordering(self):
+        for sort, ordering in SORT_OPTIONS.items():
+            if sort == "relevance":
+                continue  # Solo aplica a búsquedas (ProductSearchTest)
+            with self.subTest(sort=sort):
+                _, pages = self._walk(sort)
+                seen = [p.pk for page in pages for p in page]
+                expected = list(Product.objects.order_by(*ordering).values_list("pk", flat=True))
+                self.assertEqual(seen, expected)
+                self.assertFalse(pages[0].has_previous)
+                self.assertTrue(pages[-1].has_previous)
+
+    def test_backward_walk(self):
+        paginator, pages = self._walk("price")
+        page = pages[-1]
+        back = [page]
+        while page.has_previous:
+            page = paginator.page(page.previous_cursor)
+            back.append(page)
+        self.assertEqual(
+            [[p.pk for p in page] for page in reversed(back)],
+            [[p.pk for p in page] for page in pages],
+        )
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), 5)
+        first = [p.pk for p in paginator.page()]
+        self.assertEqual([p.pk for p in paginator.page("manipulado")], first)
+        other_sort = KeysetPaginator(Product.objects.all(), 5, sort="price").page().next_cursor
+        self.assertEqual([p.pk for p in paginator.page(other_sort)], first)
+
+    def test_list_view_pages_by_cursor(self):
+        url = reverse("products:product-list")
+        response = self.client.get(url, {"sort": "-price"})
+        self.assertEqual(len(response.context["products"]), 12)
+        self.assertEqual(response.context["total_count"], 30)
+        page = response.context["page_obj"]
+        self.assertIn("sort=-price", page.next_query)
+
+        # Una página profunda cuesta lo mismo que la primera: sin COUNT(*) ni OFFSET
+        with self.assertNumQueries(1):
+            response = self.client.get(url + page.next_query)
+        self.assertEqual(len(response.context["products"]), 12)
+
+
+class ProductSearchTest(TestCase):
+    """Búsqueda del catálogo (texto completo + trigramas en PostgreSQL)."""
+
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(name="Celulares", slug="celulares")
+        services = Category.objects.create(name="Desbloqueos", slug="desbloqueos")
+        self.note = Product.objects.create(
+            name="Redmi Note 13 Pro", price=Decimal("299.00"), category=self.phones, tag="Nuevo"
+        )
+        self.poco = Product.objects.create(
+            name="POCO X6", price=Decimal("249.00"), category=self.phones,
+            description="Pantalla AMOLED y carga rápida",
+        )
+        self.unlock = Product.objects.create(
+            name="Liberación Mi Account", price=Decimal("25.00"), category=services,
+            description="Desbloqueamos cuentas de teléfonos Xiaomi",
+        )
+
+    def _search(self, query, **params):
+        response = self.client.get(reverse("products:product-list"), {"q": query, **params})
+        return [p.pk for p in response.context["products"]]
+
+    def test_search_by_name(self):
+        self.assertEqual(self._search("Redmi Note 13")[0], self.note.pk)
+
+    def test_search_description_and_category(self):
+        self.assertIn(self.poco.pk, self._search("AMOLED"))
+        self.assertIn(self.unlock.pk, self._search("Desbloqueos"))
+
+    def test_empty_query_lists_everything(self):
+        self.assertEqual(len(self._search("   ")), 3)
+
+    @skipUnless(connection.vendor == "postgresql", "Texto completo y trigramas requieren PostgreSQL")
+    def test_spanish_stemming_and_typos(self):
+        self.assertIn(self.unlock.pk, self._search("teléfono"))  # teléfonos
+        self.assertEqual(self._search("redmy note")[0], self.note.pk)
+
+    @skipUnless(connection.vendor == "postgresql", "El vector lo mantiene un trigger de PostgreSQL")
+    def test_vector_follows_category_rename(self):
+        self.phones.name = "Smartphones"
+        self.phones.save()
+        self.assertIn(self.poco.pk, self._search("smartphones"))
+        self.assertNotIn(self.poco.pk, self._search("celulares"))
+
+    def test_relevance_pages_by_cursor(self):
+        category = Category.objects.create(name="Accesorios", slug="accesorios")
+        Product.objects.bulk_create(
+            [Product(name=f"Funda Redmi {i}", price=Decimal("5.00"), category=category) for i in range(20)]
+        )
+        url = reverse("products:product-list")
+        response = self.client.get(url, {"q": "Redmi"})
+        self.assertEqual(response.context["sort"], "relevance")
+        seen = [p.pk for p in response.context["products"]]
+        page = response.context["page_obj"]
+        while page.has_next:
+            response = self.client.get(url + page.next_query)
+            page = response.context["page_obj"]
+            seen += [p.pk for p in page]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), set(search_products(Product.objects.all(), "Redmi").values_list("pk", flat=True)))
+        self.assertIn(self.note.pk, seen)
+
+
+class FacetEngineTest(TestCase):
+    """Facetas del catálogo: filtros combinados y conteos en una sola consulta."""
+
+    def setUp(self):
+        cache.clear()
+        phones = Category.objects.create(name="Celulares", slug="celulares")
+        services = Category.objects.create(name="Desbloqueos", slug="desbloqueos")
+        Product.objects.bulk_create(
+            [
+                Product(name="Redmi Note 13", price=Decimal("299.00"), category=phones,
+                        catalog_type="PRODUCT", tag="Nuevo", rating=Decimal("4.5")),
+                Product(name="POCO X6", price=Decimal("249.00"), category=phones,
+                        catalog_type="PRODUCT", rating=Decimal("3.8")),
+                Product(name="Redmi 13C", price=Decimal("89.00"), category=phones,
+                        catalog_type="PRODUCT", tag="Oferta", rating=Decimal("4.1")),
+                Product(name="Liberación Mi Account", price=Decimal("25.00"), category=services,
+                        catalog_type="SERVICE", rating=Decimal("4.9")),
+                Product(name="Desbloqueo FRP", price=Decimal("15.00"), category=services,
+                        catalog_type="SERVICE", tag="Nuevo"),
+            ]
+        )
+
+    def _engine(self, query=""):
+        return FacetEngine(Product.objects.all(), QueryDict(query))
+
+    def _counts(self, query=""):
+        return {
+            name: {option.value: option.count for option in options}
+            for name, options in self._engine(query).counts().items()
+        }
+
+    def test_counts_without_selection(self):
+        counts = self._counts()
+        self.assertEqual(counts["category"], {"celulares": 3, "desbloqueos": 2})
+        self.assertEqual(counts["type"], {"PRODUCT": 3, "SERVICE": 2})
+        self.assertEqual(counts["tag"], {"Nuevo": 2, "Oferta": 1})
+        self.assertEqual(counts["price"], {"0-50": 2, "50-100": 1, "100-250": 1, "250-500": 1})
+        self.assertEqual(counts["rating"], {"4": 3, "3": 4, "2": 4, "1": 4})
+
+    def test_own_facet_is_ignored_in_its_counts(self):
+        counts = self._counts("category=celulares&tag=Nuevo")
+        # La categoría cuenta con la etiqueta aplicada y la etiqueta con la categoría
+        self.assertEqual(counts["category"], {"celulares": 1, "desbloqueos": 1})
+        self.assertEqual(counts["tag"], {"Nuevo": 1, "Oferta": 1})
+        self.assertEqual(counts["type"], {"PRODUCT": 1})
+
+    def test_filter_combines_facets(self):
+        names = lambda query: set(self._engine(query).filter().values_list("name", flat=True))
+        self.assertEqual(names("category=celulares&price=50-100&price=250-500"), {"Redmi 13C", "Redmi Note 13"})
+        self.assertEqual(names("rating=4&type=SERVICE"), {"Liberación Mi Account"})
+        self.assertEqual(names("price=desconocido"), set(Product.objects.values_list("name", flat=True)))
+
+    def test_counts_use_one_cached_query(self):
+        with self.assertNumQueries(1):
+            self._engine("category=celulares").counts()
+        # Otra combinación de filtros sobre el mismo catálogo reutiliza el cubo
+        with self.assertNumQueries(0):
+            self._engine("type=SERVICE&rating=3").counts()
+
+    def test_list_view_filters_and_keeps_facets_in_links(self):
+        Product.objects.bulk_create(
+            [
+                Product(name=f"Funda {i}", price=Decimal("9.00"), category=Category.objects.get(slug="celulares"),
+                        catalog_type="PRODUCT")
+                for i in range(15)
+            ]
+        )
+        response = self.client.get(reverse("products:product-list"), {"category": "celulares", "price": "0-50"})
+        self.assertEqual(response.context["total_count"], 15)
+        self.assertTrue(response.context["has_facet_filters"])
+        self.assertIn("category=celulares", response.context["page_obj"].next_query)
+        facets = {name: options for name, _, options in response.context["facets"]}
+        self.assertTrue(next(o for o in facets["category"] if o.value == "celulares").selected)
+
+
+class CatalogCacheTest(TestCase):
+    """Las lecturas repetidas no tocan la BD y cada cambio invalida solo lo necesario."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Celulares", slug="celulares")
+        self.product = Product.objects.create(
+            name="Redmi Note 13", price=Decimal("299.00"), category=self.category
+        )
+        self.detail_url = reverse("products:product-detail", args=[self.product.pk])
+
+    def test_detail_is_cached_until_product_changes(self):
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog_cache.get_product(self.product.pk).name, "Redmi Note 13")
+
+        self.product.name = "Redmi Note 13 Pro"
+        self.product.save()
+        self.assertEqual(self.client.get(self.detail_url).context["product"].name, "Redmi Note 13 Pro")
+
+    def test_category_rename_invalidates_its_products(self):
+        self.client.get(self.detail_url)
+        self.category.name = "Smartphones"
+        self.category.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.context["product"].category.name, "Smartphones")
+
+    def test_deleted_product_returns_404(self):
+        self.client.get(self.detail_url)
+        self.product.delete()
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+
+    def test_listing_page_is_cached_until_catalog_changes(self):
+        url = reverse("products:product-list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        new = Product.objects.create(name="POCO X6", price=Decimal("249.00"), category=self.category)
+        response = self.client.get(url)
+        self.assertEqual(response.context["products"][0].pk, new.pk)
+        self.assertEqual(response.context["total_count"], 2)
+
+    def test_lost_version_never_reuses_old_entries(self):
+        before = catalog_cache.namespace_version("listing")
+        cache.delete("catalog:version:listing")  # Como si el backend la hubiera descartado
+        self.assertNotEqual(catalog_cache.namespace_version("listing"), before)
+
+
+class AnonymousPageCacheTest(TestCase):
+    """Páginas completas para anónimos con ETag/Last-Modified y GET condicional."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Celulares", slug="celulares")
+        self.product = Product.objects.create(
+            name="Redmi Note 13", price=Decimal("299.00"), category=self.category,
+            catalog_type=Product.CatalogType.PRODUCT,
+        )
+        self.urls = [
+            reverse("pages:home"),
+            reverse("products:product-list"),
+            reverse("products:product-detail", args=[self.product.pk]),
+        ]
+
+    def test_repeated_get_skips_rendering_and_db(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second["ETag"], first["ETag"])
+                self.assertIn("Last-Modified", second)
+                self.assertIn("csrftoken", second.cookies)
+
+    def test_conditional_get_returns_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(0):
+                    etag = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                    modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+                self.assertEqual(etag.status_code, 304)
+                self.assertEqual(modified.status_code, 304)
+
+    def test_catalog_change_invalidates_dependent_urls(self):
+        etags = [self.client.get(url)["ETag"] for url in self.urls]
+        self.product.name = "Redmi Note 13 Pro"
+        self.product.save()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "Redmi Note 13 Pro")
+
+    def test_other_product_keeps_detail_cached(self):
+        detail = self.urls[2]
+        etag = self.client.get(detail)["ETag"]
+        Product.objects.create(name="POCO X6", price=Decimal("249.00"), category=self.category)
+        self.assertEqual(self.client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_cart_state_varies_the_page(self):
+        url = self.urls[1]
+        empty = self.client.get(url)["ETag"]
+        session = self.client.session
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        self.assertEqual(self.client.get(url)["ETag"], empty)  # Sesión sin carrito
+
+        cart = Cart.objects.create(session_key=session.session_key)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.assertNotEqual(self.client.get(url)["ETag"], empty)
+
+    def test_authenticated_users_bypass_the_cache(self):
+        user = User.objects.create_user(username="cliente@example.com", password="clave-segura")
+        self.client.force_login(user)
+        response = self.client.get(self.urls[1])
+        self.assertNotIn("ETag", response)
+        self.assertIsNotNone(response.context)
+
+
+class ProductCardFragmentTest(TestCase):
+    """La tarjeta cachea su parte estática por producto y updated_at; el favorito va aparte."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Celulares", slug="celulares")
+        self.product = Product.objects.create(name="Redmi Note 13", price=Decimal("299.00"), category=category)
+
+    def _render(self, favorites=()):
+        product = Product.objects.get(pk=self.product.pk)
+        return render_to_string(
+            "components/product_card.html", {"product": product, "user_favorites": list(favorites)}
+        )
+
+    def test_static_part_follows_updated_at(self):
+        self.assertIn("Redmi Note 13", self._render())
+        # update() no toca updated_at: el fragmento sigue vigente
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal("1.00"))
+        self.assertIn("299", self._render())
+
+        self.product.refresh_from_db()
+        self.product.name = "Redmi Note 13 Pro"
+        self.product.save()
+        html = self._render()
+        self.assertIn("Redmi Note 13 Pro", html)
+        self.assertNotIn("299", html)
+
+    def test_favorite_state_is_not_cached(self):
+        self.assertIn("favorite_border", self._render())
+        html = self._render(favorites=[self.product.pk])
+        self.assertNotIn("favorite_border", html)
+        self.assertIn("text-red-500", html)
+
+
+class FavoriteServiceTest(TestCase):
+    """Favoritos como frozenset: una consulta por usuario hasta que cambian."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Celulares", slug="celulares")
+        self.products = Product.objects.bulk_create(
+            [Product(name=f"Producto {i}", price=Decimal("10.00"), category=category) for i in range(12)]
+        )
+        self.user = User.objects.create_user(username="cliente@example.com", password="clave-segura")
+        Favorite.objects.create(user=self.user, product=self.products[0])
+        self.client.force_login(self.user)
+
+    def test_list_view_gets_a_frozenset(self):
+        response = self.client.get(reverse("products:product-list"))
+        favorites = response.context["user_favorites"]
+        self.assertIsInstance(favorites, frozenset)
+        self.assertEqual(favorites, {self.products[0].pk})
+
+    def test_cached_per_user_until_changed(self):
+        with self.assertNumQueries(1):
+            FavoriteService.ids_for_user(self.user.pk)
+        with self.assertNumQueries(0):
+            FavoriteService.ids_for_user(self.user.pk)
+
+        response = self.client.put(reverse("products:favorite", args=[self.products[1].pk]))
+        self.assertEqual(response.json(), {"status": "added", "product_id": self.products[1].pk})
+        self.assertEqual(FavoriteService.ids_for_user(self.user.pk), {self.products[0].pk, self.products[1].pk})
+
+        self.client.delete(reverse("products:favorite", args=[self.products[0].pk]))
+        self.assertEqual(FavoriteService.ids_for_user(self.user.pk), {self.products[1].pk})
+
+    def test_deleting_a_product_invalidates_favorites(self):
+        FavoriteService.ids_for_user(self.user.pk)
+        self.products[0].delete()
+        self.assertEqual(FavoriteService.ids_for_user(self.user.pk), frozenset())
+
+
+class FavoriteApiTest(TestCase):
+    """PUT/DELETE idempotentes de una sola sentencia y sincronización en bloque."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Celulares", slug="celulares")
+        self.products = Product.objects.bulk_create(
+            [Product(name=f"Producto {i}", price=Decimal("10.00"), category=category) for i in range(3)]
+        )
+        self.user = User.objects.create_user(username="cliente@example.com", password="clave-segura")
+        self.client.force_login(self.user)
+        self.url = reverse("products:favorite", args=[self.products[0].pk])
+
+    def test_put_and_delete_are_idempotent(self):
+        for _ in range(2):
+            response = self.client.put(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["status"], "added")
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 1)
+
+        for _ in range(2):
+            response = self.client.delete(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["status"], "removed")
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_single_statement_per_change(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(FavoriteService.add(self.user.pk, [self.products[0].pk]), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(FavoriteService.add(self.user.pk, [self.products[0].pk]), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(FavoriteService.remove(self.user.pk, [self.products[0].pk]), 1)
+
+    def test_missing_product_is_404(self):
+        response = self.client.put(reverse("products:favorite", args=[999999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_anonymous_gets_login_required(self):
+        self.client.logout()
+        response = self.client.put(self.url)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["error"], "login_required")
+
+    def test_post_is_not_allowed(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_sync_adds_existing_products_only(self):
+        Favorite.objects.create(user=self.user, product=self.products[0])
+        ids = [self.products[0].pk, self.products[1].pk, self.products[1].pk, 999999]
+        response = self.client.put(
+            reverse("products:favorite-sync"), json.dumps({"product_ids": ids}), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"added": 1, "favorites": [self.products[0].pk, self.products[1].pk]}
+        )
+
+    def test_sync_rejects_invalid_payload(self):
+        for body in ("no-json", json.dumps({"product_ids": ["x"]}), json.dumps({"ids": []})):
+            response = self.client.put(reverse("products:favorite-sync"), body, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+
+class CountingCache(LocMemCache):
+    """LocMemCache que cuenta los viajes de lectura al backend."""
+
+    reads = 0
+
+    def get(self, *args, **kwargs):
+        CountingCache.reads += 1
+        return super().get(*args, **kwargs)
+
+    def get_many(self, keys, version=None):
+        CountingCache.reads += 1
+        found = {}
+        for key in keys:
+            value = super().get(key, version=version)
+            if value is not None:
+                found[key] = value
+        return found
+
+
+class RelatedProductsTest(TestCase):
+    """Listas precalculadas: pares de pedidos incrementales y vecinos por precio."""
+
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(name="Celulares", slug="celulares")
+        self.cases = Category.objects.create(name="Fundas", slug="fundas")
+        self.p = [
+            Product.objects.create(name=f"Celular {i}", price=Decimal(10 * (i + 1)), category=self.phones)
+            for i in range(6)
+        ]
+        self.case = Product.objects.create(name="Funda", price=Decimal("5.00"), category=self.cases)
+        self.user = User.objects.create_user(username="cliente@example.com", password="clave-segura")
+        self._order(self.p[0], self.p[1], self.p[2])
+        self._order(self.p[0], self.p[1], self.case)
+        self._order(self.p[0], self.p[3], status=Order.OrderStatus.CANCELLED)
+
+    def _order(self, *products, status=Order.OrderStatus.PENDING):
+        order = Order.objects.create(
+            user=self.user,
+            shipping_name="Cliente",
+            shipping_email="cliente@example.com",
+            shipping_phone="3000000000",
+            shipping_address="Calle 1",
+            shipping_city="Bogotá",
+            status=status,
+        )
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product=product, price=product.price) for product in products]
+        )
+        return order
+
+    def _related(self, product, kind):
+        return list(
+            RelatedProduct.objects.filter(product=product, kind=kind)
+            .order_by("rank")
+            .values_list("related_id", flat=True)
+        )
+
+    def test_bought_together_ranks_pairs_and_skips_cancelled_orders(self):
+        result = build_related_products(order_delay_seconds=0)
+        self.assertEqual(result.orders, 3)
+        self.assertEqual(
+            self._related(self.p[0], RelatedProduct.Kind.BOUGHT_TOGETHER),
+            [self.p[1].pk, self.p[2].pk, self.case.pk],
+        )
+        self.assertEqual(self._related(self.p[3], RelatedProduct.Kind.BOUGHT_TOGETHER), [])
+
+    def test_incremental_run_only_reads_new_orders(self):
+        build_related_products(order_delay_seconds=0)
+        self._order(self.p[0], self.case)
+        self._order(self.p[0], self.case)
+        result = build_related_products(order_delay_seconds=0)
+        self.assertEqual(result.orders, 2)
+        self.assertEqual(result.bought_together, 2)
+        self.assertEqual(
+            self._related(self.p[0], RelatedProduct.Kind.BOUGHT_TOGETHER),
+            [self.case.pk, self.p[1].pk, self.p[2].pk],
+        )
+
+    def test_refunded_orders_are_not_counted(self):
+        self._order(self.p[4], self.p[5], status=Order.OrderStatus.REFUNDED)
+        build_related_products(order_delay_seconds=0)
+        self.assertEqual(self._related(self.p[4], RelatedProduct.Kind.BOUGHT_TOGETHER), [])
+
+    def test_cancelling_a_processed_order_removes_its_pairs(self):
+        order = self._order(self.p[4], self.p[5])
+        build_related_products(order_delay_seconds=0)
+        self.assertEqual(self._related(self.p[4], RelatedProduct.Kind.BOUGHT_TOGETHER), [self.p[5].pk])
+
+        OrderService.transition([order.pk], Order.OrderStatus.CANCELLED)
+        self.assertEqual(self._related(self.p[4], RelatedProduct.Kind.BOUGHT_TOGETHER), [])
+        self.assertFalse(CoPurchase.objects.filter(product=self.p[4]).exists())
+        self.assertEqual(
+            self._related(self.p[0], RelatedProduct.Kind.BOUGHT_TOGETHER),
+            [self.p[1].pk, self.p[2].pk, self.case.pk],
+        )
+
+        # Reactivado vuelve a contar, sin esperar a la próxima corrida
+        OrderService.transition([order.pk], Order.OrderStatus.PENDING)
+        self.assertEqual(self._related(self.p[4], RelatedProduct.Kind.BOUGHT_TOGETHER), [self.p[5].pk])
+
+    def test_cancelling_an_unprocessed_order_waits_for_the_build(self):
+        build_related_products(order_delay_seconds=0)
+        order = self._order(self.p[4], self.p[5])
+        OrderService.transition([order.pk], Order.OrderStatus.CANCELLED)
+        build_related_products(order_delay_seconds=0)
+        self.assertEqual(self._related(self.p[4], RelatedProduct.Kind.BOUGHT_TOGETHER), [])
+
+    def test_recent_orders_wait_for_the_delay(self):
+        result = build_related_products(order_delay_seconds=300)
+        self.assertEqual(result.orders, 0)
+        self.assertFalse(RelatedProduct.objects.filter(kind=RelatedProduct.Kind.BOUGHT_TOGETHER).exists())
+
+    def test_similar_are_closest_in_price_within_category(self):
+        build_related_products(order_delay_seconds=0, limit=3)
+        self.assertEqual(
+            self._related(self.p[2], RelatedProduct.Kind.SIMILAR),
+            [self.p[1].pk, self.p[3].pk, self.p[0].pk],
+        )
+        self.assertEqual(self._related(self.case, RelatedProduct.Kind.SIMILAR), [])
+
+    def test_similar_only_recomputes_changed_categories(self):
+        build_related_products(order_delay_seconds=0)
+        self.assertEqual(build_related_products(order_delay_seconds=0).similar, 0)
+        self.case.price = Decimal("6.00")
+        self.case.save()
+        self.assertEqual(build_related_products(order_delay_seconds=0).similar, 1)
+
+    def test_moving_a_product_recomputes_its_old_category(self):
+        build_related_products(order_delay_seconds=0)
+        self.assertIn(self.p[5].pk, self._related(self.p[4], RelatedProduct.Kind.SIMILAR))
+        self.p[5].category = self.cases
+        self.p[5].save()
+
+        self.assertEqual(build_related_products(order_delay_seconds=0).similar, 7)
+        self.assertNotIn(self.p[5].pk, self._related(self.p[4], RelatedProduct.Kind.SIMILAR))
+        self.assertEqual(self._related(self.case, RelatedProduct.Kind.SIMILAR), [self.p[5].pk])
+        self.assertFalse(
+            RelatedProduct.objects.filter(kind=RelatedProduct.Kind.SIMILAR)
+            .exclude(product__category=F("related__category"))
+            .exists()
+        )
+
+    def test_detail_reads_related_with_one_query(self):
+        build_related_products(order_delay_seconds=0)
+        with self.assertNumQueries(1):
+            blocks = catalog_cache.related_products(self.p[0].pk)
+        with self.assertNumQueries(0):
+            catalog_cache.related_products(self.p[0].pk)
+        self.assertEqual(blocks[RelatedProduct.Kind.BOUGHT_TOGETHER][0], self.p[1])
+
+        response = self.client.get(reverse("products:product-detail", args=[self.p[0].pk]))
+        self.assertContains(response, "Comprados juntos frecuentemente")
+        self.assertContains(response, "Productos similares")
+
+    @override_settings(CACHES={"default": {"BACKEND": "apps.products.tests.CountingCache"}})
+    def test_cached_related_checks_versions_with_one_read(self):
+        build_related_products(order_delay_seconds=0)
+        catalog_cache.related_products(self.p[0].pk)
+        CountingCache.reads = 0
+        blocks = catalog_cache.related_products(self.p[0].pk)
+        self.assertGreater(sum(len(products) for products in blocks.values()), 2)
+        # Versión del grupo, entrada cacheada y un get_many con las de todos los relacionados
+        self.assertEqual(CountingCache.reads, 3)
+
+    def test_rebuild_invalidates_cached_detail(self):
+        url = reverse("products:product-detail", args=[self.p[0].pk])
+        self.assertNotContains(self.client.get(url), "Comprados juntos frecuentemente")
+        build_related_products(order_delay_seconds=0)
+        self.assertContains(self.client.get(url), "Comprados juntos frecuentemente")
+
+    def test_editing_a_related_product_refreshes_the_block(self):
+        build_related_products(order_delay_seconds=0)
+        url = reverse("products:product-detail", args=[self.p[0].pk])
+        self.assertContains(self.client.get(url), "Celular 1")
+        self.p[1].name = "Celular renombrado"
+        self.p[1].save()
+        self.assertContains(self.client.get(url), "Celular renombrado")
+        blocks = catalog_cache.related_products(self.p[0].pk)
+        self.assertEqual(blocks[RelatedProduct.Kind.BOUGHT_TOGETHER][0].name, "Celular renombrado")
+
+
+class ResponsiveImageTest(TestCase):
+    """URLs de Cloudinary por ancho, armadas sin conexión y cacheadas por public_id."""
+
+    def setUp(self):
+        self.previous_cloud = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name="demo")
+        clear_cache()
+        self.image = CloudinaryResource("products/redmi-note", format="jpg", version=1700000000)
+
+    def tearDown(self):
+        cloudinary.config(cloud_name=self.previous_cloud)
+        clear_cache()
+
+    def test_srcset_has_one_transformed_url_per_width(self):
+        data = responsive_image(self.image, "card")
+        urls = [candidate.split(" ") for candidate in data.srcset.split(", ")]
+        self.assertEqual([w for _, w in urls], ["160w", "240w", "320w", "480w", "640w", "800w"])
+        self.assertEqual(
+            urls[0][0],
+            "https://res.cloudinary.com/demo/image/upload/c_limit,f_auto,q_auto,w_160/v1700000000/products/redmi-note.jpg",
+        )
+        self.assertIn("w_480", data.src)
+        self.assertEqual((data.width, data.height), (400, 400))
+
+    def test_cached_per_public_id_and_version(self):
+        first = responsive_image(self.image, "card")
+        same = CloudinaryResource("products/redmi-note", format="jpg", version=1700000000)
+        self.assertIs(responsive_image(same, "card"), first)
+        replaced = CloudinaryResource("products/redmi-note", format="jpg", version=1800000000)
+        self.assertIn("v1800000000", responsive_image(replaced).src)
+
+    def test_missing_image(self):
+        self.assertIsNone(responsive_image(None))
+        self.assertEqual(Template("{% load image_tags %}{% responsive_img image %}").render(Context({"image": None})), "")
+
+    def test_tag_renders_lazy_img_unless_eager(self):
+        template = Template('{% load image_tags %}{% responsive_img image "banner" eager=eager alt="Promo" %}')
+        lazy = template.render(Context({"image": self.image, "eager": False}))
+        self.assertIn('loading="lazy"', lazy)
+        self.assertIn('sizes="100vw"', lazy)
+        self.assertIn('alt="Promo"', lazy)
+        self.assertNotIn("fetchpriority", lazy)
+        eager = template.render(Context({"image": self.image, "eager": True}))
+        self.assertIn('loading="eager"', eager)
+        self.assertIn('fetchpriority="high"', eager)
+
+    def test_product_card_uses_srcset(self):
+        product = Product(pk=1, name="Redmi", price=Decimal("10.00"), image=self.image)
+        html = render_to_string("components/product_card.html", {"product": product, "user_favorites": []})
+        self.assertIn("srcset=", html)
+        self.assertNotIn('src="https://res.cloudinary.com/demo/image/upload/v1700000000', html)
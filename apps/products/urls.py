@@ -1,10 +1,11 @@
 from django.urls import path
-from .views import ProductListView, ProductDetailView, toggle_favorite
+from .views import ProductListView, ProductDetailView, favorite, sync_favorites
 
 app_name = 'products'
 
 urlpatterns = [
     path('', ProductListView.as_view(), name='product-list'),
     path('<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
-    path('favorite/toggle/<int:product_id>/', toggle_favorite, name='favorite-toggle'),
+    path('favorites/', sync_favorites, name='favorite-sync'),
+    path('favorites/<int:product_id>/', favorite, name='favorite'),
 ]
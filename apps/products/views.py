@@ -1,11 +1,22 @@
-from django.shortcuts import render, get_object_or_404
+import hashlib
+
+from django.shortcuts import render
+from django.http import Http404
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView
 from django.http import JsonResponse
-from django.contrib.auth.decorators import login_required
-from .models import Product, Favorite
+from django.views.decorators.http import require_http_methods
+from . import catalog_cache
+from .models import Product, RelatedProduct
+from .page_cache import cache_anonymous_page, listing_last_modified, product_last_modified, product_namespaces
+from .facets import FACETS, FacetEngine
+from .pagination import DEFAULT_SORT, SORT_LABELS, KeysetPaginator
+from .search import normalize_query, search_products
+from .services import MAX_SYNC_IDS, FavoriteService
 
 
 
+@method_decorator(cache_anonymous_page(["listing"], listing_last_modified), name='dispatch')
 class ProductListView(ListView):
     model = Product
     template_name = 'products/products.html'
@@ -13,41 +24,121 @@ class ProductListView(ListView):
     paginate_by = 12  # Best Practice: Pagination for performance
 
     def get_queryset(self):
-        return Product.objects.all().order_by('-id')  # Newest first
+        # El orden lo aplica el paginador (newest = -id; relevance al buscar)
+        self.query = normalize_query(self.request.GET.get('q', ''))
+        queryset = Product.objects.all()
+        if self.query:
+            queryset = search_products(queryset, self.query)
+        # Facetas sobre la búsqueda: el paginador recibe el queryset ya filtrado
+        self.facets = FacetEngine(queryset, self.request.GET)
+        return self.facets.filter()
+
+    def paginate_queryset(self, queryset, page_size):
+        # Paginación por cursor: cada página es un rango del índice, sin OFFSET ni COUNT(*)
+        self.paginator = KeysetPaginator(
+            queryset,
+            page_size,
+            sort=self.request.GET.get('sort'),
+            default='relevance' if self.query else DEFAULT_SORT,
+        )
+        # Cada página (búsqueda + facetas + orden + cursor) se cachea hasta que cambie el catálogo
+        key = hashlib.md5(self.request.GET.urlencode().encode()).hexdigest()
+        page = catalog_cache.cached(
+            'listing',
+            f'page:{key}',
+            lambda: self.paginator.page(self.request.GET.get('cursor'), params=self.request.GET),
+        )
+        return (None, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_favorites = []
-        if self.request.user.is_authenticated:
-            user_favorites = Favorite.objects.filter(user=self.request.user).values_list('product_id', flat=True)
-        context['user_favorites'] = user_favorites
+        context['user_favorites'] = FavoriteService.ids_for(self.request)
+        context['total_count'], context['count_is_estimate'] = self.paginator.count()
+        context['sort'] = self.paginator.sort
+        context['sort_options'] = [
+            (value, label) for value, label in SORT_LABELS.items()
+            if value != 'relevance' or self.query
+        ]
+        context['query'] = self.query
+        facet_counts = self.facets.counts()
+        context['facets'] = [(name, title, facet_counts[name]) for name, title in FACETS.items()]
+        context['has_facet_filters'] = bool(self.facets.selection)
         return context
 
 
+@method_decorator(cache_anonymous_page(product_namespaces, product_last_modified), name='dispatch')
 class ProductDetailView(DetailView):
     model = Product
     template_name = 'products/details.html'
     context_object_name = 'product'
 
+    def get_object(self, queryset=None):
+        product = catalog_cache.get_product(self.kwargs['pk'])
+        if product is None:
+            raise Http404("Producto no encontrado")
+        return product
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_favorites = []
-        if self.request.user.is_authenticated:
-            user_favorites = Favorite.objects.filter(user=self.request.user).values_list('product_id', flat=True)
-        context['user_favorites'] = user_favorites
+        context['user_favorites'] = FavoriteService.ids_for(self.request)
+        # Precalculados por `manage.py build_related_products`
+        related = catalog_cache.related_products(self.object.pk)
+        context['related_blocks'] = [
+            ('Comprados juntos frecuentemente', related[RelatedProduct.Kind.BOUGHT_TOGETHER]),
+            ('Productos similares', related[RelatedProduct.Kind.SIMILAR]),
+        ]
         return context
 
 
-@login_required
-def toggle_favorite(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    favorite, created = Favorite.objects.get_or_create(user=request.user, product=product)
-    
-    if not created:
-        favorite.delete()
-        status = 'removed'
-    else:
-        status = 'added'
-        
-    return JsonResponse({'status': status})
+def _login_required_json():
+    return JsonResponse({
+        'success': False,
+        'error': 'login_required',
+        'message': 'Debes iniciar sesión para guardar favoritos.'
+    }, status=403)
+
+
+@require_http_methods(['PUT', 'DELETE'])
+def favorite(request, product_id):
+    """
+    API Endpoint idempotente de un favorito: PUT lo marca y DELETE lo quita.
+    Repetir la misma petición (doble clic, reintento) deja el mismo estado.
+    """
+    if not request.user.is_authenticated:
+        return _login_required_json()
+
+    user_id = request.user.pk
+    if request.method == 'DELETE':
+        FavoriteService.remove(user_id, [product_id])
+        return JsonResponse({'status': 'removed', 'product_id': product_id})
+
+    # Sin filas nuevas: ya era favorito o el producto no existe
+    if not FavoriteService.add(user_id, [product_id]) and product_id not in FavoriteService.ids_for_user(user_id):
+        raise Http404("Producto no encontrado")
+    return JsonResponse({'status': 'added', 'product_id': product_id})
+
+
+@require_http_methods(['PUT'])
+def sync_favorites(request):
+    """
+    API Endpoint para subir en bloque los favoritos guardados en el navegador
+    antes de iniciar sesión. Body JSON: {"product_ids": [int, ...]}
+    Ignora los productos que ya no existen y retorna todos los favoritos del usuario.
+    """
+    if not request.user.is_authenticated:
+        return _login_required_json()
+
+    import json
+    try:
+        raw_ids = json.loads(request.body)['product_ids']
+        if not isinstance(raw_ids, list) or len(raw_ids) > MAX_SYNC_IDS:
+            raise ValueError(f'Máximo {MAX_SYNC_IDS} productos por sincronización')
+        product_ids = [int(product_id) for product_id in raw_ids]
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': str(e) or 'Lista inválida'}, status=400)
 
+    added = FavoriteService.add(request.user.pk, product_ids)
+    return JsonResponse({
+        'added': added,
+        'favorites': sorted(FavoriteService.ids_for_user(request.user.pk)),
+    })
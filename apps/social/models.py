@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 
 class SocialMedia(models.Model):
@@ -59,3 +61,11 @@ class SocialMedia(models.Model):
             }
             self.icon = icon_map.get(self.platform, 'fas fa-link')
         super().save(*args, **kwargs)
+
+
+@receiver(post_save, sender=SocialMedia)
+@receiver(post_delete, sender=SocialMedia)
+def invalidate_footer_cache(sender, instance, **kwargs):
+    from apps.products.catalog_cache import invalidate  # Evita import circular
+
+    invalidate("social")
@@ -0,0 +1,24 @@
+"""
+Tags de las redes sociales del footer.
+El footer se cachea como fragmento con la versión de "social" en la clave; las
+señales de SocialMedia suben esa versión, así el fragmento dura hasta que cambia una fila.
+"""
+
+from django import template
+
+from apps.products.catalog_cache import namespace_version
+from apps.social.models import SocialMedia
+
+register = template.Library()
+
+
+@register.simple_tag
+def social_version():
+    """Versión actual de las redes sociales (clave del fragmento del footer)"""
+    return namespace_version("social")
+
+
+@register.simple_tag
+def social_links():
+    """Redes sociales activas; solo se consulta cuando el fragmento no está en caché"""
+    return list(SocialMedia.objects.filter(is_active=True))
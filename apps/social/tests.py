@@ -1,3 +1,30 @@
+"""
+Tests de las redes sociales del footer.
+"""
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
 from django.test import TestCase
 
-# Create your tests here.
+from .models import SocialMedia
+
+
+class FooterSocialLinksTest(TestCase):
+    """El fragmento del footer se cachea hasta que cambia una fila de SocialMedia."""
+
+    def setUp(self):
+        cache.clear()
+        SocialMedia.objects.create(platform="facebook", url="https://facebook.com/mixiaomi")
+
+    def test_footer_cached_until_social_media_changes(self):
+        self.assertIn("https://facebook.com/mixiaomi", render_to_string("components/footer.html"))
+        with self.assertNumQueries(0):
+            render_to_string("components/footer.html")
+
+        SocialMedia.objects.create(platform="instagram", url="https://instagram.com/mixiaomi")
+        html = render_to_string("components/footer.html")
+        self.assertIn("https://instagram.com/mixiaomi", html)
+        self.assertIn("fab fa-instagram", html)
+
+        SocialMedia.objects.filter(platform="facebook").get().delete()
+        self.assertNotIn("facebook.com", render_to_string("components/footer.html"))
@@ -8,8 +8,9 @@ from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.conf import settings
+from django.db.models import Prefetch
 
-from apps.orders.models import Order
+from apps.orders.models import Order, OrderItem
 from apps.products.models import Favorite
 from .services import AuthService
 from .utils import get_display_name
@@ -157,15 +158,22 @@ def profile(request):
     """
     user = request.user
     # Obtener pedidos ordenados por fecha
-    orders = Order.objects.filter(user=user).order_by("-created_at")
-    # Obtener favoritos
-    favorites = Favorite.objects.filter(user=user).select_related("product")
+    orders = (
+        Order.objects.filter(user=user)
+        .select_related("testimonial")
+        .prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+        )
+        .order_by("-created_at")
+    )
+    # Obtener favoritos (una consulta; los IDs salen de la misma lista)
+    favorites = list(Favorite.objects.filter(user=user).select_related("product"))
 
     context = {
         "user": user,
         "orders": orders,
         "favorites": favorites,
-        "user_favorites": favorites.values_list("product_id", flat=True),
+        "user_favorites": frozenset(favorite.product_id for favorite in favorites),
         "active_tab": "orders",
     }
     return render(request, "users/profile.html", context)
@@ -0,0 +1,475 @@
+"""
+Benchmark de consultas de la tienda.
+Siembra volúmenes realistas, recorre páginas y endpoints y mide, por escenario,
+número de consultas, tiempo en BD y tiempo de render; falla si se excede un presupuesto.
+
+Lo usan el script tests/benchmark_queries.py (volúmenes grandes, tiempos)
+y los tests de regresión de apps/pages/tests.py (volúmenes chicos, solo consultas).
+"""
+
+import json
+import time
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from apps.orders.models import Cart, CartItem, Order, OrderItem
+from apps.orders.rollups import rebuild_sales_rollups
+from apps.pages.models import Banner, Testimonial
+from apps.products.models import Category, Favorite, Product
+
+
+class BenchmarkData(NamedTuple):
+    """Referencias a los datos sembrados que usan los escenarios"""
+
+    customer: User
+    staff: User
+    product_ids: list[int]
+    cart_item_ids: list[int]
+    order_id: int
+
+
+class Scenario(NamedTuple):
+    """
+    Página o endpoint a medir con sus presupuestos.
+    max_db_ms y max_total_ms solo se verifican en el benchmark completo.
+    """
+
+    name: str
+    path: Callable[[BenchmarkData], str]
+    user: Optional[str] = None  # None (anónimo), "customer" o "staff"
+    method: str = "get"
+    data: Optional[Callable[[BenchmarkData], object]] = None  # dict (formulario) o str (JSON)
+    max_queries: int = 10
+    max_db_ms: float = 100.0
+    max_total_ms: float = 500.0
+
+
+class BenchmarkResult(NamedTuple):
+    """Mediana de las repeticiones de un escenario"""
+
+    name: str
+    status: int
+    queries: int
+    db_ms: float
+    render_ms: float
+    total_ms: float
+
+
+def _json(payload: dict) -> Callable[[BenchmarkData], str]:
+    return lambda data: json.dumps(payload)
+
+
+SCENARIOS = [
+    # Tienda
+    Scenario("home", lambda d: reverse("pages:home"), max_queries=6),
+    Scenario("home_customer", lambda d: reverse("pages:home"), user="customer", max_queries=9),
+    # Listados en frío: página, conteo, facetas, Last-Modified y redes del footer (luego salen de caché)
+    Scenario("product_list", lambda d: reverse("products:product-list"), max_queries=6),
+    Scenario(
+        "product_list_customer",
+        lambda d: reverse("products:product-list"),
+        user="customer",
+        max_queries=9,
+    ),
+    Scenario(
+        "product_list_filtered",
+        lambda d: reverse("products:product-list") + "?category=categoria-1&price=100-250&rating=3",
+        max_queries=5,
+    ),
+    Scenario(
+        "product_detail",
+        lambda d: reverse("products:product-detail", args=[d.product_ids[0]]),
+        max_queries=4,
+    ),
+    Scenario("profile", lambda d: reverse("users:profile"), user="customer", max_queries=10),
+    Scenario("cart_view", lambda d: reverse("orders:cart_view"), user="customer", max_queries=5),
+    Scenario("checkout", lambda d: reverse("orders:checkout"), user="customer", max_queries=6),
+    Scenario(
+        "product_search",
+        lambda d: reverse("products:product-list") + "?q=Redmi+Note+13",
+        max_queries=6,
+    ),
+    Scenario(
+        "product_search_typo",
+        lambda d: reverse("products:product-list") + "?q=redmy+note",
+        max_queries=6,
+        max_db_ms=150.0,  # El respaldo por trigramas rankea todos los candidatos similares
+    ),
+    # API del carrito y favoritos
+    Scenario(
+        "api_add_to_cart",
+        lambda d: reverse("orders:add_to_cart", args=[d.product_ids[0]]),
+        user="customer",
+        method="post",
+        data=_json({"quantity": 1}),
+        max_queries=12,
+    ),
+    Scenario(
+        "api_update_cart_item",
+        lambda d: reverse("orders:update_cart_item", args=[d.cart_item_ids[0]]),
+        user="customer",
+        method="post",
+        data=lambda d: {"action": "increase"},
+        max_queries=12,
+    ),
+    Scenario(
+        "api_batch_update_cart",
+        lambda d: reverse("orders:batch_update_cart"),
+        user="customer",
+        method="post",
+        data=lambda d: json.dumps(
+            {"operations": [{"item_id": pk, "delta": 1} for pk in d.cart_item_ids[:10]]}
+        ),
+        max_queries=10,
+    ),
+    # Sesión + usuario + un único INSERT ... ON CONFLICT DO NOTHING
+    Scenario(
+        "api_put_favorite",
+        lambda d: reverse("products:favorite", args=[d.product_ids[1]]),
+        user="customer",
+        method="put",
+        max_queries=3,
+    ),
+    Scenario(
+        "api_sync_favorites",
+        lambda d: reverse("products:favorite-sync"),
+        user="customer",
+        method="put",
+        data=lambda d: json.dumps({"product_ids": d.product_ids[:50]}),
+        max_queries=4,
+    ),
+    # Panel de administración
+    Scenario(
+        "admin_dashboard",
+        lambda d: reverse("admin:admin_dashboard"),
+        user="staff",
+        # En frío los conteos de usuarios y productos suman dos consultas cada uno
+        max_queries=11,
+        max_db_ms=100.0,
+        max_total_ms=1500.0,
+    ),
+    # Ventas por producto con subconsultas sobre el índice (product, order, quantity, price)
+    Scenario(
+        "admin_products",
+        lambda d: reverse("admin:admin_products"),
+        user="staff",
+        max_queries=5,
+    ),
+    Scenario(
+        "admin_products_filtered",
+        lambda d: reverse("admin:admin_products") + "?q=Redmi+Note&catalog_type=PRODUCT&sort=price",
+        user="staff",
+        max_queries=6,
+    ),
+    Scenario(
+        "admin_orders",
+        lambda d: reverse("admin:admin_orders"),
+        user="staff",
+        max_queries=4,
+        max_db_ms=50.0,
+    ),
+    Scenario(
+        "admin_orders_filtered",
+        lambda d: reverse("admin:admin_orders")
+        + "?q=cliente%40example&status=PENDING&payment_method=CASH&sort=oldest",
+        user="staff",
+        max_queries=4,
+    ),
+    Scenario(
+        "admin_order_detail",
+        lambda d: reverse("admin:order_detail", args=[d.order_id]),
+        user="staff",
+        max_queries=6,
+    ),
+]
+
+
+# Nombres y descripciones realistas para que la búsqueda tenga trabajo real
+_MODELS = ["Redmi Note", "Redmi", "POCO X", "POCO F", "Xiaomi", "Mi Band", "Liberación Mi Account", "Desbloqueo FRP"]
+_VARIANTS = ["Pro", "Pro+", "Lite", "5G", "Ultra", "", "Global", "NFC", "T"]
+_DESCRIPTIONS = [
+    "Pantalla AMOLED de 120 Hz y carga rápida",
+    "Desbloqueo remoto de cuenta para teléfonos Xiaomi",
+    "Batería de larga duración y cámara de 108 MP",
+    "Servicio de liberación de red para cualquier operador",
+    "Reloj inteligente con monitor de ritmo cardíaco",
+]
+
+
+def seed_benchmark_data(
+    products: int = 10_000,
+    orders: int = 100_000,
+    cart_lines: int = 50,
+    customers: int = 500,
+    batch_size: int = 2_000,
+) -> BenchmarkData:
+    """
+    Crea el catálogo, usuarios, pedidos y un carrito grande con bulk_create.
+    Solo debe ejecutarse en una base de datos desechable.
+
+    Args:
+        products: Productos del catálogo
+        orders: Pedidos históricos (dos líneas cada uno)
+        cart_lines: Líneas del carrito del cliente de prueba
+        customers: Clientes dueños de los pedidos históricos
+        batch_size: Filas por INSERT
+
+    Returns:
+        BenchmarkData con los objetos que usan los escenarios
+    """
+    categories = Category.objects.bulk_create(
+        [Category(name=f"Categoría {i}", slug=f"categoria-{i}") for i in range(20)]
+    )
+    Product.objects.bulk_create(
+        [
+            Product(
+                name=f"{_MODELS[i % len(_MODELS)]} {i // len(_MODELS) % 40} {_VARIANTS[i % len(_VARIANTS)]}",
+                description=f"{_DESCRIPTIONS[i % len(_DESCRIPTIONS)]} (ref. {i})",
+                price=Decimal(10 + i % 490) + Decimal("0.99"),
+                catalog_type=(
+                    Product.CatalogType.SERVICE if i % 3 == 0 else Product.CatalogType.PRODUCT
+                ),
+                category=categories[i % len(categories)],
+                tag="Nuevo" if i % 7 == 0 else "",
+                rating=Decimal(i % 50) / 10,
+            )
+            for i in range(products)
+        ],
+        batch_size=batch_size,
+    )
+    product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+
+    customer = User.objects.create_user(
+        username="benchmark@example.com", email="benchmark@example.com", password="benchmark"
+    )
+    staff = User.objects.create_user(
+        username="staff@example.com", email="staff@example.com", password="benchmark", is_staff=True
+    )
+    user_ids = [
+        user.pk
+        for user in User.objects.bulk_create(
+            [
+                User(username=f"cliente{i}@example.com", email=f"cliente{i}@example.com", password="!")
+                for i in range(customers)
+            ],
+            batch_size=batch_size,
+        )
+    ]
+
+    # Pedidos históricos en lotes para no acumularlos en memoria
+    for start in range(0, orders, batch_size):
+        created = Order.objects.bulk_create(
+            [
+                Order(
+                    user_id=user_ids[i % len(user_ids)],
+                    shipping_name="Cliente",
+                    shipping_email="cliente@example.com",
+                    shipping_phone="3000000000",
+                    shipping_address="Calle 1",
+                    shipping_city="Bogotá",
+                    payment_status=i % 4 != 0,
+                    status=Order.OrderStatus.values[i % len(Order.OrderStatus.values)],
+                    subtotal=Decimal("100.00"),
+                    total=Decimal("100.00"),
+                )
+                for i in range(start, min(start + batch_size, orders))
+            ]
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order_id=order.pk,
+                    product_id=product_ids[(order.pk * 2 + n) % len(product_ids)],
+                    quantity=1 + n,
+                    price=Decimal("33.33"),
+                )
+                for order in created
+                for n in range(2)
+            ],
+            batch_size=batch_size,
+        )
+
+    cart = Cart.objects.create(user=customer)
+    CartItem.objects.bulk_create(
+        [
+            CartItem(cart=cart, product_id=product_id, quantity=1 + i % 3)
+            for i, product_id in enumerate(product_ids[:cart_lines])
+        ]
+    )
+    Cart.recalculate_totals(Cart.objects.filter(pk=cart.pk))
+    cart_item_ids = list(cart.items.order_by("pk").values_list("pk", flat=True))
+
+    Favorite.objects.bulk_create(
+        [Favorite(user=customer, product_id=product_id) for product_id in product_ids[2:22]]
+    )
+    Order.objects.bulk_create(
+        [
+            Order(
+                user=customer,
+                shipping_name="Benchmark",
+                shipping_email="benchmark@example.com",
+                shipping_phone="3000000000",
+                shipping_address="Calle 1",
+                shipping_city="Bogotá",
+                total=Decimal("50.00"),
+            )
+            for _ in range(20)
+        ]
+    )
+    order = Order.objects.filter(user=customer).order_by("-pk").first()
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=order, product_id=product_id, quantity=1, price=Decimal("10.00"))
+            for product_id in product_ids[:cart_lines]
+        ]
+    )
+    Testimonial.objects.bulk_create(
+        [Testimonial(user=customer, comment=f"Excelente servicio {i}", rating=5) for i in range(6)]
+    )
+    Banner.objects.bulk_create([Banner(title=f"Banner {i}", position=i) for i in range(3)])
+    # bulk_create no emite señales: los acumulados del dashboard se calculan al final
+    rebuild_sales_rollups()
+
+    return BenchmarkData(customer, staff, product_ids, cart_item_ids, order.pk)
+
+
+class _QueryTimer:
+    """execute_wrapper que cuenta las consultas y acumula su duración"""
+
+    def __init__(self):
+        self.count = 0
+        self.ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.ms += (time.perf_counter() - started) * 1000
+            self.count += 1
+
+
+def measure(scenario: Scenario, data: BenchmarkData, repeat: int = 3) -> BenchmarkResult:
+    """
+    Ejecuta el escenario repeat veces con el cliente de pruebas y retorna la mediana.
+    El tiempo de render es el tiempo total menos el tiempo en BD.
+    """
+    client = Client(HTTP_ACCEPT="text/html" if scenario.method == "get" else "application/json")
+    if scenario.user:
+        client.force_login(getattr(data, scenario.user))
+
+    path = scenario.path(data)
+    body = scenario.data(data) if scenario.data else None
+    samples = []
+    for _ in range(repeat):
+        kwargs = {"data": body} if body else {}
+        if isinstance(body, str):
+            kwargs["content_type"] = "application/json"
+        timer = _QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(path, **kwargs)
+            total_ms = (time.perf_counter() - started) * 1000
+        samples.append(
+            BenchmarkResult(
+                scenario.name,
+                response.status_code,
+                timer.count,
+                timer.ms,
+                max(total_ms - timer.ms, 0.0),
+                total_ms,
+            )
+        )
+
+    samples.sort(key=lambda r: r.total_ms)
+    median = samples[len(samples) // 2]
+    # El número de consultas que cuenta es el peor caso, no la mediana
+    return median._replace(queries=max(r.queries for r in samples))
+
+
+def run_benchmarks(data: BenchmarkData, scenarios=None, repeat: int = 3) -> list[BenchmarkResult]:
+    """Mide todos los escenarios (SCENARIOS por defecto)"""
+    return [measure(scenario, data, repeat) for scenario in scenarios or SCENARIOS]
+
+
+def check_budgets(results: list[BenchmarkResult], timings: bool = True) -> list[str]:
+    """
+    Compara los resultados con los presupuestos de cada escenario.
+
+    Args:
+        results: Resultados de run_benchmarks
+        timings: También verifica los presupuestos de tiempo
+
+    Returns:
+        Lista de violaciones legibles (vacía si todo está dentro del presupuesto)
+    """
+    budgets = {scenario.name: scenario for scenario in SCENARIOS}
+    violations = []
+    for result in results:
+        scenario = budgets[result.name]
+        if result.status >= 400:
+            violations.append(f"{result.name}: respondió {result.status}")
+        if result.queries > scenario.max_queries:
+            violations.append(
+                f"{result.name}: {result.queries} consultas (máximo {scenario.max_queries})"
+            )
+        if timings and result.db_ms > scenario.max_db_ms:
+            violations.append(
+                f"{result.name}: {result.db_ms:.1f} ms en BD (máximo {scenario.max_db_ms:.0f})"
+            )
+        if timings and result.total_ms > scenario.max_total_ms:
+            violations.append(
+                f"{result.name}: {result.total_ms:.1f} ms en total (máximo {scenario.max_total_ms:.0f})"
+            )
+    return violations
+
+
+def save_results(results: list[BenchmarkResult], path: Path, meta: Optional[dict] = None) -> None:
+    """Guarda los resultados en JSON para compararlos en la siguiente corrida"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {"meta": meta or {}, "results": [r._asdict() for r in results]},
+            indent=2,
+        )
+    )
+
+
+def load_results(path: Path) -> dict[str, BenchmarkResult]:
+    """Carga una corrida anterior indexada por escenario (vacío si no existe)"""
+    if not path.exists():
+        return {}
+    payload = json.loads(path.read_text())
+    return {row["name"]: BenchmarkResult(**row) for row in payload.get("results", [])}
+
+
+def format_table(
+    results: list[BenchmarkResult], previous: Optional[dict[str, BenchmarkResult]] = None
+) -> str:
+    """
+    Tabla de resultados; si hay una corrida anterior muestra el cambio
+    en consultas y el porcentaje de variación del tiempo total.
+    """
+    previous = previous or {}
+    header = f"{'escenario':<24} {'status':>6} {'consultas':>12} {'BD ms':>9} {'render ms':>10} {'total ms':>9} {'Δ total':>8}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        before = previous.get(result.name)
+        queries = str(result.queries)
+        delta = ""
+        if before:
+            if before.queries != result.queries:
+                queries = f"{before.queries}→{result.queries}"
+            if before.total_ms:
+                delta = f"{(result.total_ms - before.total_ms) / before.total_ms:+.0%}"
+        lines.append(
+            f"{result.name:<24} {result.status:>6} {queries:>12} {result.db_ms:>9.1f} "
+            f"{result.render_ms:>10.1f} {result.total_ms:>9.1f} {delta:>8}"
+        )
+    return "\n".join(lines)
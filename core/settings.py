@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     # Third Party Apps
     "allauth",
     "allauth.account",
@@ -273,3 +274,64 @@ CKEDITOR_5_CONFIGS = {
 PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
 PAYPAL_SECRET = os.getenv("PAYPAL_SECRET")
 PAYPAL_MODE = os.getenv("PAYPAL_MODE", "sandbox")
+
+
+# --- CART MAINTENANCE ---
+# Días de inactividad tras los que se purgan carritos de invitados
+CART_GUEST_TTL_DAYS = int(os.getenv("CART_GUEST_TTL_DAYS", 30))
+# Igual para carritos de usuarios; None = conservarlos siempre
+CART_USER_TTL_DAYS = None
+# Carritos eliminados por lote (DELETE cortos, sin bloqueos largos)
+CART_PURGE_BATCH_SIZE = 500
+# La purga corre fuera de los workers web: `manage.py purge_carts` en cron, o
+# `purge_carts --every 3600` como proceso dedicado (servicio cart-purge de docker-compose)
+
+
+# --- CACHE ---
+# locmem (por proceso, por defecto), file (compartida en disco) o redis (requiere redis-py).
+# locmem solo sirve con un único proceso: las versiones del catálogo y los favoritos se
+# invalidan en el worker que atiende el cambio y los demás siguen sirviendo lo anterior.
+# Con varios workers de gunicorn use file o redis (docker-compose.yml usa file).
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHES = {
+    "default": {
+        "locmem": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "eshop",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        },
+        "file": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION") or str(BASE_DIR / ".cache"),
+        },
+        "redis": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("CACHE_LOCATION") or "redis://127.0.0.1:6379/1",
+        },
+    }[CACHE_BACKEND]
+}
+
+
+# --- CATALOG ---
+# Segundos que viven productos, páginas del listado y bloques del inicio en caché
+# (los cambios los invalidan antes por señales, ver apps/products/catalog_cache.py)
+CATALOG_CACHE_SECONDS = 300
+# Segundos que se cachean los IDs de favoritos de cada usuario (se invalidan al cambiar).
+# Con locmem la invalidación no llega a los otros workers: se acota al TTL del catálogo
+FAVORITES_CACHE_SECONDS = CATALOG_CACHE_SECONDS if CACHE_BACKEND == "locmem" else 3600
+# Segundos que vive el HTML de inicio, catálogo y detalle para visitantes anónimos
+PAGE_CACHE_SECONDS = 300
+# Productos relacionados precalculados (`manage.py build_related_products`, ver apps/products/related.py):
+# productos por lista, pedidos por transacción y antigüedad mínima de un pedido para procesarlo
+RELATED_PRODUCTS_LIMIT = 4
+RELATED_PRODUCTS_BATCH_SIZE = 5000
+RELATED_PRODUCTS_ORDER_DELAY_SECONDS = 300
+# Segundos que se cachea el conteo de resultados del catálogo filtrado
+CATALOG_COUNT_CACHE_SECONDS = 60
+# Segundos que se cachean los conteos por faceta (uno por búsqueda, no por combinación de filtros)
+CATALOG_FACET_CACHE_SECONDS = 60
+
+
+# --- ADMIN ---
+# Pedidos por tramo del cursor al exportar CSV/XLSX (memoria constante, ver apps/admin/exports.py)
+ORDER_EXPORT_CHUNK_SIZE = 2000
@@ -24,6 +24,9 @@ function getCSRFToken() {
     return getCookie('csrftoken');
 }
 
+// Las APIs del carrito responden el documento JSON; el markup sale de los <template> de la página
+const CART_JSON_HEADERS = { 'Accept': 'application/json' };
+
 // Helper to check if cart is empty and handle redirects/reloads
 function checkEmptyState(count) {
     if (count === 0) {
@@ -46,7 +49,7 @@ async function addToCart(productId, quantity = 1) {
     try {
         const response = await fetch(`/orders/api/add/${productId}/`, {
             method: 'POST',
-            headers: { 'X-CSRFToken': csrftoken, 'Content-Type': 'application/json' },
+            headers: { ...CART_JSON_HEADERS, 'X-CSRFToken': csrftoken, 'Content-Type': 'application/json' },
             body: JSON.stringify({ quantity })
         });
         const data = await response.json();
@@ -74,12 +77,11 @@ async function removeFromCart(itemId) {
     try {
         const response = await fetch(`/orders/api/remove/${itemId}/`, {
             method: 'POST',
-            headers: { 'X-CSRFToken': csrftoken }
+            headers: { ...CART_JSON_HEADERS, 'X-CSRFToken': csrftoken }
         });
         const data = await response.json();
         if (data.success) {
             updateCartUI(data);
-            if (data.cart_html) updateFullCartTable(data.cart_html);
             checkEmptyState(data.cart_count);
             showNotification('info', data.message);
         }
@@ -103,12 +105,11 @@ async function updateCartItem(itemId, action) {
         const response = await fetch(`/orders/api/update/${itemId}/`, {
             method: 'POST',
             body: formData,
-            headers: { 'X-CSRFToken': csrftoken }
+            headers: { ...CART_JSON_HEADERS, 'X-CSRFToken': csrftoken }
         });
         const data = await response.json();
         if (data.success) {
             updateCartUI(data);
-            if (data.cart_html) updateFullCartTable(data.cart_html);
             checkEmptyState(data.cart_count);
         }
     } catch (error) {
@@ -116,6 +117,60 @@ async function updateCartItem(itemId, action) {
     }
 }
 
+// Cola de cambios de cantidad: agrupa clics rápidos (+/-) en un solo lote
+const CART_BATCH_DELAY = 350;
+const pendingDeltas = new Map();
+let batchTimer = null;
+
+/**
+ * Encola un cambio de cantidad y lo envía tras una pausa sin clics
+ * @param {number} itemId 
+ * @param {string} action 'increase' or 'decrease'
+ */
+function queueQuantityChange(itemId, action) {
+    const delta = action === 'increase' ? 1 : -1;
+    pendingDeltas.set(itemId, (pendingDeltas.get(itemId) || 0) + delta);
+
+    // Feedback inmediato en todos los contadores de la línea (mini-cart y tabla)
+    document.querySelectorAll(`[data-qty-for="${itemId}"]`).forEach(el => {
+        el.innerText = Math.max(parseInt(el.innerText) + delta, 0);
+    });
+
+    clearTimeout(batchTimer);
+    batchTimer = setTimeout(flushCartBatch, CART_BATCH_DELAY);
+}
+
+/**
+ * Envía los cambios pendientes en una sola petición al endpoint de lotes
+ * @param {boolean} [keepalive=false] true al abandonar la página
+ */
+async function flushCartBatch(keepalive = false) {
+    clearTimeout(batchTimer);
+    const operations = Array.from(pendingDeltas, ([itemId, delta]) => ({ item_id: parseInt(itemId), delta }))
+        .filter(op => op.delta !== 0);
+    pendingDeltas.clear();
+    if (operations.length === 0) return;
+
+    console.log(`[Cart] Flushing batch with ${operations.length} operation(s)`);
+    const csrftoken = getCSRFToken();
+    try {
+        const response = await fetch('/orders/api/batch/', {
+            method: 'POST',
+            headers: { ...CART_JSON_HEADERS, 'X-CSRFToken': csrftoken, 'Content-Type': 'application/json' },
+            body: JSON.stringify({ operations }),
+            keepalive
+        });
+        const data = await response.json();
+        // Si hubo más clics mientras tanto, el próximo lote traerá el estado final
+        if (data.success && pendingDeltas.size === 0) {
+            updateCartUI(data);
+            checkEmptyState(data.cart_count);
+        }
+    } catch (error) {
+        console.error('[Cart] Batch error:', error);
+    }
+}
+
 /**
  * Actualiza los elementos comunes de la UI (Badges, Mini-Cart)
  */
@@ -128,11 +183,8 @@ function updateCartUI(data) {
         badge.classList.toggle('hidden', data.cart_count === 0);
     });
 
-    // 2. Mini Cart
-    const miniCartContent = document.getElementById('mini-cart-content');
-    if (miniCartContent && data.mini_cart_html) {
-        miniCartContent.innerHTML = data.mini_cart_html;
-    }
+    // 2. Mini Cart y tabla del carrito
+    if (data.cart) renderCart(data.cart);
     
     // 3. Cart Page Headings
     const headerCount = document.getElementById('cart-header-count');
@@ -146,15 +198,46 @@ function updateCartUI(data) {
 }
 
 /**
- * Inyecta el nuevo HTML de la tabla en la página de carrito
+ * Renderiza las líneas del carrito desde el documento JSON.
+ * Cada lista [data-cart-lines] nombra su <template> (mini_cart_line.html o
+ * cart_table_line.html renderizados sin item), así el markup tiene una sola fuente.
  */
-function updateFullCartTable(html) {
-    const container = document.getElementById('cart-table-container');
-    if (container) {
-        container.innerHTML = html;
-        container.classList.add('animate-pulse');
-        setTimeout(() => container.classList.remove('animate-pulse'), 400);
+function renderCart(cart) {
+    document.querySelectorAll('[data-cart-lines]').forEach(list => {
+        const template = document.getElementById(list.dataset.cartLines);
+        if (template) list.replaceChildren(...cart.items.map(item => renderCartLine(template, item)));
+    });
+    document.querySelectorAll('[data-cart-empty]').forEach(el => { el.hidden = cart.count > 0; });
+    document.querySelectorAll('[data-cart-footer]').forEach(el => { el.hidden = cart.count === 0; });
+    document.querySelectorAll('[data-cart-field="count"]').forEach(el => { el.textContent = cart.count; });
+    document.querySelectorAll('[data-cart-field="total"]').forEach(el => { el.textContent = cart.total; });
+}
+
+/**
+ * Clona la línea del <template> y completa sus campos (data-cart-field, IDs e imagen)
+ */
+function renderCartLine(template, item) {
+    const line = template.content.firstElementChild.cloneNode(true);
+    line.dataset.cartLine = item.id;
+    line.querySelectorAll('[data-item-id]').forEach(el => { el.dataset.itemId = item.id; });
+    line.querySelectorAll('[data-qty-for]').forEach(el => {
+        el.dataset.qtyFor = item.id;
+        el.textContent = item.quantity;
+    });
+    line.querySelectorAll('[data-cart-field]').forEach(el => { el.textContent = item[el.dataset.cartField]; });
+
+    // El <template> trae la imagen vacía del preset "thumb" y el ícono; queda uno solo
+    const slot = line.querySelector('[data-cart-image]');
+    const img = slot && slot.querySelector('img');
+    if (img && item.image) {
+        img.src = item.image;
+        img.srcset = item.image_srcset;
+        img.alt = item.name;
+        slot.querySelector('.material-icons').remove();
+    } else if (img) {
+        img.remove();
     }
+    return line;
 }
 
 /**
@@ -191,11 +274,11 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        // 2. Quantity Update (+/-)
+        // 2. Quantity Update (+/-), agrupado en lotes
         const qtyBtn = target.closest('.qty-btn');
         if (qtyBtn) {
             e.preventDefault();
-            updateCartItem(qtyBtn.dataset.itemId, qtyBtn.dataset.action);
+            queueQuantityChange(qtyBtn.dataset.itemId, qtyBtn.dataset.action);
             return;
         }
 
@@ -208,6 +291,11 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Enviar cambios pendientes si el usuario abandona la página
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flushCartBatch(true);
+    });
+
     // Toggle Mini Cart
     const toggleBtn = document.getElementById('cart-toggle-btn');
     const miniCart = document.getElementById('mini-cart-dropdown');
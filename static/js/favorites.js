@@ -1,29 +1,86 @@
+// Favoritos guardados antes de iniciar sesión, se suben en bloque al volver
+const PENDING_FAVORITES_KEY = 'pendingFavorites';
+
 function toggleFavorite(btn, productId) {
-    fetch(`/products/favorite/toggle/${productId}/`, {
-        method: 'POST',
+    // Se envía el estado deseado (PUT/DELETE), no un "alternar": un doble clic
+    // o un reintento deja el mismo resultado
+    const icon = btn.querySelector('.material-icons');
+    setFavorite(productId, icon.textContent.trim() !== 'favorite');
+}
+
+function setFavorite(productId, favorite) {
+    fetch(`/products/favorites/${productId}/`, {
+        method: favorite ? 'PUT' : 'DELETE',
         headers: {
-            'X-CSRFToken': getCookie('csrftoken'),
-            'Content-Type': 'application/json'
+            'X-CSRFToken': getCookie('csrftoken')
         }
     })
     .then(response => {
         if (response.status === 403) {
+            if (favorite) {
+                rememberPendingFavorite(productId);
+            }
             window.location.href = '/users/auth/';
             return;
         }
-        return response.json();
+        return response.ok ? response.json() : null;
     })
     .then(data => {
         if (data && data.status) {
-            const icon = btn.querySelector('.material-icons');
-            if (data.status === 'added') {
-                icon.textContent = 'favorite';
-                btn.classList.add('text-red-500');
-                showToast('¡Agregado a favoritos!');
-            } else {
-                icon.textContent = 'favorite_border';
-                btn.classList.remove('text-red-500');
-                showToast('Eliminado de favoritos');
+            const added = data.status === 'added';
+            renderFavorite(productId, added);
+            showToast(added ? '¡Agregado a favoritos!' : 'Eliminado de favoritos');
+        }
+    })
+    .catch(error => console.error('Error:', error));
+}
+
+function renderFavorite(productId, favorite) {
+    // Un producto puede aparecer en varios botones de la misma página
+    document.querySelectorAll(`[data-favorite-id="${productId}"]`).forEach(btn => {
+        btn.querySelector('.material-icons').textContent = favorite ? 'favorite' : 'favorite_border';
+        btn.classList.toggle('text-red-500', favorite);
+        btn.classList.toggle('text-gray-400', !favorite);
+    });
+}
+
+function readPendingFavorites() {
+    try {
+        const ids = JSON.parse(localStorage.getItem(PENDING_FAVORITES_KEY) || '[]');
+        return Array.isArray(ids) ? ids : [];
+    } catch (e) {
+        return [];
+    }
+}
+
+function rememberPendingFavorite(productId) {
+    const ids = readPendingFavorites();
+    if (!ids.includes(productId)) {
+        ids.push(productId);
+        localStorage.setItem(PENDING_FAVORITES_KEY, JSON.stringify(ids));
+    }
+}
+
+function syncPendingFavorites() {
+    const ids = readPendingFavorites();
+    if (!ids.length || document.body.dataset.authenticated !== 'true') {
+        return;
+    }
+    fetch('/products/favorites/', {
+        method: 'PUT',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken'),
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ product_ids: ids })
+    })
+    .then(response => response.ok ? response.json() : null)
+    .then(data => {
+        if (data && data.favorites) {
+            localStorage.removeItem(PENDING_FAVORITES_KEY);
+            data.favorites.forEach(productId => renderFavorite(productId, true));
+            if (data.added) {
+                showToast('¡Favoritos sincronizados!');
             }
         }
     })
@@ -49,3 +106,5 @@ function showToast(message) {
     // Implementar si hay un sistema de toasts, si no, alert simple o ignorar
     console.log(message);
 }
+
+syncPendingFavorites();
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Benchmark de consultas de la tienda.
+Crea una base de datos de prueba desechable (PostgreSQL de settings o SQLite con --sqlite),
+siembra volúmenes realistas, mide cada página/endpoint y compara con la corrida anterior.
+Sale con código 1 si algún escenario excede su presupuesto.
+
+Uso:
+    python tests/benchmark_queries.py
+    python tests/benchmark_queries.py --sqlite --products 2000 --orders 20000
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import django
+
+# Setup Django
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+parser = argparse.ArgumentParser(description="Benchmark de consultas por página")
+parser.add_argument("--products", type=int, default=10_000)
+parser.add_argument("--orders", type=int, default=100_000)
+parser.add_argument("--cart-lines", type=int, default=50)
+parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por escenario (se usa la mediana)")
+parser.add_argument("--sqlite", action="store_true", help="Usa SQLite en lugar de la BD de settings")
+parser.add_argument(
+    "--output",
+    type=Path,
+    default=BASE_DIR / ".benchmarks" / "latest.json",
+    help="Archivo de resultados; la corrida anterior se lee de aquí para comparar",
+)
+parser.add_argument("--no-timings", action="store_true", help="Solo verifica presupuestos de consultas")
+args = parser.parse_args()
+
+from django.conf import settings  # noqa: E402
+
+if args.sqlite:
+    settings.DATABASES = {
+        "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": str(BASE_DIR / ".benchmarks" / "db.sqlite3")}
+    }
+django.setup()
+
+from django.test.runner import DiscoverRunner  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+from core.benchmarks import (  # noqa: E402
+    check_budgets,
+    format_table,
+    load_results,
+    run_benchmarks,
+    save_results,
+    seed_benchmark_data,
+)
+
+setup_test_environment()
+runner = DiscoverRunner(verbosity=0, interactive=False)
+old_config = runner.setup_databases()
+
+try:
+    print("=" * 60)
+    print(f"📦 Sembrando {args.products} productos, {args.orders} pedidos, carrito de {args.cart_lines} líneas")
+    print("=" * 60)
+    data = seed_benchmark_data(
+        products=args.products, orders=args.orders, cart_lines=args.cart_lines
+    )
+
+    results = run_benchmarks(data, repeat=args.repeat)
+    previous = load_results(args.output)
+    print(format_table(results, previous))
+
+    save_results(
+        results,
+        args.output,
+        meta={
+            "engine": settings.DATABASES["default"]["ENGINE"],
+            "products": args.products,
+            "orders": args.orders,
+            "cart_lines": args.cart_lines,
+        },
+    )
+    violations = check_budgets(results, timings=not args.no_timings)
+finally:
+    runner.teardown_databases(old_config)
+    teardown_test_environment()
+
+print()
+if violations:
+    print("❌ PRESUPUESTOS EXCEDIDOS")
+    for violation in violations:
+        print(f"   - {violation}")
+    sys.exit(1)
+print("✅ Todos los escenarios dentro del presupuesto")